@@ -0,0 +1,104 @@
+"""
+多账号cookies池测试：假提取器按账号限速（超过速率返回412并在一段时间内拒绝该账号），
+对比单个账号和多个账号时字幕获取的吞吐量、失败数和被限流次数
+
+单个账号被限流时视频直接失败、账号进入冷却；多个账号时被限流的视频换用其他账号重试。
+
+用法:
+    python benchmarks/cookie_pool_bench.py [--videos 200] [--threads 8] [--accounts 4] [--account-rate 10]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fakes import FAKE_URL_TEMPLATE, FakeBilibiliIE, install_fake_extractor, temp_workspace, write_fake_cookies
+from config.settings import Settings
+
+
+def run(cookie_files, urls, args) -> dict:
+    from src.cookie_pool import CookiePool
+    from src.downloader import SubtitleDownloader
+    
+    FakeBilibiliIE.calls = 0
+    FakeBilibiliIE._accounts.clear()
+    FakeBilibiliIE.blocked.clear()
+    pool = CookiePool(
+        cookie_files, account_concurrency=args.account_concurrency, cooldown=args.cooldown, max_cooldown=args.cooldown * 4,
+    )
+    start = time.perf_counter()
+    with SubtitleDownloader(cookie_pool=pool) as downloader:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            with ThreadPoolExecutor(max_workers=args.threads) as executor:
+                results = list(executor.map(
+                    lambda url: downloader.fetch_subtitle(url, save_subtitle_file=False, sub_dir=Settings.OUTPUT_DIR),
+                    urls,
+                ))
+    wall = time.perf_counter() - start
+    succeeded = sum(1 for r in results if r)
+    stats = pool.stats()
+    return {
+        'accounts': len(cookie_files),
+        'succeeded': succeeded,
+        'failures': len(urls) - succeeded,
+        'extractor_calls': FakeBilibiliIE.calls,
+        'throttled_requests': sum(FakeBilibiliIE.blocked.values()),
+        'wall_seconds': round(wall, 3),
+        'videos_per_second': round(succeeded / wall, 1),
+        'per_account': {
+            a['name']: {k: a[k] for k in ('requests', 'successes', 'throttled')} for a in stats['accounts']
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单个账号与多账号cookies池的字幕获取吞吐量对比")
+    parser.add_argument("--videos", type=int, default=200, help="视频数")
+    parser.add_argument("--threads", type=int, default=8, help="并发线程数")
+    parser.add_argument("--accounts", type=int, default=4, help="多账号时的账号数")
+    parser.add_argument("--account-rate", type=float, default=10, help="每个账号每秒允许的请求数，超过后被风控")
+    parser.add_argument("--account-penalty", type=float, default=1.0, help="账号被风控后拒绝请求的时长（秒）")
+    parser.add_argument("--account-concurrency", type=int, default=2, help="每个账号的并发请求数上限")
+    parser.add_argument("--cooldown", type=float, default=1.0, help="账号被限流后的冷却时间（秒）")
+    parser.add_argument("--extract-latency", type=float, default=0.05, help="假提取器每次提取的模拟延迟（秒）")
+    args = parser.parse_args()
+    
+    install_fake_extractor(latency=args.extract_latency)
+    FakeBilibiliIE.account_rate = args.account_rate
+    FakeBilibiliIE.account_penalty = args.account_penalty
+    import src.downloader  # noqa: F401  导入后再调整日志级别
+    
+    # 第一次导入src模块时才会配置日志，因此在导入之后再关闭INFO和WARNING日志（限流警告很多）
+    logging.getLogger("BilibiliAISummary").setLevel(logging.ERROR + 10)
+    
+    urls = [FAKE_URL_TEMPLATE.format(f"BVP{i:06d}") for i in range(args.videos)]
+    report = {
+        'videos': args.videos, 'threads': args.threads, 'account_rate': args.account_rate,
+        'account_concurrency': args.account_concurrency,
+    }
+    with temp_workspace() as tmp:
+        tmp = Path(tmp)
+        Settings.OUTPUT_DIR = tmp / "output"
+        Settings.OUTPUT_DIR.mkdir()
+        Settings.SUBTITLE_STORE_MODE = "off"
+        cookie_files = [write_fake_cookies(tmp, f"account{i}") for i in range(args.accounts)]
+        
+        report['single_account'] = run(cookie_files[:1], urls, args)
+        report['cookie_pool'] = run(cookie_files, urls, args)
+    
+    before, after = report['single_account'], report['cookie_pool']
+    report['throughput_ratio'] = round(after['videos_per_second'] / before['videos_per_second'], 2) if before['videos_per_second'] else None
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
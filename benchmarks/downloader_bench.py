@@ -0,0 +1,135 @@
+"""
+字幕获取的每视频开销：每次调用新建YoutubeDL（重新读取cookies文件、初始化提取器和HTTP处理器）
+与各线程复用YoutubeDL实例、共享cookie jar的对比
+
+使用假的yt-dlp提取器（默认无模拟延迟），测得的时间即为yt-dlp本身的开销。
+
+用法:
+    python benchmarks/downloader_bench.py [--videos 200] [--threads 4] [--cookies 200]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fakes import FAKE_URL_TEMPLATE, FakeBilibiliIE, install_fake_extractor, temp_workspace, write_fake_cookies
+from config.settings import Settings
+
+
+class CookieLoadCounter:
+    """统计cookies文件被解析的次数"""
+    
+    def __init__(self):
+        from yt_dlp.cookies import YoutubeDLCookieJar
+        self.count = 0
+        self._lock = threading.Lock()
+        self._jar_class = YoutubeDLCookieJar
+        self._original = YoutubeDLCookieJar.load
+    
+    def __enter__(self):
+        counter = self
+        
+        def load(jar, *args, **kwargs):
+            with counter._lock:
+                counter.count += 1
+            return counter._original(jar, *args, **kwargs)
+        
+        self._jar_class.load = load
+        return self
+    
+    def __exit__(self, *args):
+        self._jar_class.load = self._original
+
+
+def write_cookies(directory: Path, extra: int) -> Path:
+    """写出cookies文件，并追加若干条无关的cookie，使文件大小接近真实浏览器导出的文件"""
+    cookies_file = write_fake_cookies(directory)
+    with open(cookies_file, 'a', encoding='utf-8') as f:
+        for i in range(extra):
+            f.write(f".example{i % 20}.com\tTRUE\t/\tFALSE\t0\tcookie{i}\t{'x' * 40}\n")
+    return cookies_file
+
+
+def run(reuse: bool, urls, threads: int) -> dict:
+    from src.downloader import SubtitleDownloader
+    
+    downloader = SubtitleDownloader(reuse_instances=reuse)
+    latencies = []
+    latencies_lock = threading.Lock()
+    failures = 0
+    
+    def fetch(url):
+        nonlocal failures
+        start = time.perf_counter()
+        result = downloader.fetch_subtitle(url, save_subtitle_file=False, sub_dir=Settings.OUTPUT_DIR)
+        elapsed = time.perf_counter() - start
+        with latencies_lock:
+            latencies.append(elapsed)
+            if not result:
+                failures += 1
+    
+    with CookieLoadCounter() as cookie_loads:
+        start = time.perf_counter()
+        # yt-dlp的输出被丢弃
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(fetch, urls))
+            downloader.close()
+        wall = time.perf_counter() - start
+    
+    return {
+        'videos': len(urls),
+        'failures': failures,
+        'cookie_file_loads': cookie_loads.count,
+        'wall_seconds': round(wall, 3),
+        'per_video_ms_mean': round(statistics.mean(latencies) * 1000, 2),
+        'per_video_ms_p50': round(statistics.median(latencies) * 1000, 2),
+        'videos_per_second': round(len(urls) / wall, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YoutubeDL实例复用前后的每视频开销对比")
+    parser.add_argument("--videos", type=int, default=200, help="视频数")
+    parser.add_argument("--threads", type=int, default=4, help="并发线程数（1为顺序执行）")
+    parser.add_argument("--cookies", type=int, default=200, help="cookies文件中额外的cookie条数")
+    parser.add_argument("--extract-latency", type=float, default=0.0, help="假提取器每次提取的模拟延迟（秒）")
+    args = parser.parse_args()
+    
+    install_fake_extractor(latency=args.extract_latency)
+    import src.downloader  # noqa: F401  导入后再调整日志级别
+    
+    # 第一次导入src模块时才会配置日志，因此在导入之后再关闭INFO日志
+    logging.getLogger("BilibiliAISummary").setLevel(logging.WARNING)
+    
+    urls = [FAKE_URL_TEMPLATE.format(f"BVD{i:06d}") for i in range(args.videos)]
+    report = {'threads': args.threads, 'extra_cookies': args.cookies}
+    with temp_workspace() as tmp:
+        tmp = Path(tmp)
+        Settings.COOKIES_FILE = write_cookies(tmp, args.cookies)
+        Settings.OUTPUT_DIR = tmp / "output"
+        Settings.OUTPUT_DIR.mkdir()
+        Settings.SUBTITLE_STORE_MODE = "off"
+        
+        for name, reuse in (('per_call_instance', False), ('reused_instances', True)):
+            FakeBilibiliIE.calls = 0
+            report[name] = run(reuse, urls, args.threads)
+    
+    before, after = report['per_call_instance'], report['reused_instances']
+    report['per_video_overhead_saved_ms'] = round(before['per_video_ms_mean'] - after['per_video_ms_mean'], 2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+离线端到端性能测试：不需要Bilibili cookies和API密钥
+
+使用假的yt-dlp提取器（字幕来自 output/ 中的字幕文件）和本地OpenAI兼容模拟服务，
+测量单视频路径各阶段耗时，以及批量路径的吞吐量（视频/分钟）和峰值内存，结果以JSON输出，
+便于在不同提交之间对比。
+
+用法:
+    python benchmarks/e2e_bench.py [--videos 20] [--llm-latency 0.5] [--extract-latency 0.3] [--output result.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fakes import FAKE_URL_TEMPLATE, MockLLMServer, install_fake_extractor, temp_workspace, write_fake_cookies
+from config.settings import Settings
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def fake_urls(count: int, prefix: str) -> List[str]:
+    return [FAKE_URL_TEMPLATE.format(f"BV{prefix}{i:06d}") for i in range(count)]
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB）"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return round(rss / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+
+def run_single(urls: List[str]) -> Dict:
+    """逐个处理视频，记录每个阶段的耗时（与 main.run_single 的步骤一致）"""
+    from src.downloader import SubtitleDownloader
+    from src.main import save_summary
+    from src.preprocess import prepare_subtitle_text
+    from src.summarizer import AISummarizer
+    
+    downloader = SubtitleDownloader()
+    summarizer = AISummarizer()
+    stages = {'download': [], 'preprocess': [], 'summarize': [], 'save': []}
+    failures = 0
+    
+    start = time.perf_counter()
+    for url in urls:
+        t0 = time.perf_counter()
+        subtitle = downloader.fetch_subtitle(url)
+        t1 = time.perf_counter()
+        if not subtitle:
+            failures += 1
+            continue
+        text = prepare_subtitle_text(subtitle.cues, subtitle.text)
+        t2 = time.perf_counter()
+        summary = summarizer.summarize(text, subtitle.video_title)
+        t3 = time.perf_counter()
+        if not summary:
+            failures += 1
+            continue
+        save_summary(summary, subtitle.video_title, subtitle.sub_dir)
+        t4 = time.perf_counter()
+        for name, seconds in zip(stages, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+            stages[name].append(seconds)
+    elapsed = time.perf_counter() - start
+    
+    return {
+        'videos': len(urls),
+        'failures': failures,
+        'wall_seconds': round(elapsed, 3),
+        'videos_per_minute': round(len(urls) / elapsed * 60, 2) if elapsed else None,
+        'stages': {
+            name: {
+                'mean_seconds': round(sum(values) / len(values), 4) if values else None,
+                'max_seconds': round(max(values), 4) if values else None,
+                'total_seconds': round(sum(values), 3),
+            }
+            for name, values in stages.items()
+        },
+    }
+
+
+def run_batch(urls: List[str], download_workers: int, summarize_workers: int) -> Dict:
+    """使用批量流水线处理视频"""
+    from src.batch import BatchPipeline
+    from src.downloader import SubtitleDownloader
+    from src.main import save_summary
+    from src.summarizer import AISummarizer
+    
+    pipeline = BatchPipeline(
+        SubtitleDownloader(), AISummarizer(), save_summary,
+        download_workers=download_workers, summarize_workers=summarize_workers,
+    )
+    start = time.perf_counter()
+    results = pipeline.run(urls)
+    elapsed = time.perf_counter() - start
+    return {
+        'videos': len(urls),
+        'failures': sum(1 for r in results if not r.success),
+        'download_workers': download_workers,
+        'summarize_workers': summarize_workers,
+        'wall_seconds': round(elapsed, 3),
+        'videos_per_minute': round(len(urls) / elapsed * 60, 2) if elapsed else None,
+    }
+
+
+def measure(func, trace_memory: bool, *args) -> Dict:
+    """运行一个场景；yt-dlp和日志输出被丢弃，只保留结果"""
+    if trace_memory:
+        tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        result = func(*args)
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['peak_traced_mb'] = round(peak / 1024 / 1024, 2)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端性能测试")
+    parser.add_argument("--videos", type=int, default=20, help="批量场景的视频数量")
+    parser.add_argument("--single-videos", type=int, default=5, help="单视频场景依次处理的视频数量")
+    parser.add_argument("--extract-latency", type=float, default=0.3, help="假提取器每次提取的模拟延迟（秒）")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="模拟AI服务的响应延迟（秒）")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="模拟AI服务的随机附加延迟上限（秒）")
+    parser.add_argument("--download-workers", type=int, default=Settings.BATCH_DOWNLOAD_WORKERS)
+    parser.add_argument("--summarize-workers", type=int, default=Settings.BATCH_SUMMARIZE_WORKERS)
+    parser.add_argument("--trace-memory", action="store_true", help="使用tracemalloc统计Python分配峰值（会拖慢运行）")
+    parser.add_argument("--output", type=str, help="将JSON结果写入文件")
+    args = parser.parse_args()
+    
+    logging.getLogger("BilibiliAISummary").setLevel(logging.WARNING)
+    install_fake_extractor(latency=args.extract_latency)
+    
+    with temp_workspace() as tmp, MockLLMServer(latency=args.llm_latency, jitter=args.llm_jitter) as llm:
+        tmp = Path(tmp)
+        Settings.COOKIES_FILE = write_fake_cookies(tmp)
+        Settings.OUTPUT_DIR = tmp / "output"
+        Settings.SEARCH_INDEX_DB = tmp / "search.sqlite3"
+        Settings.SUMMARY_CACHE_MODE = "off"
+        Settings.NEAR_DUP_MODE = "off"
+        Settings.SUBTITLE_STORE_MODE = "off"
+        Settings.AI_API_URL = llm.url
+        Settings.AI_API_KEY = "benchmark"
+        
+        scenarios = {
+            'single': measure(run_single, args.trace_memory, fake_urls(args.single_videos, "S")),
+            'batch': measure(run_batch, args.trace_memory, fake_urls(args.videos, "B"),
+                             args.download_workers, args.summarize_workers),
+        }
+        llm_requests = llm.requests
+    
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'config': {
+            'extract_latency': args.extract_latency,
+            'llm_latency': args.llm_latency,
+            'llm_jitter': args.llm_jitter,
+            'cpu_count': os.cpu_count(),
+        },
+        'llm_requests': llm_requests,
+        'scenarios': scenarios,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding='utf-8')
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
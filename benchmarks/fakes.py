@@ -0,0 +1,472 @@
+"""
+离线性能测试用的替身：假的yt-dlp提取器和OpenAI兼容的本地模拟服务
+
+两者都不访问外部网络，字幕内容来自 output/ 中附带的字幕文件。
+"""
+import json
+import random
+import itertools
+import tempfile
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import ExtractorError, OnDemandPagedList
+
+project_root = Path(__file__).parent.parent
+
+# 假提取器处理的URL，例如 https://bench.invalid/video/BV1xx411c7mD
+FAKE_URL_TEMPLATE = "https://bench.invalid/video/{}"
+# 假的UP主空间URL，例如 https://bench.invalid/space/1
+FAKE_SPACE_TEMPLATE = "https://bench.invalid/space/{}"
+
+
+def fixture_subtitles() -> List[Path]:
+    """output/ 中附带的字幕文件"""
+    return sorted(project_root.glob("output/*/*.srt"))
+
+
+class FakeBilibiliIE(InfoExtractor):
+    """
+    假的Bilibili提取器
+    
+    返回固定的视频信息，字幕内容直接嵌入在信息中（与真实Bilibili提取器一致），
+    只有在设置了 writesubtitles 时才会提供字幕。
+    设置了 account_rate 时按cookies中的SESSDATA区分账号，模拟Bilibili的风控：
+    单个账号的请求速率超过上限后返回412，并在一段时间内拒绝该账号的所有请求。
+    """
+    
+    IE_NAME = 'fakebilibili'
+    _VALID_URL = r'https?://bench\.invalid/video/(?P<id>[0-9A-Za-z]+)'
+    
+    # 每次提取模拟的网络延迟（秒）
+    latency = 0.0
+    # 字幕内容：语言 -> SRT文本
+    tracks = {}
+    # ID以 "BVM" 开头的视频视为多P视频，未指定 ?p= 时返回分P列表
+    parts = 3
+    # 提取次数，用于确认网络请求次数
+    calls = 0
+    # 每个账号每秒允许的请求数（令牌桶，容量同为该值），0为不限制
+    account_rate = 0.0
+    # 账号被风控后拒绝请求的时长（秒）
+    account_penalty = 1.0
+    # 账号 -> [令牌数, 上次补充时间, 风控结束时间]
+    _accounts: Dict[str, list] = {}
+    # 各账号被风控拒绝的请求数
+    blocked: Dict[str, int] = {}
+    _lock = threading.Lock()
+    
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        with FakeBilibiliIE._lock:
+            FakeBilibiliIE.calls += 1
+        if self.account_rate:
+            self._check_account()
+        if self.latency:
+            time.sleep(self.latency)
+        page = parse_qs(urlparse(url).query).get('p', [None])[0]
+        if video_id.startswith('BVM'):
+            if not page:
+                return self.playlist_result(
+                    [self.url_result(f"{FAKE_URL_TEMPLATE.format(video_id)}?p={i}", FakeBilibiliIE)
+                     for i in range(1, self.parts + 1)],
+                    video_id, f'离线测试多P视频 {video_id}',
+                )
+            video_id = f'{video_id}_p{page}'
+        title = f'离线测试视频 {video_id}' if not page else f'离线测试多P视频 {video_id[:-len(page) - 2]} p{int(page):02d} 第{page}讲'
+        return {
+            'id': video_id,
+            'title': title,
+            'uploader': '测试UP主',
+            'formats': [{'url': f'https://bench.invalid/media/{video_id}.mp4', 'ext': 'mp4', 'format_id': '0'}],
+            'subtitles': self.extract_subtitles(video_id),
+        }
+    
+    def _get_subtitles(self, video_id):
+        return {lang: [{'ext': 'srt', 'data': data}] for lang, data in self.tracks.items()}
+    
+    def _check_account(self):
+        """按账号限速，超过速率或处于风控期时抛出与真实提取器相同的412错误"""
+        account = next((c.value for c in self._downloader.cookiejar if c.name == 'SESSDATA'), '')
+        now = time.monotonic()
+        with FakeBilibiliIE._lock:
+            state = FakeBilibiliIE._accounts.setdefault(account, [self.account_rate, now, 0.0])
+            state[0] = min(self.account_rate, state[0] + (now - state[1]) * self.account_rate)
+            state[1] = now
+            if now >= state[2] and state[0] >= 1:
+                state[0] -= 1
+                return
+            if now >= state[2]:
+                state[2] = now + self.account_penalty
+            FakeBilibiliIE.blocked[account] = FakeBilibiliIE.blocked.get(account, 0) + 1
+        raise ExtractorError('Request is blocked by server (412), please add cookies, wait and try later.', expected=True)
+
+
+class FakeSpaceIE(InfoExtractor):
+    """
+    假的UP主空间提取器
+    
+    投稿列表按页返回（与真实的空间提取器一致），只在需要时请求下一页，
+    条目为视频URL（扁平提取时不会逐个提取）。
+    """
+    
+    IE_NAME = 'fakespace'
+    _VALID_URL = r'https?://bench\.invalid/space/(?P<id>[0-9]+)'
+    _PAGE_SIZE = 30
+    
+    # 每个空间的投稿数
+    videos = 50
+    # 列表页请求次数
+    page_calls = 0
+    _lock = threading.Lock()
+    
+    def _real_extract(self, url):
+        mid = self._match_id(url)
+        
+        def fetch_page(page):
+            with FakeSpaceIE._lock:
+                FakeSpaceIE.page_calls += 1
+            if FakeBilibiliIE.latency:
+                time.sleep(FakeBilibiliIE.latency)
+            start = page * self._PAGE_SIZE
+            for i in range(start, min(start + self._PAGE_SIZE, self.videos)):
+                # 最新投稿在前
+                video_id = f'BVW{mid}{self.videos - i:06d}'
+                yield self.url_result(FAKE_URL_TEMPLATE.format(video_id), FakeBilibiliIE, video_id, f'离线测试视频 {video_id}')
+        
+        return self.playlist_result(OnDemandPagedList(fetch_page, self._PAGE_SIZE), mid, f'测试UP主 {mid} 的投稿')
+
+
+_original_init = yt_dlp.YoutubeDL.__init__
+
+
+def _patched_init(self, *args, **kwargs):
+    _original_init(self, *args, **kwargs)
+    # 放在最前面，优先于通用提取器匹配
+    for ie in (FakeBilibiliIE(), FakeSpaceIE()):
+        self.add_info_extractor(ie)
+        self._ies = {ie.ie_key(): self._ies.pop(ie.ie_key()), **self._ies}
+
+
+def install_fake_extractor(latency: float = 0.0, subtitle_files: Optional[List[Path]] = None):
+    """
+    让所有新建的YoutubeDL实例优先使用假提取器
+    
+    Args:
+        latency: 每次提取模拟的网络延迟（秒）
+        subtitle_files: 作为字幕内容的文件，语言取自文件名（如 xxx.ai-zh.srt），默认使用output/中的字幕
+    """
+    tracks = {}
+    for path in subtitle_files or fixture_subtitles():
+        lang = path.suffixes[-2].lstrip('.') if len(path.suffixes) >= 2 else 'ai-zh'
+        tracks[lang] = path.read_text(encoding='utf-8')
+    FakeBilibiliIE.latency = latency
+    FakeBilibiliIE.tracks = tracks
+    FakeBilibiliIE.calls = 0
+    FakeBilibiliIE._accounts.clear()
+    FakeBilibiliIE.blocked.clear()
+    FakeSpaceIE.page_calls = 0
+    yt_dlp.YoutubeDL.__init__ = _patched_init
+
+
+def uninstall_fake_extractor():
+    """恢复YoutubeDL的原始行为"""
+    yt_dlp.YoutubeDL.__init__ = _original_init
+
+
+def write_fake_cookies(directory: Path, account: Optional[str] = None) -> Path:
+    """写出一个格式正确的Netscape cookies文件，指定account时写入 cookies_<account>.txt，SESSDATA为账号名"""
+    cookies_file = directory / (f"cookies_{account}.txt" if account else "cookies.txt")
+    cookies_file.write_text(
+        "# Netscape HTTP Cookie File\n"
+        f".bilibili.com\tTRUE\t/\tFALSE\t0\tSESSDATA\t{account or 'benchmark'}\n",
+        encoding='utf-8',
+    )
+    return cookies_file
+
+
+class MockLLMServer:
+    """
+    OpenAI兼容的本地模拟服务（/chat/completions）
+    
+    支持普通和流式（SSE）响应，可配置响应延迟、首个token延迟、429注入比例和
+    随机变慢的请求比例（模拟慢副本），响应中包含 usage 信息。
+    
+    同时实现批处理接口：POST /files 上传输入文件，POST /batches 创建批次，GET /batches/<id> 查询状态，
+    GET /files/<id>/content 下载结果文件。批次在 batch_latency 秒后完成，
+    按 error_rate 随机选中的请求写入错误文件。
+    """
+    
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.0,
+        first_token_latency: Optional[float] = None,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        completion: str = "# 视频总结\n\n- 要点一\n- 要点二\n- 要点三\n",
+        batch_latency: float = 1.0,
+    ):
+        """
+        Args:
+            latency: 完整响应的基础延迟（秒）
+            jitter: 在基础延迟上额外增加的随机延迟上限（秒）
+            first_token_latency: 流式响应的首个token延迟，默认与latency相同
+            error_rate: 返回429的请求比例（0~1）
+            slow_rate: 随机变慢的请求比例（0~1）
+            slow_latency: 变慢的请求额外增加的延迟（秒），流式请求加在首个token之前
+            completion: 返回的总结内容
+            batch_latency: 批次从创建到完成的时间（秒）
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.first_token_latency = latency if first_token_latency is None else first_token_latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.completion = completion
+        self.batch_latency = batch_latency
+        self.requests = 0
+        # 批处理接口：已处理的请求数、上传的文件和批次
+        self.batch_requests = 0
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, dict] = {}
+        self._ids = itertools.count(1)
+        self.errors = 0
+        self.slow = 0
+        self.models: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+    
+    def start(self) -> 'MockLLMServer':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+    
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def __enter__(self) -> 'MockLLMServer':
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def _delay(self) -> float:
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+    
+    def _slowdown(self) -> float:
+        """本次请求额外增加的延迟：按 slow_rate 随机选中的请求变慢"""
+        if not self.slow_rate or random.random() >= self.slow_rate:
+            return 0.0
+        with self._lock:
+            self.slow += 1
+        return self.slow_latency
+    
+    def _usage(self, prompt: str) -> dict:
+        return {
+            'prompt_tokens': len(prompt),
+            'completion_tokens': len(self.completion),
+            'total_tokens': len(prompt) + len(self.completion),
+        }
+    
+    def _upload(self, content_type: str, body: bytes) -> dict:
+        """保存multipart请求中的文件"""
+        message = BytesParser(policy=policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + body
+        )
+        data = next(
+            part.get_payload(decode=True) for part in message.iter_parts()
+            if part.get_param('name', header='content-disposition') == 'file'
+        )
+        with self._lock:
+            file_id = f"file-{next(self._ids)}"
+            self.files[file_id] = data
+        return {'id': file_id, 'object': 'file', 'bytes': len(data), 'purpose': 'batch'}
+    
+    def _create_batch(self, request: dict) -> dict:
+        with self._lock:
+            batch_id = f"batch_{next(self._ids)}"
+            batch = self.batches[batch_id] = {
+                'id': batch_id,
+                'object': 'batch',
+                'endpoint': request.get('endpoint'),
+                'input_file_id': request['input_file_id'],
+                'completion_window': request.get('completion_window'),
+                'status': 'validating',
+                'created_at': int(time.time()),
+                'output_file_id': None,
+                'error_file_id': None,
+                'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+                'metadata': request.get('metadata'),
+            }
+        threading.Thread(target=self._run_batch, args=(batch_id,), daemon=True).start()
+        return dict(batch)
+    
+    def _run_batch(self, batch_id: str):
+        """在后台处理批次：逐行生成结果，batch_latency 秒后完成"""
+        batch = self.batches[batch_id]
+        lines = [json.loads(line) for line in self.files[batch['input_file_id']].decode('utf-8').splitlines() if line.strip()]
+        with self._lock:
+            batch['status'] = 'in_progress'
+            batch['request_counts']['total'] = len(lines)
+        time.sleep(self.batch_latency)
+        
+        outputs, errors = [], []
+        for line in lines:
+            body = line['body']
+            with self._lock:
+                self.batch_requests += 1
+                model = body.get('model') or ''
+                self.models[model] = self.models.get(model, 0) + 1
+                fail = self.error_rate and random.random() < self.error_rate
+            if fail:
+                errors.append({'id': f"batch_req_{next(self._ids)}", 'custom_id': line['custom_id'], 'response': None,
+                               'error': {'code': 'server_error', 'message': 'mock batch request failed'}})
+                continue
+            prompt = ''.join(m.get('content', '') for m in body.get('messages', []))
+            outputs.append({
+                'id': f"batch_req_{next(self._ids)}",
+                'custom_id': line['custom_id'],
+                'response': {'status_code': 200, 'request_id': f"req_{next(self._ids)}", 'body': {
+                    'id': 'chatcmpl-mock',
+                    'object': 'chat.completion',
+                    'model': body.get('model'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': self.completion},
+                                 'finish_reason': 'stop'}],
+                    'usage': self._usage(prompt),
+                }},
+                'error': None,
+            })
+        
+        with self._lock:
+            for records, key in ((outputs, 'output_file_id'), (errors, 'error_file_id')):
+                if records:
+                    file_id = f"file-{next(self._ids)}"
+                    self.files[file_id] = ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')
+                    batch[key] = file_id
+            batch['request_counts'].update(completed=len(outputs), failed=len(errors))
+            batch['status'] = 'completed'
+    
+    def _handler_class(self):
+        mock = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, *args):
+                pass
+            
+            def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def _send_chunk(self, data: bytes):
+                self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+                self.wfile.flush()
+            
+            def do_GET(self):
+                parts = urlparse(self.path).path.strip('/').split('/')
+                if len(parts) >= 2 and parts[-2] == 'batches' and parts[-1] in mock.batches:
+                    with mock._lock:
+                        batch = json.loads(json.dumps(mock.batches[parts[-1]]))
+                    self._send_json(200, batch)
+                elif len(parts) >= 3 and parts[-3] == 'files' and parts[-1] == 'content' and parts[-2] in mock.files:
+                    data = mock.files[parts[-2]]
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/octet-stream')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                else:
+                    self._send_json(404, {'error': {'message': 'not found'}})
+            
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if path.endswith('/files'):
+                    self._send_json(200, mock._upload(self.headers.get('Content-Type', ''), body))
+                    return
+                if path.endswith('/batches'):
+                    self._send_json(200, mock._create_batch(json.loads(body)))
+                    return
+                
+                request = json.loads(body or b'{}')
+                with mock._lock:
+                    mock.requests += 1
+                    model = request.get('model') or ''
+                    mock.models[model] = mock.models.get(model, 0) + 1
+                    fail = mock.error_rate and random.random() < mock.error_rate
+                    if fail:
+                        mock.errors += 1
+                if fail:
+                    self._send_json(429, {'error': {'message': 'rate limited'}}, {'Retry-After': '0.05'})
+                    return
+                
+                prompt = ''.join(m.get('content', '') for m in request.get('messages', []))
+                usage = mock._usage(prompt)
+                
+                slowdown = mock._slowdown()
+                if not request.get('stream'):
+                    time.sleep(mock._delay() + slowdown)
+                    self._send_json(200, {
+                        'id': 'chatcmpl-mock',
+                        'object': 'chat.completion',
+                        'model': request.get('model'),
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': mock.completion},
+                                     'finish_reason': 'stop'}],
+                        'usage': usage,
+                    })
+                    return
+                
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                time.sleep(mock.first_token_latency + slowdown)
+                lines = mock.completion.splitlines(keepends=True)
+                rest = max(0.0, mock._delay() - mock.first_token_latency)
+                try:
+                    for line in lines:
+                        event = {'choices': [{'index': 0, 'delta': {'content': line}}]}
+                        self._send_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+                        if rest:
+                            time.sleep(rest / len(lines))
+                    final = {'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage}
+                    self._send_chunk(f"data: {json.dumps(final)}\n\n".encode('utf-8'))
+                    self._send_chunk(b"data: [DONE]\n\n")
+                    self._send_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端已关闭连接（例如对冲请求中落败的一方被取消）
+                    self.close_connection = True
+        
+        return Handler
+
+
+def temp_workspace() -> tempfile.TemporaryDirectory:
+    """离线测试使用的临时目录（cookies、输出、缓存）"""
+    return tempfile.TemporaryDirectory(prefix="bili_bench_")
@@ -0,0 +1,125 @@
+"""
+对冲请求测试：本地模拟AI服务按比例随机注入慢请求，对比关闭和开启对冲时的总结延迟分位数
+
+开启对冲时同时统计对冲比例、备用请求胜出次数和额外发出的请求数；
+--stream 时测试流式请求（以首个token判断是否对冲）。
+
+用法:
+    python benchmarks/hedge_bench.py [--calls 200] [--concurrency 4] [--slow-rate 0.05] [--slow-latency 2]
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fakes import MockLLMServer, temp_workspace
+from config.settings import Settings
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run(llm: MockLLMServer, hedge: bool, args) -> dict:
+    from src.metrics import RunMetrics
+    from src.summarizer import AISummarizer
+    
+    Settings.AI_HEDGE_ENABLED = hedge
+    summarizer = AISummarizer()
+    requests_before, slow_before = llm.requests, llm.slow
+    all_metrics = []
+    
+    def call(i: int) -> float:
+        metrics = RunMetrics(url=f"bench://{i}")
+        all_metrics.append(metrics)
+        start = time.perf_counter()
+        on_token = (lambda text: None) if args.stream else None
+        summary = summarizer.summarize(f"第{i}段测试字幕内容", f"视频{i}", on_token=on_token, metrics=metrics)
+        if not summary:
+            raise RuntimeError("总结失败")
+        return time.perf_counter() - start
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = list(executor.map(call, range(args.calls)))
+    wall = time.perf_counter() - start
+    
+    result = {
+        'calls': args.calls,
+        'llm_requests': llm.requests - requests_before,
+        'slow_injected': llm.slow - slow_before,
+        'wall_seconds': round(wall, 3),
+        'latency_p50_seconds': round(statistics.median(latencies), 3),
+        'latency_p95_seconds': round(percentile(latencies, 0.95), 3),
+        'latency_p99_seconds': round(percentile(latencies, 0.99), 3),
+        'latency_max_seconds': round(max(latencies), 3),
+    }
+    if hedge:
+        hedged = sum(m.hedged_requests for m in all_metrics)
+        result['hedged_calls'] = hedged
+        result['hedge_rate'] = round(hedged / args.calls, 4)
+        result['backup_wins'] = sum(m.hedge_wins for m in all_metrics)
+        result['policy'] = summarizer.hedge.stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对冲请求的尾延迟对比")
+    parser.add_argument("--calls", type=int, default=200, help="总结调用次数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发调用数")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="模拟AI服务的基础响应延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="基础延迟上额外的随机延迟上限（秒）")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="随机变慢的请求比例")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="变慢的请求额外增加的延迟（秒）")
+    parser.add_argument("--percentile", type=float, default=95, help="对冲阈值使用的延迟百分位")
+    parser.add_argument("--min-samples", type=int, default=20, help="开始使用百分位阈值所需的样本数")
+    parser.add_argument("--initial-delay", type=float, default=0.5, help="样本不足时的对冲阈值（秒）")
+    parser.add_argument("--min-delay", type=float, default=0.05, help="对冲阈值下限（秒）")
+    parser.add_argument("--stream", action="store_true", help="使用流式请求（以首个token判断是否对冲）")
+    args = parser.parse_args()
+    
+    import src.summarizer  # noqa: F401  导入后再调整日志级别
+    
+    # 第一次导入src模块时才会配置日志，因此在导入之后再关闭INFO日志
+    logging.getLogger("BilibiliAISummary").setLevel(logging.WARNING)
+    
+    mock = MockLLMServer(
+        latency=args.llm_latency, jitter=args.jitter, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        first_token_latency=args.llm_latency / 2 if args.stream else None,
+    )
+    with temp_workspace() as tmp, mock as llm:
+        Settings.SUMMARY_CACHE_DIR = Path(tmp) / "cache"
+        Settings.SUMMARY_CACHE_MODE = "off"
+        Settings.NEAR_DUP_MODE = "off"
+        Settings.AI_API_URL = llm.url
+        Settings.AI_API_KEY = "benchmark"
+        Settings.AI_HEDGE_PERCENTILE = args.percentile
+        Settings.AI_HEDGE_MIN_SAMPLES = args.min_samples
+        Settings.AI_HEDGE_DELAY = args.initial_delay
+        Settings.AI_HEDGE_MIN_DELAY = args.min_delay
+        
+        report = {
+            'stream': args.stream,
+            'slow_rate': args.slow_rate,
+            'slow_latency': args.slow_latency,
+            'no_hedge': run(llm, False, args),
+            'hedge': run(llm, True, args),
+        }
+    
+    before, after = report['no_hedge'], report['hedge']
+    report['p99_reduction'] = round(1 - after['latency_p99_seconds'] / before['latency_p99_seconds'], 3)
+    report['extra_request_ratio'] = round(after['llm_requests'] / before['llm_requests'] - 1, 3)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
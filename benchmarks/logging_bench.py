@@ -0,0 +1,106 @@
+"""
+日志开销测试：多个工作线程并发记录日志时，同步写出与经由队列在后台线程写出的对比
+
+标准输出替换为每次写入都有固定延迟的流（模拟终端或被重定向到慢速管道），
+统计工作线程在日志调用上花费的时间，以及日志全部写出所需的时间。
+
+用法:
+    python benchmarks/logging_bench.py [--threads 8] [--records 2000] [--write-latency 0.0002]
+"""
+import argparse
+import io
+import json
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from utils.logger import configure_logging, flush_logs, log_context
+
+
+class SlowStream(io.TextIOBase):
+    """每次写入等待固定时间的输出流"""
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.writes = 0
+        self._lock = threading.Lock()
+    
+    def write(self, text: str) -> int:
+        with self._lock:
+            time.sleep(self.latency)
+            self.writes += 1
+        return len(text)
+    
+    def flush(self):
+        pass
+
+
+def run(use_queue: bool, level: str, fmt: str, args) -> dict:
+    stream = SlowStream(args.write_latency)
+    original = sys.stdout
+    sys.stdout = stream
+    try:
+        logger = configure_logging(level=level, fmt=fmt, use_queue=use_queue)
+        worker_seconds = []
+        lock = threading.Lock()
+        
+        def worker(n: int):
+            start = time.perf_counter()
+            with log_context(job=n, video=f"BV{n:010d}"):
+                for i in range(args.records):
+                    # 与下载阶段相同的模式：少量INFO，其余为DEBUG级别的细节
+                    if i % 4 == 0:
+                        logger.info("视频标题: %s", f"测试视频 {n}-{i}")
+                    else:
+                        logger.debug("  %s: %s", "ai-zh", ['srt', 'vtt'])
+            with lock:
+                worker_seconds.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        emitted = time.perf_counter() - start
+        flush_logs()
+        drained = time.perf_counter() - start
+    finally:
+        sys.stdout = original
+        configure_logging(level=logging.WARNING, use_queue=False)
+    
+    return {
+        'queue': use_queue,
+        'level': level,
+        'format': fmt,
+        'lines_written': stream.writes,
+        'workers_done_seconds': round(emitted, 3),
+        'worker_mean_seconds': round(sum(worker_seconds) / len(worker_seconds), 3),
+        'all_written_seconds': round(drained, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步日志与队列日志的开销对比")
+    parser.add_argument("--threads", type=int, default=8, help="记录日志的工作线程数")
+    parser.add_argument("--records", type=int, default=2000, help="每个线程的日志调用次数（1/4为INFO，其余为DEBUG）")
+    parser.add_argument("--write-latency", type=float, default=0.0002, help="每次写出的模拟延迟（秒）")
+    args = parser.parse_args()
+    
+    results = [
+        run(False, "INFO", "text", args),
+        run(True, "INFO", "text", args),
+        run(True, "INFO", "json", args),
+        run(True, "WARNING", "text", args),
+    ]
+    print(json.dumps({'threads': args.threads, 'records_per_thread': args.records, 'results': results},
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+近似重复检测测试：在已有大量指纹的索引中查找附带字幕的重新上传版本、剪辑版本和无关字幕，
+记录指纹计算和索引查询的耗时、命中情况和估算的相似度
+
+索引中的填充指纹使用随机签名（无关字幕的MinHash签名与随机值无法区分），
+只有附带的字幕文件按真实内容写入索引。
+
+用法:
+    python benchmarks/near_dup_bench.py [--fingerprints 200000] [--queries 200]
+"""
+import argparse
+import hashlib
+import json
+import random
+import statistics
+import sys
+import time
+from array import array
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fakes import fixture_subtitles, temp_workspace
+from src.near_duplicate import Fingerprint, FingerprintIndex
+from src.subtitle_parser import cues_to_text, parse_subtitle_file
+
+MODEL = "bench-model"
+PROMPT_VERSION = "1"
+
+
+def random_fingerprint(rnd: random.Random, num_perm: int) -> Fingerprint:
+    return Fingerprint(
+        signature=array('I', (rnd.getrandbits(32) for _ in range(num_perm))),
+        line_hashes=array('I', sorted(rnd.getrandbits(32) for _ in range(200))),
+        content_hash=hashlib.sha256(rnd.getrandbits(64).to_bytes(8, 'little')).hexdigest(),
+        length=3000,
+    )
+
+
+def variants(text: str, rnd: random.Random) -> dict:
+    """一段字幕的重新上传版本（替换少量行、加片头片尾）、剪辑版本，以及同样字符分布的无关字幕"""
+    lines = text.splitlines()
+    reupload = list(lines)
+    for i in rnd.sample(range(len(reupload)), max(1, len(reupload) // 30)):
+        reupload[i] = f"第{i}行改动后的字幕内容"
+    reupload = ["本视频转载自其他平台，欢迎关注"] + reupload + ["感谢观看，记得一键三连"]
+    chars = [c for c in text if not c.isspace()]
+    unrelated = "\n".join("".join(rnd.choice(chars) for _ in range(12)) for _ in lines)
+    return {
+        'reupload': "\n".join(reupload),
+        'clip': "\n".join(lines[len(lines) // 6:]),
+        'unrelated': unrelated,
+    }
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近似重复检测的索引规模与查询耗时")
+    parser.add_argument("--fingerprints", type=int, default=200000, help="索引中的填充指纹数")
+    parser.add_argument("--queries", type=int, default=200, help="每种字幕变体的查询次数")
+    parser.add_argument("--threshold", type=float, default=0.7, help="最低相似度")
+    parser.add_argument("--num-perm", type=int, default=128, help="签名长度")
+    parser.add_argument("--bands", type=int, default=32, help="LSH分段数")
+    args = parser.parse_args()
+    
+    rnd = random.Random(0)
+    texts = [cues_to_text(parse_subtitle_file(path)) for path in fixture_subtitles()]
+    report = {'fingerprints': args.fingerprints, 'subtitles': len(texts), 'threshold': args.threshold}
+    
+    with temp_workspace() as tmp:
+        db_path = Path(tmp) / "fingerprints.sqlite3"
+        index = FingerprintIndex(db_path, num_perm=args.num_perm, bands=args.bands)
+        
+        start = time.perf_counter()
+        for i in range(args.fingerprints):
+            index.add(random_fingerprint(rnd, args.num_perm), f"总结 {i}", MODEL, PROMPT_VERSION, title=f"填充视频 {i}")
+        elapsed = time.perf_counter() - start
+        for i, text in enumerate(texts):
+            index.add(index.fingerprint(text), f"字幕 {i} 的总结", MODEL, PROMPT_VERSION, title=f"原视频 {i}")
+        report['insert_per_second'] = round(args.fingerprints / elapsed) if elapsed else None
+        
+        fingerprint_ms, lookup_ms = [], []
+        results = {}
+        for _ in range(args.queries):
+            for text in texts:
+                for kind, variant in variants(text, rnd).items():
+                    start = time.perf_counter()
+                    fp = index.fingerprint(variant)
+                    fingerprint_ms.append((time.perf_counter() - start) * 1000)
+                    start = time.perf_counter()
+                    match = index.find(fp, MODEL, PROMPT_VERSION, args.threshold)
+                    lookup_ms.append((time.perf_counter() - start) * 1000)
+                    entry = results.setdefault(kind, {'queries': 0, 'hits': 0, 'similarity': []})
+                    entry['queries'] += 1
+                    if match:
+                        entry['hits'] += 1
+                        entry['similarity'].append(match.similarity)
+        index.close()
+        report['db_size_mb'] = round(sum(p.stat().st_size for p in Path(tmp).glob("fingerprints.sqlite3*")) / 1024 / 1024, 1)
+    
+    report['fingerprint_ms'] = {'p50': round(percentile(fingerprint_ms, 0.5), 2), 'p99': round(percentile(fingerprint_ms, 0.99), 2)}
+    report['lookup_ms'] = {'p50': round(percentile(lookup_ms, 0.5), 3), 'p99': round(percentile(lookup_ms, 0.99), 3)}
+    report['variants'] = {
+        kind: {
+            'hit_rate': round(entry['hits'] / entry['queries'], 3),
+            'mean_similarity': round(statistics.mean(entry['similarity']), 3) if entry['similarity'] else None,
+        }
+        for kind, entry in results.items()
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
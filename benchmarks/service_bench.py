@@ -0,0 +1,131 @@
+"""
+服务模式压测：在本进程中启动服务（假的yt-dlp提取器 + 本地模拟AI服务），用多个并发客户端提交任务
+
+请求按轮询方式分配到 --videos 个不同的视频上，重复的视频在处理期间提交时会被合并，
+结果中 executions（实际处理次数）与 requests（请求数）的差值即为合并节省的处理次数。
+
+用法:
+    python benchmarks/service_bench.py [--requests 200] [--videos 20] [--clients 32] [--workers 4]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fakes import FAKE_URL_TEMPLATE, FakeBilibiliIE, MockLLMServer, install_fake_extractor, temp_workspace, write_fake_cookies
+from config.settings import Settings
+
+
+def http_json(method: str, url: str, payload: dict = None) -> dict:
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def run_client(base_url: str, video_url: str, poll_interval: float) -> dict:
+    """提交一个任务并轮询直到完成，返回耗时和是否被合并"""
+    start = time.perf_counter()
+    job = http_json('POST', f"{base_url}/jobs", {'url': video_url})
+    coalesced = job['coalesced']
+    while job['status'] not in ('done', 'failed'):
+        time.sleep(poll_interval)
+        job = http_json('GET', f"{base_url}/jobs/{job['id']}")
+    if job['status'] == 'done':
+        with urllib.request.urlopen(f"{base_url}/jobs/{job['id']}/result", timeout=60) as response:
+            response.read()
+    return {'seconds': time.perf_counter() - start, 'coalesced': coalesced, 'ok': job['status'] == 'done'}
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务模式压测")
+    parser.add_argument("--requests", type=int, default=200, help="总请求数")
+    parser.add_argument("--videos", type=int, default=20, help="不同视频的数量")
+    parser.add_argument("--clients", type=int, default=32, help="并发客户端数")
+    parser.add_argument("--workers", type=int, default=4, help="服务工作线程数")
+    parser.add_argument("--extract-latency", type=float, default=0.3, help="假提取器每次提取的模拟延迟（秒）")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="模拟AI服务的响应延迟（秒）")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="客户端轮询间隔（秒）")
+    args = parser.parse_args()
+    
+    install_fake_extractor(latency=args.extract_latency)
+    
+    from src.downloader import SubtitleDownloader
+    from src.main import save_summary
+    from src.service import SummaryService, make_server
+    from src.summarizer import AISummarizer
+    
+    # 第一次导入src模块时才会配置日志，因此在导入之后再关闭INFO日志
+    logging.getLogger("BilibiliAISummary").setLevel(logging.WARNING)
+    
+    with temp_workspace() as tmp, MockLLMServer(latency=args.llm_latency) as llm:
+        tmp = Path(tmp)
+        Settings.COOKIES_FILE = write_fake_cookies(tmp)
+        Settings.OUTPUT_DIR = tmp / "output"
+        Settings.SEARCH_INDEX_DB = tmp / "search.sqlite3"
+        Settings.SUMMARY_CACHE_MODE = "off"
+        Settings.NEAR_DUP_MODE = "off"
+        Settings.SUBTITLE_STORE_MODE = "off"
+        Settings.AI_API_URL = llm.url
+        Settings.AI_API_KEY = "benchmark"
+        
+        service = SummaryService(
+            SubtitleDownloader(), AISummarizer(), save_summary,
+            workers=args.workers, queue_size=args.requests,
+        ).start()
+        server = make_server(service, '127.0.0.1', 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = "http://127.0.0.1:%d" % server.server_address[1]
+        
+        video_urls = [FAKE_URL_TEMPLATE.format(f"BVS{i % args.videos:06d}") for i in range(args.requests)]
+        start = time.perf_counter()
+        # yt-dlp的输出被丢弃
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            with ThreadPoolExecutor(max_workers=args.clients) as executor:
+                results = list(executor.map(lambda u: run_client(base_url, u, args.poll_interval), video_urls))
+        elapsed = time.perf_counter() - start
+        
+        server.shutdown()
+        server.server_close()
+        service.stop(timeout=5)
+        llm_requests = llm.requests
+    
+    latencies = [r['seconds'] for r in results]
+    report = {
+        'requests': args.requests,
+        'videos': args.videos,
+        'clients': args.clients,
+        'workers': args.workers,
+        'succeeded': sum(1 for r in results if r['ok']),
+        'coalesced': sum(1 for r in results if r['coalesced']),
+        'executions': service.executions,
+        'extractor_calls': FakeBilibiliIE.calls,
+        'llm_requests': llm_requests,
+        'wall_seconds': round(elapsed, 3),
+        'requests_per_second': round(args.requests / elapsed, 2),
+        'latency_p50_seconds': round(statistics.median(latencies), 3),
+        'latency_p95_seconds': round(percentile(latencies, 0.95), 3),
+        'latency_max_seconds': round(max(latencies), 3),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
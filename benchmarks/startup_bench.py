@@ -0,0 +1,87 @@
+"""
+启动耗时测试：对比只总结已有字幕的路径与需要下载字幕的路径的进程启动开销
+
+每项在新的Python进程中运行，取多次运行的中位数。
+
+用法:
+    python benchmarks/startup_bench.py [--repeat 10] [--json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+
+# 场景名称 -> 在新进程中执行的代码
+SCENARIOS = {
+    # 只导入主程序（--help、--from-subtitle、resummarize 走这条路径）
+    'import_main': "import src.main",
+    # 主程序 + 实际下载时才会加载的yt-dlp
+    'import_main_and_yt_dlp': "import src.main; import yt_dlp",
+    # 单独导入yt-dlp的开销
+    'import_yt_dlp': "import yt_dlp",
+    # 空进程，作为基线
+    'python_baseline': "pass",
+}
+
+
+def run_once(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", f"import sys; sys.path.insert(0, {str(project_root)!r}); {code}"],
+        cwd=project_root, check=True, stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def yt_dlp_loaded_by_main() -> bool:
+    """导入主程序后yt-dlp是否已被加载"""
+    output = subprocess.run(
+        [sys.executable, "-c",
+         f"import sys; sys.path.insert(0, {str(project_root)!r}); import src.main; print('yt_dlp' in sys.modules)"],
+        cwd=project_root, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+    return output == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时测试")
+    parser.add_argument("--repeat", type=int, default=10, help="每项运行次数，取中位数")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+    
+    # 预热一次，避免首次运行受字节码编译和磁盘缓存影响
+    for code in SCENARIOS.values():
+        run_once(code)
+    
+    results = {}
+    for name, code in SCENARIOS.items():
+        samples = [run_once(code) for _ in range(args.repeat)]
+        results[name] = {
+            'median_ms': round(statistics.median(samples) * 1000, 1),
+            'min_ms': round(min(samples) * 1000, 1),
+        }
+    
+    report = {
+        'yt_dlp_loaded_by_main': yt_dlp_loaded_by_main(),
+        'saved_ms': round(results['import_main_and_yt_dlp']['median_ms'] - results['import_main']['median_ms'], 1),
+        'scenarios': results,
+    }
+    
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    
+    print(f"{'scenario':<26}{'median_ms':>12}{'min_ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['median_ms']:>12}{r['min_ms']:>10}")
+    print(f"\n导入主程序时加载yt-dlp: {report['yt_dlp_loaded_by_main']}")
+    print(f"不下载时节省的启动时间: {report['saved_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+字幕解析性能对比：旧版基于正则替换的 _parse_subtitle 与单次遍历的 subtitle_parser
+
+用法:
+    python benchmarks/subtitle_parser_bench.py [--hours 3] [--repeat 5] [--json]
+
+测试样本为 output/ 中附带的 *.ai-zh.srt 以及按该文件风格生成的多小时合成字幕。
+"""
+import argparse
+import json
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.subtitle_parser import cues_to_text, parse_subtitle_file
+
+
+def legacy_parse_subtitle(subtitle_file: Path) -> str:
+    """旧版 SubtitleDownloader._parse_subtitle 的实现（去掉日志），用作对比基准"""
+    file_ext = subtitle_file.suffix.lower()
+    with open(subtitle_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    if file_ext == '.vtt':
+        content = re.sub(r'WEBVTT.*?\n\n', '', content, flags=re.DOTALL)
+        content = re.sub(r'\d{2}:\d{2}:\d{2}\.\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}\.\d{3}.*?\n', '\n', content)
+    elif file_ext == '.srt':
+        lines = content.split('\n')
+        text_lines = []
+        skip_next = False
+        for i, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                skip_next = False
+                continue
+            if re.match(r'^\d+$', line):
+                skip_next = True
+                continue
+            if skip_next and re.match(r'\d{2}:\d{2}:\d{2}[,.]\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}[,.]\d{3}', line):
+                skip_next = False
+                continue
+            if not skip_next:
+                text_lines.append(line)
+        content = '\n'.join(text_lines)
+    
+    content = re.sub(r'<[^>]+>', '', content)
+    content = re.sub(r'\n{3,}', '\n\n', content)
+    lines = [line.strip() for line in content.split('\n') if line.strip()]
+    return '\n'.join(lines)
+
+
+def new_parse_subtitle(subtitle_file: Path) -> str:
+    """新版解析：得到字幕条目后渲染为纯文本"""
+    return cues_to_text(parse_subtitle_file(subtitle_file))
+
+
+def _srt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def make_synthetic_srt(sample: Path, hours: float, target: Path) -> Path:
+    """重复样本字幕的文本，生成总时长约为hours小时、每条约1.5秒的SRT文件"""
+    texts = [line for line in new_parse_subtitle(sample).split('\n') if line] or ["字幕"]
+    total = int(hours * 3600 / 1.5)
+    with open(target, 'w', encoding='utf-8') as f:
+        for i in range(total):
+            start = i * 1.5
+            f.write(f"{i + 1}\n{_srt_time(start)} --> {_srt_time(start + 1.4)}\n{texts[i % len(texts)]}\n\n")
+    return target
+
+
+def measure(func, subtitle_file: Path, repeat: int) -> dict:
+    """返回最快一次的耗时以及峰值内存"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(subtitle_file)
+        best = min(best, time.perf_counter() - start)
+    
+    tracemalloc.start()
+    func(subtitle_file)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    size_mb = subtitle_file.stat().st_size / 1024 / 1024
+    return {
+        'seconds': round(best, 6),
+        'mb_per_second': round(size_mb / best, 2) if best else None,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字幕解析性能对比")
+    parser.add_argument("--hours", type=float, default=3, help="合成字幕的时长（小时）")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数，取最快一次")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+    
+    samples = sorted((project_root / "output").glob("*/*.ai-zh.srt"))
+    if not samples:
+        print("未找到 output/*/*.ai-zh.srt 样本字幕", file=sys.stderr)
+        sys.exit(1)
+    
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic = make_synthetic_srt(samples[0], args.hours, Path(tmp) / "synthetic.srt")
+        for name, subtitle_file in (("sample", samples[0]), (f"synthetic_{args.hours:g}h", synthetic)):
+            if legacy_parse_subtitle(subtitle_file) != new_parse_subtitle(subtitle_file):
+                print(f"警告: {name} 新旧解析结果不一致", file=sys.stderr)
+            cue_count = len(parse_subtitle_file(subtitle_file))
+            for impl, func in (("legacy", legacy_parse_subtitle), ("cue_parser", new_parse_subtitle)):
+                result = measure(func, subtitle_file, args.repeat)
+                result.update({
+                    'file': name,
+                    'impl': impl,
+                    'size_kb': round(subtitle_file.stat().st_size / 1024, 1),
+                    'cues': cue_count,
+                    'cues_per_second': round(cue_count / result['seconds']) if result['seconds'] else None,
+                })
+                results.append(result)
+    
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    
+    print(f"{'file':<16}{'impl':<12}{'size_kb':>10}{'cues':>8}{'ms':>10}{'MB/s':>8}{'cues/s':>10}{'peak_kb':>10}")
+    for r in results:
+        print(f"{r['file']:<16}{r['impl']:<12}{r['size_kb']:>10}{r['cues']:>8}"
+              f"{r['seconds'] * 1000:>10.2f}{r['mb_per_second']:>8}{r['cues_per_second']:>10}{r['peak_memory_kb']:>10}")
+
+
+if __name__ == "__main__":
+    main()
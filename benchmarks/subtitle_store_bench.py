@@ -0,0 +1,88 @@
+"""
+字幕存储测试：同一批视频被多次运行处理时（例如重复提交、监视模式重试、换模型重新总结），
+对比不使用字幕存储和使用字幕存储时对Bilibili的请求次数和耗时
+
+每一轮使用新的下载器（相当于新的一次运行），字幕写入输出目录中新的时间戳子目录。
+
+用法:
+    python benchmarks/subtitle_store_bench.py [--videos 50] [--runs 3] [--threads 4] [--extract-latency 0.1]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fakes import FAKE_URL_TEMPLATE, FakeBilibiliIE, install_fake_extractor, temp_workspace, write_fake_cookies
+from config.settings import Settings
+
+
+def run(mode: str, urls, args) -> dict:
+    from src.downloader import SubtitleDownloader
+    
+    Settings.SUBTITLE_STORE_MODE = mode
+    FakeBilibiliIE.calls = 0
+    rounds = []
+    for _ in range(args.runs):
+        calls_before = FakeBilibiliIE.calls
+        start = time.perf_counter()
+        with SubtitleDownloader() as downloader:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                with ThreadPoolExecutor(max_workers=args.threads) as executor:
+                    results = list(executor.map(downloader.fetch_subtitle, urls))
+        rounds.append({
+            'seconds': round(time.perf_counter() - start, 3),
+            'extractor_calls': FakeBilibiliIE.calls - calls_before,
+            'failures': sum(1 for r in results if not r),
+        })
+    return {
+        'extractor_calls': FakeBilibiliIE.calls,
+        'seconds': round(sum(r['seconds'] for r in rounds), 3),
+        'runs': rounds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字幕存储对重复处理同一批视频的影响")
+    parser.add_argument("--videos", type=int, default=50, help="视频数")
+    parser.add_argument("--runs", type=int, default=3, help="处理同一批视频的次数")
+    parser.add_argument("--threads", type=int, default=4, help="并发线程数")
+    parser.add_argument("--extract-latency", type=float, default=0.1, help="假提取器每次提取的模拟延迟（秒）")
+    args = parser.parse_args()
+    
+    install_fake_extractor(latency=args.extract_latency)
+    import src.downloader  # noqa: F401  导入后再调整日志级别
+    
+    # 第一次导入src模块时才会配置日志，因此在导入之后再关闭INFO日志
+    logging.getLogger("BilibiliAISummary").setLevel(logging.WARNING)
+    
+    urls = [FAKE_URL_TEMPLATE.format(f"BVT{i:06d}") for i in range(args.videos)]
+    report = {'videos': args.videos, 'runs': args.runs, 'extract_latency': args.extract_latency}
+    with temp_workspace() as tmp:
+        tmp = Path(tmp)
+        Settings.COOKIES_FILE = write_fake_cookies(tmp)
+        Settings.OUTPUT_DIR = tmp / "output"
+        Settings.SUBTITLE_STORE_DIR = tmp / "subtitles"
+        Settings.WRITE_METRICS_FILE = False
+        
+        report['no_store'] = run("off", urls, args)
+        report['store'] = run("on", urls, args)
+        # 输出目录中的字幕文件是存储文件的硬链接
+        linked = [p for p in Settings.OUTPUT_DIR.glob("*/*.srt") if p.stat().st_nlink > 1]
+        report['linked_subtitle_files'] = len(linked)
+    
+    before, after = report['no_store'], report['store']
+    report['extractor_calls_saved'] = before['extractor_calls'] - after['extractor_calls']
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
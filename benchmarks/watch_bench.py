@@ -0,0 +1,93 @@
+"""
+监视模式轮询开销测试：对假的UP主空间连续轮询，统计每轮的提取次数、列表页请求次数和耗时
+
+第一轮处理所有新视频；之后每轮只新增 --new-per-poll 个投稿，已处理的视频不应再被提取。
+
+用法:
+    python benchmarks/watch_bench.py [--videos 50] [--polls 3] [--new-per-poll 2] [--limit 30]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fakes import FAKE_SPACE_TEMPLATE, FakeBilibiliIE, FakeSpaceIE, MockLLMServer, install_fake_extractor, temp_workspace, write_fake_cookies
+from config.settings import Settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监视模式轮询开销测试")
+    parser.add_argument("--videos", type=int, default=50, help="UP主空间中初始的投稿数")
+    parser.add_argument("--polls", type=int, default=3, help="轮询轮数")
+    parser.add_argument("--new-per-poll", type=int, default=2, help="每轮之间新增的投稿数")
+    parser.add_argument("--limit", type=int, default=30, help="每轮列出的最新投稿数，0表示全部")
+    parser.add_argument("--workers", type=int, default=4, help="视频处理并发数")
+    parser.add_argument("--extract-latency", type=float, default=0.05, help="假提取器每次请求的模拟延迟（秒）")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="模拟AI服务的响应延迟（秒）")
+    args = parser.parse_args()
+    
+    install_fake_extractor(latency=args.extract_latency)
+    FakeSpaceIE.videos = args.videos
+    
+    from src.downloader import SubtitleDownloader
+    from src.main import save_summary
+    from src.summarizer import AISummarizer
+    from src.video_index import VideoIndex
+    from src.watch import ChannelWatcher
+    
+    # 第一次导入src模块时才会配置日志，因此在导入之后再关闭INFO日志
+    logging.getLogger("BilibiliAISummary").setLevel(logging.WARNING)
+    
+    polls = []
+    with temp_workspace() as tmp, MockLLMServer(latency=args.llm_latency) as llm:
+        tmp = Path(tmp)
+        Settings.COOKIES_FILE = write_fake_cookies(tmp)
+        Settings.OUTPUT_DIR = tmp / "output"
+        Settings.SEARCH_INDEX_DB = tmp / "search.sqlite3"
+        Settings.SUMMARY_CACHE_MODE = "off"
+        Settings.NEAR_DUP_MODE = "off"
+        Settings.SUBTITLE_STORE_MODE = "off"
+        Settings.WRITE_METRICS_FILE = False
+        Settings.AI_API_URL = llm.url
+        Settings.AI_API_KEY = "benchmark"
+        
+        index = VideoIndex(tmp / "index.sqlite3")
+        watcher = ChannelWatcher(
+            SubtitleDownloader(), AISummarizer(), save_summary, index, workers=args.workers, limit=args.limit,
+        )
+        channel = FAKE_SPACE_TEMPLATE.format(1)
+        for i in range(args.polls):
+            if i:
+                FakeSpaceIE.videos += args.new_per_poll
+            calls, pages, llm_before = FakeBilibiliIE.calls, FakeSpaceIE.page_calls, llm.requests
+            start = time.perf_counter()
+            # yt-dlp的输出被丢弃
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                result = watcher.poll(channel)
+            polls.append({
+                'poll': i + 1,
+                'listed': result.listed,
+                'pending': result.pending,
+                'processed': result.processed,
+                'failed': result.failed,
+                'list_pages': FakeSpaceIE.page_calls - pages,
+                'extractor_calls': FakeBilibiliIE.calls - calls,
+                'llm_requests': llm.requests - llm_before,
+                'seconds': round(time.perf_counter() - start, 3),
+            })
+        stats = index.stats()
+        index.close()
+    
+    print(json.dumps({'limit': args.limit, 'polls': polls, 'index': stats}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 """配置管理"""
 import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 
 # 加载.env文件
@@ -17,6 +17,14 @@ class Settings:
     # Cookies文件路径
     COOKIES_FILE = BASE_DIR / "cookies.txt"
     
+    # 多账号cookies池（逗号分隔的cookies文件或目录，目录中的所有 .txt 文件各为一个账号），为空时只使用COOKIES_FILE
+    COOKIES_FILES = os.getenv("COOKIES_FILES", "")
+    COOKIE_POOL_STRATEGY = os.getenv("COOKIE_POOL_STRATEGY", "lru")  # lru / round_robin
+    COOKIE_ACCOUNT_CONCURRENCY = int(os.getenv("COOKIE_ACCOUNT_CONCURRENCY", "0"))  # 每个账号的并发请求数上限，0为不限制
+    COOKIE_GLOBAL_CONCURRENCY = int(os.getenv("COOKIE_GLOBAL_CONCURRENCY", "0"))  # 所有账号合计的并发请求数上限，0为不限制
+    COOKIE_COOLDOWN = float(os.getenv("COOKIE_COOLDOWN", "300"))  # 账号被限流后的冷却时间（秒），连续被限流时加倍
+    COOKIE_MAX_COOLDOWN = float(os.getenv("COOKIE_MAX_COOLDOWN", "3600"))  # 冷却时间上限（秒）
+    
     # 输出目录
     OUTPUT_DIR = BASE_DIR / "output"
     
@@ -25,16 +33,125 @@ class Settings:
     AI_API_KEY = os.getenv("AI_API_KEY", "")
     AI_MODEL = os.getenv("AI_MODEL", "gpt-4o-mini")
     
+    # AI API请求配置
+    AI_HTTP_POOL_SIZE = int(os.getenv("AI_HTTP_POOL_SIZE", "10"))  # 连接池大小
+    AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "3"))  # 429/5xx/网络错误最大重试次数
+    AI_RETRY_BACKOFF = float(os.getenv("AI_RETRY_BACKOFF", "1.0"))  # 指数退避基数（秒）
+    AI_RETRY_MAX_BACKOFF = float(os.getenv("AI_RETRY_MAX_BACKOFF", "60"))  # 单次最长等待（秒）
+    AI_REQUESTS_PER_MINUTE = float(os.getenv("AI_REQUESTS_PER_MINUTE", "0"))  # 每分钟请求数上限，0为不限制
+    AI_TOKENS_PER_MINUTE = float(os.getenv("AI_TOKENS_PER_MINUTE", "0"))  # 每分钟token数上限，0为不限制
+    
+    # 对冲请求配置（超过延迟阈值仍未返回时发出备用请求，取先返回的结果）
+    AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+    AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "95"))  # 阈值取近期延迟的该百分位
+    AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "30"))  # 样本不足时使用的阈值（秒）
+    AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", "2"))  # 阈值下限（秒）
+    AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))  # 开始使用百分位阈值所需的样本数
+    AI_HEDGE_MODEL = os.getenv("AI_HEDGE_MODEL", "")  # 备用请求使用的模型，为空时与主请求相同
+    AI_HEDGE_API_URL = os.getenv("AI_HEDGE_API_URL", "")  # 备用请求的接口地址，为空时与主请求相同
+    AI_HEDGE_API_KEY = os.getenv("AI_HEDGE_API_KEY", "")  # 备用接口的API密钥，为空时与主请求相同
+    
+    # 批处理接口配置（OpenAI Batch API，大批量离线总结）
+    AI_BATCH_API_BASE = os.getenv("AI_BATCH_API_BASE", "")  # 接口根地址（含 /v1），为空时由AI_API_URL推导
+    AI_BATCH_COMPLETION_WINDOW = os.getenv("AI_BATCH_COMPLETION_WINDOW", "24h")  # 批次完成时限
+    AI_BATCH_POLL_INTERVAL = float(os.getenv("AI_BATCH_POLL_INTERVAL", "60"))  # 查询批次状态的间隔（秒）
+    AI_BATCH_STATE_DIR = Path(os.getenv("AI_BATCH_STATE_DIR", str(BASE_DIR / ".cache" / "batches")))  # 运行中批次的状态
+    
     # yt-dlp配置
     YT_DLP_SUBTITLE_LANG = "zh-CN,zh,en"  # 优先中文字幕
+    SAVE_SUBTITLE_FILES = os.getenv("SAVE_SUBTITLE_FILES", "true").lower() in ("1", "true", "yes")  # 是否在输出目录保存字幕文件
+    
+    # 字幕存储配置（下载过的字幕按BV号+分P+语言+格式保存，跨运行共享，避免重复请求Bilibili）
+    SUBTITLE_STORE_DIR = Path(os.getenv("SUBTITLE_STORE_DIR", str(BASE_DIR / ".cache" / "subtitles")))
+    SUBTITLE_STORE_MODE = os.getenv("SUBTITLE_STORE_MODE", "on")  # on / off / refresh / readonly
+    SUBTITLE_STORE_MAX_AGE_DAYS = float(os.getenv("SUBTITLE_STORE_MAX_AGE_DAYS", "30"))  # 有效期，0为不过期
+    
+    # 批量处理配置
+    BATCH_DOWNLOAD_WORKERS = int(os.getenv("BATCH_DOWNLOAD_WORKERS", "2"))  # 字幕下载并发数
+    BATCH_SUMMARIZE_WORKERS = int(os.getenv("BATCH_SUMMARIZE_WORKERS", "4"))  # AI总结并发数
+    BATCH_QUEUE_SIZE = int(os.getenv("BATCH_QUEUE_SIZE", "8"))  # 阶段间队列容量
+    
+    # 服务模式配置
+    SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+    SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+    SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "4"))  # 处理任务的工作线程数
+    SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "100"))  # 等待队列容量，队列满时拒绝新任务
+    SERVICE_MAX_JOBS = int(os.getenv("SERVICE_MAX_JOBS", "1000"))  # 内存中保留的任务记录数
+    
+    # 字幕预处理配置
+    PREPROCESS_SUBTITLES = os.getenv("PREPROCESS_SUBTITLES", "true").lower() in ("1", "true", "yes")
+    PREPROCESS_DEDUP_SIMILARITY = float(os.getenv("PREPROCESS_DEDUP_SIMILARITY", "0.9"))  # 相邻字幕相似度达到该值视为重复
+    PREPROCESS_PARAGRAPH_GAP = float(os.getenv("PREPROCESS_PARAGRAPH_GAP", "1.5"))  # 停顿超过该秒数时分段
+    PREPROCESS_PARAGRAPH_CHARS = int(os.getenv("PREPROCESS_PARAGRAPH_CHARS", "200"))  # 段落最大字符数
+    
+    # 长字幕分块总结配置（按估算token数）
+    SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "12000"))  # 超过该值时分块总结，也是每块的上限
+    SUMMARY_CHUNK_OVERLAP_TOKENS = int(os.getenv("SUMMARY_CHUNK_OVERLAP_TOKENS", "200"))  # 相邻分块的重叠
+    SUMMARY_CHUNK_WORKERS = int(os.getenv("SUMMARY_CHUNK_WORKERS", "4"))  # 分块总结并发数
+    
+    # 总结缓存配置
+    SUMMARY_CACHE_DIR = Path(os.getenv("SUMMARY_CACHE_DIR", str(BASE_DIR / ".cache" / "summaries")))
+    SUMMARY_CACHE_MODE = os.getenv("SUMMARY_CACHE_MODE", "on")  # on / off / refresh / readonly
+    SUMMARY_CACHE_MAX_AGE_DAYS = float(os.getenv("SUMMARY_CACHE_MAX_AGE_DAYS", "30"))
+    SUMMARY_CACHE_MAX_SIZE_MB = float(os.getenv("SUMMARY_CACHE_MAX_SIZE_MB", "200"))
+    
+    # 近似重复检测配置（搬运、重新上传、剪辑版本复用已有总结）
+    NEAR_DUP_MODE = os.getenv("NEAR_DUP_MODE", "off")  # on / off / refresh / readonly，默认关闭
+    NEAR_DUP_DB = Path(os.getenv("NEAR_DUP_DB", str(BASE_DIR / ".cache" / "fingerprints.sqlite3")))
+    NEAR_DUP_REUSE_THRESHOLD = float(os.getenv("NEAR_DUP_REUSE_THRESHOLD", "0.9"))  # 不低于该相似度时直接复用总结
+    NEAR_DUP_DIFF_THRESHOLD = float(os.getenv("NEAR_DUP_DIFF_THRESHOLD", "0.7"))  # 不低于该相似度时只总结新增内容，不低于复用阈值时不使用
+    NEAR_DUP_MIN_CHARS = int(os.getenv("NEAR_DUP_MIN_CHARS", "200"))  # 字幕（去掉空白和标点后）少于该字数时不检测
+    NEAR_DUP_NUM_PERM = int(os.getenv("NEAR_DUP_NUM_PERM", "128"))  # 签名长度，修改后需要删除已有索引
+    NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "32"))  # LSH分段数，必须整除签名长度
+    NEAR_DUP_SHINGLE_SIZE = int(os.getenv("NEAR_DUP_SHINGLE_SIZE", "5"))  # 每个shingle的字符数
+    
+    # 运行指标配置
+    WRITE_METRICS_FILE = os.getenv("WRITE_METRICS_FILE", "true").lower() in ("1", "true", "yes")  # 是否在输出子目录写出metrics.json
+    METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "")  # Prometheus textfile路径，为空时不写出
+    
+    # 监视模式配置（UP主投稿轮询）
+    WATCH_INDEX_DB = Path(os.getenv("WATCH_INDEX_DB", str(BASE_DIR / ".cache" / "index.sqlite3")))  # 已处理视频索引
+    WATCH_INTERVAL = float(os.getenv("WATCH_INTERVAL", "1800"))  # 轮询间隔（秒）
+    WATCH_LIST_LIMIT = int(os.getenv("WATCH_LIST_LIMIT", "30"))  # 每次轮询列出的最新投稿数
+    WATCH_RETRY_HOURS = float(os.getenv("WATCH_RETRY_HOURS", "6"))  # 失败视频（如字幕尚未生成）的重试间隔
+    
+    # 检索索引配置
+    SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")  # 保存总结时是否更新索引
+    SEARCH_INDEX_DB = Path(os.getenv("SEARCH_INDEX_DB", str(BASE_DIR / ".cache" / "search.sqlite3")))
+    
+    # 日志配置
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")  # 生产环境可设为WARNING，不输出每个视频的处理过程
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text / json
+    LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")  # 是否由后台线程写出日志
+    
+    # 性能分析配置（--profile）
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # 调用栈采样间隔（秒）
+    PROFILE_ALLOCATION_SAMPLES = int(os.getenv("PROFILE_ALLOCATION_SAMPLES", "3"))  # 每个阶段做内存快照比较的执行次数，0为不记录
+    PROFILE_TOP = int(os.getenv("PROFILE_TOP", "30"))  # 报告中每个阶段列出的函数数和内存分配位置数
+    
+    # 检查点配置（重新运行时跳过已完成的阶段）
+    RESUME = os.getenv("RESUME", "true").lower() in ("1", "true", "yes")  # 是否使用检查点
+    CHECKPOINT_DIR = Path(os.getenv("CHECKPOINT_DIR", str(BASE_DIR / ".cache" / "checkpoints")))
     
     @classmethod
     def ensure_output_dir(cls):
         """确保输出目录存在"""
         cls.OUTPUT_DIR.mkdir(exist_ok=True)
     
+    @classmethod
+    def cookie_files(cls) -> List[Path]:
+        """cookies池中的cookies文件，未配置COOKIES_FILES时只有COOKIES_FILE"""
+        if not cls.COOKIES_FILES.strip():
+            return [cls.COOKIES_FILE]
+        files = []
+        for entry in filter(None, (e.strip() for e in cls.COOKIES_FILES.split(","))):
+            path = Path(entry)
+            files.extend(sorted(path.glob("*.txt")) if path.is_dir() else [path])
+        return files
+    
     @classmethod
     def validate_cookies(cls) -> bool:
-        """验证cookies文件是否存在"""
-        return cls.COOKIES_FILE.exists() and cls.COOKIES_FILE.is_file()
+        """验证cookies文件是否存在（使用cookies池时所有文件都必须存在）"""
+        files = cls.cookie_files()
+        return bool(files) and all(f.exists() and f.is_file() for f in files)
 
@@ -0,0 +1,429 @@
+"""批量处理：字幕下载与AI总结两个阶段流水线并行执行"""
+import queue
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+from config.settings import Settings
+from utils.logger import log_context, setup_logger
+from utils.video import video_key
+from src.checkpoint import METADATA, PLAYLIST, CheckpointStore
+from src.collection import CollectionPipeline, CollectionResult, PartResult, part_label
+from src.downloader import PlaylistEntry, PlaylistResult
+from src.metrics import RunMetrics
+from src.preprocess import prepare_subtitle_text
+
+logger = setup_logger()
+
+# 队列结束标记
+_SENTINEL = object()
+
+
+@dataclass
+class BatchResult:
+    """单个视频的处理结果"""
+    url: str
+    success: bool = False
+    video_title: Optional[str] = None
+    output_file: Optional[Path] = None
+    error: Optional[str] = None
+    metrics: Optional[RunMetrics] = None
+    # 总结已在之前的运行中完成（根据检查点跳过）
+    resumed: bool = False
+    # 多P视频/合集展开后各分P的结果；此时 output_file 为合集文档
+    parts: List['BatchResult'] = field(default_factory=list)
+
+
+@dataclass
+class _Collection:
+    """批量任务中展开的多P视频/合集"""
+    playlist: PlaylistResult
+    result: BatchResult
+    name: str
+    jobs: List['_Job'] = field(default_factory=list)
+    remaining: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+@dataclass
+class _Job:
+    """下载队列中的一项：输入的URL，或多P视频/合集展开后的一个分P"""
+    result: BatchResult
+    name: str
+    collection: Optional[_Collection] = None
+    entry: Optional[PlaylistEntry] = None
+    label: Optional[str] = None
+    summary: Optional[str] = None
+
+
+class BatchPipeline:
+    """
+    批量流水线
+    
+    下载阶段和总结阶段各自拥有独立的工作线程，阶段之间通过有界队列连接，
+    因此第N个视频的AI总结可以与第N+1个视频的字幕下载同时进行。
+    单个视频失败只会记录在结果中，不会中断整个批次。
+    多P视频/合集在下载阶段展开为各分P任务重新放入下载队列（各自拥有检查点），
+    最后一个分P完成后生成总览和合集文档，与单视频模式的输出一致。
+    """
+    
+    def __init__(
+        self,
+        downloader,
+        summarizer,
+        save_func: Callable[..., Path],
+        download_workers: Optional[int] = None,
+        summarize_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+    ):
+        """
+        初始化流水线
+        
+        Args:
+            downloader: 字幕下载器（SubtitleDownloader）
+            summarizer: AI总结器（AISummarizer）
+            save_func: 保存总结的函数，签名为 (summary, video_title, sub_dir, subtitle=None) -> Path
+            download_workers: 下载线程数，默认使用Settings中的配置
+            summarize_workers: 总结线程数，默认使用Settings中的配置
+            queue_size: 阶段间队列容量，默认使用Settings中的配置
+            checkpoints: 检查点（可选）；已完成总结的视频直接跳过，已下载字幕的视频不再下载
+        """
+        self.downloader = downloader
+        self.summarizer = summarizer
+        self.save_func = save_func
+        self.download_workers = max(1, download_workers or Settings.BATCH_DOWNLOAD_WORKERS)
+        self.summarize_workers = max(1, summarize_workers or Settings.BATCH_SUMMARIZE_WORKERS)
+        self.queue_size = max(1, queue_size or Settings.BATCH_QUEUE_SIZE)
+        self.checkpoints = checkpoints
+    
+    def run(self, urls: Iterable[str]) -> List[BatchResult]:
+        """
+        批量处理视频
+        
+        Args:
+            urls: 视频URL列表
+        
+        Returns:
+            与输入顺序一致的处理结果列表（多P视频/合集的分P结果在 parts 中）
+        """
+        urls = list(urls)
+        results = [BatchResult(url=url, metrics=RunMetrics(url=url)) for url in urls]
+        if not urls:
+            return results
+        
+        logger.info(
+            f"批量处理 {len(urls)} 个视频（下载线程: {self.download_workers}，"
+            f"总结线程: {self.summarize_workers}）"
+        )
+        
+        # 下载线程会把展开的分P放回下载队列，因此该队列不设上限（其中只有待处理的任务）
+        url_queue: queue.Queue = queue.Queue()
+        subtitle_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        
+        download_threads = [
+            threading.Thread(
+                target=self._download_worker,
+                args=(url_queue, subtitle_queue),
+                name=f"download-{i}",
+                daemon=True,
+            )
+            for i in range(self.download_workers)
+        ]
+        summarize_threads = [
+            threading.Thread(
+                target=self._summarize_worker,
+                args=(subtitle_queue,),
+                name=f"summarize-{i}",
+                daemon=True,
+            )
+            for i in range(self.summarize_workers)
+        ]
+        for thread in download_threads + summarize_threads:
+            thread.start()
+        
+        for index, result in enumerate(results):
+            url_queue.put(_Job(result=result, name=str(index + 1)))
+        # 等待所有任务（包括展开的分P）下载完成后再通知下载线程退出
+        url_queue.join()
+        for _ in download_threads:
+            url_queue.put(_SENTINEL)
+        for thread in download_threads:
+            thread.join()
+        
+        # 下载阶段全部结束后再通知总结线程退出
+        for _ in summarize_threads:
+            subtitle_queue.put(_SENTINEL)
+        for thread in summarize_threads:
+            thread.join()
+        
+        succeeded = sum(1 for r in results if r.success)
+        resumed = sum(1 for r in results if r.resumed)
+        logger.info(
+            f"批量处理完成: 成功 {succeeded}（其中 {resumed} 个在之前的运行中已完成），失败 {len(results) - succeeded}"
+        )
+        return results
+    
+    def _download_worker(self, url_queue: queue.Queue, subtitle_queue: queue.Queue):
+        """下载阶段工作线程"""
+        while True:
+            job = url_queue.get()
+            if job is _SENTINEL:
+                url_queue.task_done()
+                break
+            try:
+                with log_context(job=job.name, video=video_key(job.result.url)):
+                    item = self._download(job, url_queue)
+                    if not item and job.collection:
+                        self._part_done(job)
+                if item:
+                    subtitle_queue.put(item)
+            finally:
+                url_queue.task_done()
+    
+    def _download(self, job: _Job, url_queue: queue.Queue) -> Optional[tuple]:
+        """获取并预处理一个视频的字幕，返回放入总结队列的条目；跳过、失败或展开为分P时返回None"""
+        result = job.result
+        checkpoint = self.checkpoints.open(result.url) if self.checkpoints else None
+        if checkpoint and not job.collection:
+            # 多P视频的整体URL与P1使用同一个检查点，记录过分P列表时按合集处理
+            stage = checkpoint.get(PLAYLIST)
+            if stage and stage.get('url') == result.url:
+                if not skip_completed_collection(result, stage, getattr(self.summarizer, 'model', None)):
+                    self._expand(job, stored_playlist(stage), url_queue)
+                return None
+        if checkpoint and self._skip_completed(job, checkpoint):
+            return None
+        try:
+            sub_dir = job.collection.playlist.sub_dir if job.collection else None
+            subtitle = self.downloader.fetch(result.url, metrics=result.metrics, sub_dir=sub_dir, checkpoint=checkpoint)
+            if isinstance(subtitle, PlaylistResult):
+                if job.collection:
+                    raise ValueError("分P本身又是多P视频/合集")
+                if checkpoint:
+                    mark_playlist(checkpoint, result.url, subtitle)
+                self._expand(job, subtitle, url_queue)
+                return None
+            subtitle_text = None
+            if subtitle:
+                with result.metrics.timer('preprocess'):
+                    subtitle_text = prepare_subtitle_text(subtitle.cues, subtitle.text)
+        except Exception as e:
+            subtitle, subtitle_text = None, None
+            result.error = f"字幕下载出错: {str(e)}"
+        
+        if not subtitle or not subtitle_text:
+            result.error = result.error or "字幕下载失败"
+            result.metrics.error = result.error
+            logger.error("%s: %s", result.url, result.error)
+            return None
+        
+        result.video_title = subtitle.video_title
+        if job.collection:
+            job.label = part_label(job.entry, subtitle.video_title, job.collection.playlist.title)
+        return job, subtitle_text, subtitle, checkpoint
+    
+    def _skip_completed(self, job: _Job, checkpoint) -> bool:
+        """检查点中已有使用同一模型生成的总结时，直接记为成功"""
+        result = job.result
+        output_file = checkpoint.completed_summary(getattr(self.summarizer, 'model', None))
+        if not output_file:
+            return False
+        result.output_file = output_file
+        result.video_title = (checkpoint.get(METADATA) or {}).get('title')
+        result.success = result.resumed = True
+        if not job.collection:
+            # 分P与所属合集共用同一个运行指标，由合集记录结果
+            result.metrics.success = True
+            result.metrics.video_title = result.video_title
+        logger.info("已在之前的运行中完成，跳过: %s", output_file)
+        return True
+    
+    def _expand(self, job: _Job, playlist: PlaylistResult, url_queue: queue.Queue):
+        """将多P视频/合集展开为各分P任务，放回下载队列"""
+        collection = expand_collection(job.result, playlist, job.name)
+        if not collection:
+            return
+        logger.info(f"展开为 {len(collection.jobs)} 个分P任务: {playlist.title}")
+        for part_job in collection.jobs:
+            url_queue.put(part_job)
+    
+    def _part_done(self, job: _Job):
+        """记录一个分P处理结束（成功、跳过或失败），最后一个分P结束时生成合集文档"""
+        collection = job.collection
+        with collection.lock:
+            collection.remaining -= 1
+            if collection.remaining:
+                return
+        with log_context(job=collection.name, video=video_key(collection.result.url)):
+            finish_collection(collection, self.summarizer, self.save_func, self.checkpoints)
+    
+    def _summarize_worker(self, subtitle_queue: queue.Queue):
+        """总结阶段工作线程"""
+        while True:
+            item = subtitle_queue.get()
+            if item is _SENTINEL:
+                break
+            job, subtitle_text, subtitle, checkpoint = item
+            with log_context(job=job.name, video=video_key(job.result.url)):
+                self._summarize(job, subtitle_text, subtitle, checkpoint)
+                if job.collection:
+                    self._part_done(job)
+    
+    def _summarize(self, job: _Job, subtitle_text: str, subtitle, checkpoint):
+        """总结并保存一个视频"""
+        result = job.result
+        video_title, sub_dir = subtitle.video_title, subtitle.sub_dir
+        metrics = result.metrics
+        title, save_title = video_title or "", video_title or "summary"
+        if job.collection:
+            # 与单视频模式处理合集时一致：分P总结以分P名称保存在合集的子目录中
+            title, save_title = f"{job.collection.playlist.title} {job.label}", job.label
+        try:
+            summary = self.summarizer.summarize(subtitle_text, title, metrics=metrics)
+            if summary:
+                with metrics.timer('save'):
+                    result.output_file = self.save_func(summary, save_title, sub_dir, subtitle=subtitle)
+                result.success = True
+                job.summary = summary
+                if not job.collection:
+                    metrics.success = True
+                if checkpoint:
+                    checkpoint.mark_summary(result.output_file, getattr(self.summarizer, 'model', None))
+                logger.info("总结已保存到: %s", result.output_file)
+            else:
+                result.error = "AI总结失败"
+                logger.error("%s: %s", result.url, result.error)
+        except Exception as e:
+            result.error = f"总结出错: {str(e)}"
+            logger.error("%s: %s", result.url, result.error)
+        
+        if job.collection:
+            # 合集的运行指标在所有分P结束后写出
+            return
+        metrics.error = result.error
+        if Settings.WRITE_METRICS_FILE:
+            metrics.write_sidecar(sub_dir)
+
+
+def mark_playlist(checkpoint, url: str, playlist: PlaylistResult):
+    """在检查点中记录分P列表，再次运行时不再重新提取"""
+    checkpoint.mark(
+        PLAYLIST, url=url, title=playlist.title, sub_dir=str(playlist.sub_dir),
+        entries=[asdict(entry) for entry in playlist.entries],
+    )
+
+
+def stored_playlist(stage: dict) -> PlaylistResult:
+    """由检查点中记录的分P列表恢复，不再重新提取"""
+    return PlaylistResult(
+        title=stage['title'],
+        sub_dir=Path(stage['sub_dir']),
+        entries=[PlaylistEntry(**entry) for entry in stage['entries']],
+    )
+
+
+def skip_completed_collection(result: BatchResult, stage: dict, model: Optional[str]) -> bool:
+    """所有分P和合集文档都已使用同一模型完成时，直接记为成功"""
+    output = stage.get('output')
+    if not output or not Path(output).is_file() or (model and stage.get('model') and stage['model'] != model):
+        return False
+    result.output_file = Path(output)
+    result.video_title = result.metrics.video_title = stage.get('title')
+    result.success = result.resumed = result.metrics.success = True
+    logger.info("多P视频/合集已在之前的运行中完成，跳过: %s", output)
+    return True
+
+
+def expand_collection(result: BatchResult, playlist: PlaylistResult, name: str) -> Optional[_Collection]:
+    """
+    将多P视频/合集展开为各分P任务
+    
+    result.parts 为空时为每个分P创建结果，否则沿用（从批处理状态文件恢复时）。
+    
+    Returns:
+        展开的合集，没有可处理的分P时记录错误并返回None
+    """
+    result.video_title = playlist.title
+    if not playlist.entries:
+        result.error = result.metrics.error = "多P视频/合集中没有可处理的分P"
+        logger.error("%s: %s", result.url, result.error)
+        return None
+    if not result.parts:
+        # 各分P的耗时和token用量累加到合集的运行指标中（与单视频模式处理合集时一致）
+        result.parts = [BatchResult(url=entry.url, metrics=result.metrics) for entry in playlist.entries]
+    collection = _Collection(playlist=playlist, result=result, name=name, remaining=len(playlist.entries))
+    for entry, part in zip(playlist.entries, result.parts):
+        collection.jobs.append(_Job(result=part, name=f"{name}.{entry.index}", collection=collection, entry=entry))
+    return collection
+
+
+def finish_collection(
+    collection: _Collection,
+    summarizer,
+    save_func: Callable[..., Path],
+    checkpoints: Optional[CheckpointStore] = None,
+):
+    """
+    所有分P结束后生成合集总览并写出合集文档，与单视频模式的 CollectionPipeline 输出一致
+    
+    Args:
+        collection: 展开的合集
+        summarizer: AI总结器，生成合集总览
+        save_func: 保存总结的函数
+        checkpoints: 检查点（可选）；所有分P都成功时在合集的检查点中记录合集文档
+    """
+    playlist, result = collection.playlist, collection.result
+    metrics = result.metrics
+    summary = CollectionResult(title=playlist.title, sub_dir=playlist.sub_dir)
+    for job in collection.jobs:
+        part = PartResult(
+            entry=job.entry,
+            label=job.label or part_label(job.entry, job.result.video_title, playlist.title),
+            output_file=job.result.output_file,
+            error=job.result.error,
+        )
+        if job.result.success:
+            part.summary = job.summary or _read_summary(job.result.output_file)
+        summary.parts.append(part)
+    
+    succeeded = summary.succeeded
+    failed = len(summary.parts) - len(succeeded)
+    logger.info(f"分P处理完成: 成功 {len(succeeded)}，失败 {failed}")
+    metrics.video_title = playlist.title
+    try:
+        if not succeeded:
+            raise ValueError("所有分P均处理失败")
+        summary.overview = summarizer.summarize_collection(
+            [(p.label, p.summary) for p in succeeded], playlist.title, metrics=metrics
+        )
+        with metrics.timer('save'):
+            result.output_file = save_func(CollectionPipeline.render(summary), playlist.title, playlist.sub_dir)
+        result.success = metrics.success = True
+        logger.info("合集总结已保存到: %s", result.output_file)
+        if failed:
+            result.error = f"{failed} 个分P未能总结"
+            logger.warning("%s: %s", result.url, result.error)
+        elif checkpoints:
+            # 重新打开检查点：P1可能与合集共用同一个检查点目录，并且已写入自己的阶段
+            checkpoint = checkpoints.open(result.url)
+            checkpoint.mark(
+                PLAYLIST, **{**(checkpoint.get(PLAYLIST) or {}), 'output': str(result.output_file),
+                             'model': getattr(summarizer, 'model', None)},
+            )
+    except Exception as e:
+        result.error = f"合集总结出错: {str(e)}"
+        logger.error("%s: %s", result.url, result.error)
+    
+    metrics.error = None if result.success else result.error
+    if Settings.WRITE_METRICS_FILE:
+        metrics.write_sidecar(playlist.sub_dir)
+
+
+def _read_summary(output_file: Optional[Path]) -> Optional[str]:
+    """读取之前运行中保存的分P总结"""
+    try:
+        return output_file.read_text(encoding='utf-8') if output_file else None
+    except OSError as e:
+        logger.warning(f"读取分P总结失败: {output_file}: {str(e)}")
+        return None
@@ -0,0 +1,530 @@
+"""
+批处理接口（OpenAI兼容的 /files 和 /batches）：大批量离线总结
+
+不需要单个请求的延迟、只关心吞吐量和费用时（例如夜间处理积压的视频），把所有视频的总结请求
+写入一个JSONL文件一次提交，定期查询批次状态，完成后下载结果并分发到各视频的输出子目录。
+批处理接口通常按半价计费，也不占用同步接口的限流配额。
+
+提交后批次ID和每个请求对应的视频写入状态文件（按模型和URL列表区分）。批次运行期间进程退出时，
+用同样的参数重新运行会继续查询同一个批次，不会重新下载字幕或重复提交。
+
+字幕超出分块预算的视频需要多轮调用（分块总结再合并），在提交批次之前使用同步接口完成。
+
+多P视频/合集与同步批量模式相同：展开为各分P（各自拥有检查点），各分P的请求放入同一个批次，
+批次完成后使用同步接口生成总览并写出合集文档。
+"""
+import hashlib
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+import requests
+from config.settings import Settings
+from utils.logger import bind_log_context, log_context, setup_logger
+from utils.video import video_key
+from src.batch import (
+    BatchResult, _Collection, _Job, expand_collection, finish_collection, mark_playlist, skip_completed_collection,
+    stored_playlist,
+)
+from src.cache import SummaryCache
+from src.checkpoint import METADATA, PLAYLIST, CheckpointStore, write_atomic
+from src.collection import part_label
+from src.downloader import PlaylistResult, SubtitleResult
+from src.metrics import RunMetrics
+from src.preprocess import prepare_subtitle_text
+from src.subtitle_parser import cues_to_text, parse_subtitle_file
+from src.summarizer import PROMPT_VERSION
+
+logger = setup_logger()
+
+# 批次的终止状态，其余状态（validating / in_progress / finalizing / cancelling）需要继续等待
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchClient:
+    """批处理接口客户端：上传输入文件、创建和查询批次、下载结果文件"""
+    
+    def __init__(self, session: requests.Session, api_url: str, base_url: Optional[str] = None):
+        """
+        Args:
+            session: 带认证头的HTTP会话，通常为总结器的会话
+            api_url: 对话接口地址，用于推导接口根地址和批次中每个请求的路径
+            base_url: 接口根地址（例如 https://api.openai.com/v1），默认使用Settings中的配置或由api_url推导
+        """
+        self.session = session
+        self.endpoint = urlparse(api_url).path or "/v1/chat/completions"
+        base_url = base_url or Settings.AI_BATCH_API_BASE or re.sub(r'/chat/completions/?$', '', api_url)
+        self.base_url = base_url.rstrip('/')
+    
+    def _request(self, method: str, path: str, timeout=120, **kwargs) -> requests.Response:
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response
+    
+    def upload(self, content: bytes, filename: str) -> str:
+        """上传批处理输入文件（JSONL），返回文件ID"""
+        # Content-Type设为None：去掉会话默认的application/json，由requests生成multipart请求头
+        response = self._request(
+            'POST', '/files',
+            data={'purpose': 'batch'},
+            files={'file': (filename, content, 'application/jsonl')},
+            headers={'Content-Type': None},
+            timeout=600,
+        )
+        return response.json()['id']
+    
+    def create(self, input_file_id: str, completion_window: Optional[str] = None, metadata: Optional[dict] = None) -> dict:
+        """创建批次，返回批次对象"""
+        payload = {
+            'input_file_id': input_file_id,
+            'endpoint': self.endpoint,
+            'completion_window': completion_window or Settings.AI_BATCH_COMPLETION_WINDOW,
+        }
+        if metadata:
+            payload['metadata'] = metadata
+        return self._request('POST', '/batches', json=payload).json()
+    
+    def get(self, batch_id: str) -> dict:
+        """查询批次状态"""
+        return self._request('GET', f'/batches/{batch_id}').json()
+    
+    def content(self, file_id: str) -> str:
+        """下载文件内容（批次的结果文件和错误文件）"""
+        response = self._request('GET', f'/files/{file_id}/content', timeout=600)
+        response.encoding = 'utf-8'
+        return response.text
+
+
+@dataclass
+class BatchItem:
+    """加入批次、等待结果的视频（写入状态文件，进程重启后据此分发结果）"""
+    index: int
+    url: str
+    video_title: str
+    sub_dir: str
+    cache_key: Optional[str] = None
+    video_id: Optional[str] = None
+    uploader: Optional[str] = None
+    lang: Optional[str] = None
+    subtitle_file: Optional[str] = None
+    # 多P视频/合集的分P：在结果的 parts 中的位置和分P名称（分P总结以该名称保存）
+    part: Optional[int] = None
+    label: Optional[str] = None
+    
+    @property
+    def custom_id(self) -> str:
+        """批次中请求的ID：输入序号，分P为 序号.分P位置（例如 2.0）"""
+        return str(self.index) if self.part is None else f"{self.index}.{self.part}"
+    
+    def subtitle(self) -> SubtitleResult:
+        """还原字幕结果（用于保存总结时更新检索索引），字幕文本从已保存的字幕文件读取"""
+        subtitle_file = Path(self.subtitle_file) if self.subtitle_file else None
+        text = ""
+        if subtitle_file and subtitle_file.is_file():
+            try:
+                text = cues_to_text(parse_subtitle_file(subtitle_file))
+            except Exception:
+                subtitle_file = None
+        return SubtitleResult(
+            text=text,
+            video_title=self.video_title,
+            sub_dir=Path(self.sub_dir),
+            video_id=self.video_id,
+            uploader=self.uploader,
+            lang=self.lang,
+            subtitle_file=subtitle_file if text else None,
+        )
+
+
+class BatchApiRunner:
+    """
+    通过批处理接口批量总结视频
+    
+    字幕下载与同步批量模式相同（并发下载、检查点、字幕存储、展开多P视频/合集），总结请求全部放入一个批次。
+    """
+    
+    def __init__(
+        self,
+        downloader,
+        summarizer,
+        save_func: Callable[..., Path],
+        download_workers: Optional[int] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        state_dir: Optional[Path] = None,
+        poll_interval: Optional[float] = None,
+        client: Optional[BatchClient] = None,
+    ):
+        """
+        Args:
+            downloader: 字幕下载器（SubtitleDownloader）
+            summarizer: AI总结器（AISummarizer），提供提示词、会话和总结缓存
+            save_func: 保存总结的函数，签名为 (summary, video_title, sub_dir, subtitle=None) -> Path
+            download_workers: 下载线程数，默认使用Settings中的配置
+            checkpoints: 检查点（可选）；已完成总结的视频直接跳过
+            state_dir: 批次状态目录，默认使用Settings中的配置
+            poll_interval: 查询批次状态的间隔（秒），默认使用Settings中的配置
+            client: 批处理接口客户端，默认使用总结器的会话和接口地址
+        """
+        self.downloader = downloader
+        self.summarizer = summarizer
+        self.save_func = save_func
+        self.download_workers = max(1, download_workers or Settings.BATCH_DOWNLOAD_WORKERS)
+        self.checkpoints = checkpoints
+        self.state_dir = Path(state_dir or Settings.AI_BATCH_STATE_DIR)
+        self.poll_interval = poll_interval if poll_interval is not None else Settings.AI_BATCH_POLL_INTERVAL
+        self.client = client or BatchClient(summarizer.session, summarizer.api_url)
+    
+    def run(self, urls: List[str]) -> List[BatchResult]:
+        """
+        下载字幕、提交批次、等待完成并保存总结；存在同一任务未完成的批次时直接继续等待
+        
+        Args:
+            urls: 视频URL列表
+        
+        Returns:
+            与输入顺序一致的处理结果列表
+        """
+        urls = list(urls)
+        job = self._job_id(urls)
+        state_file = self.state_dir / f"{job}.json"
+        state = self._load_state(state_file)
+        
+        if state:
+            logger.info("继续等待之前提交的批次 %s（%d 个请求）", state['batch_id'], len(state['items']))
+            results = [self._restore_result(r) for r in state['results']]
+            collections = {
+                int(index): expand_collection(results[int(index)], stored_playlist(record), str(int(index) + 1))
+                for index, record in state.get('collections', {}).items()
+            }
+        else:
+            results = [BatchResult(url=url, metrics=RunMetrics(url=url)) for url in urls]
+            logger.info("批处理模式：获取 %d 个视频的字幕（下载线程: %d）", len(urls), self.download_workers)
+            with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+                prepared = list(executor.map(
+                    bind_log_context(lambda i: self._prepare(_Job(result=results[i], name=str(i + 1)), i)), range(len(urls)),
+                ))
+                # 多P视频/合集展开后，各分P与其他视频一样并发获取字幕
+                collections = {i: c for i, c in enumerate(prepared) if isinstance(c, _Collection)}
+                for collection in collections.values():
+                    logger.info("展开为 %d 个分P: %s", len(collection.jobs), collection.playlist.title)
+                parts = [(i, part, job) for i, c in collections.items() for part, job in enumerate(c.jobs)]
+                prepared += executor.map(bind_log_context(lambda args: self._prepare(args[2], args[0], args[1])), parts)
+            prepared = [p for p in prepared if isinstance(p, tuple)]
+            if not prepared:
+                self._finish_collections(collections)
+                self._log_done(results)
+                return results
+            state = self._submit(job, state_file, prepared, results, collections)
+        
+        batch = self._wait(state['batch_id'])
+        self._collect(batch, state, results)
+        self._finish_collections(collections)
+        state_file.unlink(missing_ok=True)
+        (self.state_dir / f"{job}.jsonl").unlink(missing_ok=True)
+        self._log_done(results)
+        return results
+    
+    def _job_id(self, urls: List[str]) -> str:
+        """同一模型和同一URL列表对应同一个任务"""
+        digest = hashlib.sha256(self.summarizer.model.encode('utf-8'))
+        for url in urls:
+            digest.update(b'\0' + url.encode('utf-8'))
+        return digest.hexdigest()[:16]
+    
+    @staticmethod
+    def _load_state(state_file: Path) -> Optional[dict]:
+        try:
+            return json.loads(state_file.read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("批次状态文件已损坏，重新提交: %s: %s", state_file, e)
+            return None
+    
+    @staticmethod
+    def _result_record(result: BatchResult) -> dict:
+        """写入状态文件的结果（不含运行指标）"""
+        record = {k: str(v) if isinstance(v, Path) else v for k, v in asdict(result).items() if k not in ('metrics', 'parts')}
+        record['parts'] = [BatchApiRunner._result_record(part) for part in result.parts]
+        return record
+    
+    @staticmethod
+    def _restore_result(record: dict, metrics: Optional[RunMetrics] = None) -> BatchResult:
+        """由状态文件恢复结果；分P与所属合集共用同一个运行指标"""
+        parts = record.get('parts') or []
+        result = BatchResult(**{
+            **record, 'output_file': Path(record['output_file']) if record['output_file'] else None, 'parts': [],
+        })
+        result.metrics = metrics or RunMetrics(
+            url=result.url, video_title=result.video_title, success=result.success, error=result.error,
+        )
+        result.parts = [BatchApiRunner._restore_result(part, result.metrics) for part in parts]
+        return result
+    
+    def _prepare(
+        self, job: _Job, index: int, part: Optional[int] = None,
+    ) -> Union[Tuple[BatchItem, dict], _Collection, None]:
+        """
+        获取一个视频（或分P）的字幕并生成批次中的请求
+        
+        Returns:
+            批次中的请求；多P视频/合集返回展开的合集；已完成、命中缓存、需要分块总结或失败时返回None
+        """
+        result, collection = job.result, job.collection
+        with log_context(job=job.name, video=video_key(result.url)):
+            checkpoint = self.checkpoints.open(result.url) if self.checkpoints else None
+            if checkpoint and not collection:
+                # 多P视频的整体URL与P1使用同一个检查点，记录过分P列表时按合集处理
+                stage = checkpoint.get(PLAYLIST)
+                if stage and stage.get('url') == result.url:
+                    if skip_completed_collection(result, stage, self.summarizer.model):
+                        return None
+                    return expand_collection(result, stored_playlist(stage), job.name)
+            if checkpoint and self._skip_completed(result, checkpoint, part=collection is not None):
+                return None
+            try:
+                sub_dir = collection.playlist.sub_dir if collection else None
+                subtitle = self.downloader.fetch(result.url, metrics=result.metrics, sub_dir=sub_dir, checkpoint=checkpoint)
+                if isinstance(subtitle, PlaylistResult):
+                    if collection:
+                        raise ValueError("分P本身又是多P视频/合集")
+                    if checkpoint:
+                        mark_playlist(checkpoint, result.url, subtitle)
+                    return expand_collection(result, subtitle, job.name)
+                subtitle_text = None
+                if subtitle:
+                    with result.metrics.timer('preprocess'):
+                        subtitle_text = prepare_subtitle_text(subtitle.cues, subtitle.text)
+            except Exception as e:
+                subtitle, subtitle_text = None, None
+                result.error = f"字幕下载出错: {str(e)}"
+            if not subtitle or not subtitle_text:
+                self._fail(result, result.error or "字幕下载失败")
+                return None
+            
+            video_title = subtitle.video_title or ""
+            result.video_title = subtitle.video_title
+            if collection:
+                # 与同步批量模式一致：分P的提示词中使用合集标题和分P名称
+                job.label = part_label(job.entry, subtitle.video_title, collection.playlist.title)
+                video_title = f"{collection.playlist.title} {job.label}"
+            cache_key = None
+            if self.summarizer.cache:
+                cache_key = SummaryCache.make_key(subtitle_text, video_title, self.summarizer.model, PROMPT_VERSION)
+                cached = self.summarizer.cache.get(cache_key)
+                if cached:
+                    result.metrics.cache_hit = True
+                    self._save(result, cached, subtitle, checkpoint, job.label)
+                    return None
+            
+            # 批处理中只复用近似重复视频的总结，需要增量总结时按普通请求提交
+            if self.summarizer.fingerprints:
+                with result.metrics.timer('fingerprint'):
+                    _, duplicate = self.summarizer.find_near_duplicate(subtitle_text)
+                if duplicate and duplicate.similarity >= Settings.NEAR_DUP_REUSE_THRESHOLD:
+                    logger.info("字幕与已总结视频《%s》相似度 %.2f，复用其总结", duplicate.source, duplicate.similarity)
+                    duplicate.record(result.metrics, "reuse")
+                    self._save(result, duplicate.summary + duplicate.note("reuse"), subtitle, checkpoint, job.label)
+                    return None
+            
+            body = self.summarizer.request_body(subtitle_text, video_title)
+            if body is None:
+                logger.info("字幕较长，需要分块总结，使用同步接口")
+                summary = self.summarizer.summarize(subtitle_text, video_title, metrics=result.metrics)
+                if summary:
+                    self._save(result, summary, subtitle, checkpoint, job.label)
+                else:
+                    self._fail(result, "AI总结失败", None if collection else subtitle.sub_dir)
+                return None
+            
+            item = BatchItem(
+                index=index,
+                url=result.url,
+                video_title=subtitle.video_title or "",
+                sub_dir=str(subtitle.sub_dir),
+                cache_key=cache_key,
+                video_id=subtitle.video_id,
+                uploader=subtitle.uploader,
+                lang=subtitle.lang,
+                subtitle_file=str(subtitle.subtitle_file) if subtitle.subtitle_file else None,
+                part=part,
+                label=job.label,
+            )
+            return item, body
+    
+    def _skip_completed(self, result: BatchResult, checkpoint, part: bool = False) -> bool:
+        """检查点中已有使用同一模型生成的总结时，直接记为成功"""
+        output_file = checkpoint.completed_summary(self.summarizer.model)
+        if not output_file:
+            return False
+        result.output_file = output_file
+        result.video_title = (checkpoint.get(METADATA) or {}).get('title')
+        result.success = result.resumed = True
+        if not part:
+            # 分P与所属合集共用同一个运行指标，由合集记录结果
+            result.metrics.success = True
+            result.metrics.video_title = result.video_title
+        logger.info("已在之前的运行中完成，跳过: %s", output_file)
+        return True
+    
+    def _submit(
+        self,
+        job: str,
+        state_file: Path,
+        prepared: List[Tuple[BatchItem, dict]],
+        results: List[BatchResult],
+        collections: Dict[int, _Collection],
+    ) -> dict:
+        """写出JSONL输入文件、上传并创建批次，然后写出状态文件"""
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        input_file = self.state_dir / f"{job}.jsonl"
+        lines = [
+            json.dumps({'custom_id': item.custom_id, 'method': 'POST', 'url': self.client.endpoint, 'body': body},
+                       ensure_ascii=False)
+            for item, body in prepared
+        ]
+        write_atomic(input_file, "\n".join(lines) + "\n")
+        
+        logger.info("上传批处理输入文件: %d 个请求，%.1f KB", len(lines), input_file.stat().st_size / 1024)
+        file_id = self.client.upload(input_file.read_bytes(), input_file.name)
+        batch = self.client.create(file_id, metadata={'job': job})
+        logger.info("批次已提交: %s（完成时限 %s）", batch['id'], batch.get('completion_window') or Settings.AI_BATCH_COMPLETION_WINDOW)
+        
+        state = {
+            'job': job,
+            'batch_id': batch['id'],
+            'input_file_id': file_id,
+            'model': self.summarizer.model,
+            'submitted_at': datetime.now().isoformat(timespec='seconds'),
+            'items': {item.custom_id: asdict(item) for item, _ in prepared},
+            'results': [self._result_record(r) for r in results],
+            # 多P视频/合集的分P列表，批次完成后据此生成合集文档
+            'collections': {
+                str(index): {
+                    'title': c.playlist.title, 'sub_dir': str(c.playlist.sub_dir),
+                    'entries': [asdict(entry) for entry in c.playlist.entries],
+                }
+                for index, c in collections.items()
+            },
+        }
+        write_atomic(state_file, json.dumps(state, ensure_ascii=False, indent=2))
+        return state
+    
+    def _wait(self, batch_id: str) -> dict:
+        """定期查询批次状态直到结束，查询失败时下次继续"""
+        last = None
+        while True:
+            try:
+                batch = self.client.get(batch_id)
+            except requests.exceptions.RequestException as e:
+                logger.warning("查询批次状态失败: %s，%.0fs后重试", e, self.poll_interval)
+                time.sleep(self.poll_interval)
+                continue
+            counts = batch.get('request_counts') or {}
+            progress = (batch.get('status'), counts.get('completed'), counts.get('failed'))
+            if progress != last:
+                last = progress
+                logger.info(
+                    "批次 %s: %s，完成 %s/%s，失败 %s",
+                    batch_id, batch.get('status'), counts.get('completed', 0), counts.get('total', '?'), counts.get('failed', 0),
+                )
+            if batch.get('status') in TERMINAL_STATUSES:
+                return batch
+            time.sleep(self.poll_interval)
+    
+    def _read_lines(self, file_id: Optional[str]) -> Dict[str, dict]:
+        """读取结果文件或错误文件，按custom_id索引"""
+        if not file_id:
+            return {}
+        lines = {}
+        for line in self.client.content(file_id).splitlines():
+            if line.strip():
+                record = json.loads(line)
+                lines[record.get('custom_id')] = record
+        return lines
+    
+    def _collect(self, batch: dict, state: dict, results: List[BatchResult]):
+        """下载批次结果，将每个请求的总结保存到对应视频的输出子目录"""
+        if batch.get('status') != 'completed':
+            logger.error("批次 %s 未正常完成: %s", batch['id'], batch.get('status'))
+        outputs = self._read_lines(batch.get('output_file_id'))
+        errors = self._read_lines(batch.get('error_file_id'))
+        
+        for custom_id, record in state['items'].items():
+            item = BatchItem(**record)
+            result = results[item.index] if item.part is None else results[item.index].parts[item.part]
+            name = str(item.index + 1) if item.part is None else f"{item.index + 1}.{item.part + 1}"
+            with log_context(job=name, video=video_key(item.url)):
+                line = outputs.get(custom_id) or errors.get(custom_id) or {}
+                response = line.get('response') or {}
+                body = response.get('body') or {}
+                content = None
+                if response.get('status_code') == 200:
+                    content = (body.get('choices') or [{}])[0].get('message', {}).get('content')
+                    usage = body.get('usage') or {}
+                    result.metrics.add_usage(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+                if not content:
+                    error = line.get('error') or body.get('error') or {}
+                    message = error.get('message') if isinstance(error, dict) else str(error)
+                    sub_dir = Path(item.sub_dir) if item.part is None else None
+                    self._fail(result, f"批处理请求失败: {message or batch.get('status')}", sub_dir)
+                    continue
+                
+                subtitle = item.subtitle()
+                checkpoint = self.checkpoints.open(item.url) if self.checkpoints else None
+                self._save(result, content, subtitle, checkpoint, item.label)
+                if self.summarizer.cache and item.cache_key:
+                    self.summarizer.cache.put(item.cache_key, content, model=self.summarizer.model, video_title=item.video_title)
+    
+    def _save(
+        self,
+        result: BatchResult,
+        summary: str,
+        subtitle: SubtitleResult,
+        checkpoint=None,
+        label: Optional[str] = None,
+    ):
+        """保存一个视频的总结；分P（指定label时）以分P名称保存，运行指标由所属合集记录"""
+        metrics = result.metrics
+        result.video_title = result.video_title or subtitle.video_title
+        try:
+            with metrics.timer('save'):
+                result.output_file = self.save_func(
+                    summary, label or subtitle.video_title or "summary", subtitle.sub_dir, subtitle=subtitle,
+                )
+            result.success = True
+            if not label:
+                metrics.success = True
+            if checkpoint:
+                checkpoint.mark_summary(result.output_file, self.summarizer.model)
+            logger.info("总结已保存到: %s", result.output_file)
+        except Exception as e:
+            self._fail(result, f"保存总结出错: {str(e)}")
+        if Settings.WRITE_METRICS_FILE and not label:
+            metrics.write_sidecar(subtitle.sub_dir)
+    
+    def _finish_collections(self, collections: Dict[int, _Collection]):
+        """所有分P结束后生成各合集的总览和合集文档"""
+        for collection in collections.values():
+            with log_context(job=collection.name, video=video_key(collection.result.url)):
+                finish_collection(collection, self.summarizer, self.save_func, self.checkpoints)
+    
+    @staticmethod
+    def _fail(result: BatchResult, error: str, sub_dir: Optional[Path] = None):
+        result.error = result.metrics.error = error
+        logger.error("%s: %s", result.url, error)
+        if sub_dir and Settings.WRITE_METRICS_FILE:
+            result.metrics.write_sidecar(sub_dir)
+    
+    @staticmethod
+    def _log_done(results: List[BatchResult]):
+        succeeded = sum(1 for r in results if r.success)
+        resumed = sum(1 for r in results if r.resumed)
+        logger.info(
+            "批处理完成: 成功 %d（其中 %d 个在之前的运行中已完成），失败 %d", succeeded, resumed, len(results) - succeeded
+        )
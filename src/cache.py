@@ -0,0 +1,197 @@
+"""基于内容哈希的AI总结磁盘缓存"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from config.settings import Settings
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+# 缓存模式
+CACHE_MODES = ("on", "off", "refresh", "readonly")
+
+# 常驻进程（服务、监视模式）中重新扫描缓存目录、删除过期条目的间隔（秒）
+_RESCAN_INTERVAL = 3600
+# 超出容量上限时淘汰到上限的该比例，留出余量，避免之后每次写入都重新扫描
+_EVICT_TARGET = 0.9
+
+
+class SummaryCache:
+    """
+    总结缓存
+    
+    以 字幕文本 + 视频标题 + 模型 + 提示词模板版本 的SHA-256作为键，
+    每条缓存是一个JSON文件。按最后访问时间进行过期淘汰，超出容量上限时
+    优先删除最久未使用的条目。缓存目录只在第一次写入、累计大小超出上限或距上次扫描超过一小时时
+    完整扫描一次，其余写入只累加文件大小。
+    
+    模式:
+        on: 读写缓存
+        off: 不使用缓存
+        refresh: 忽略已有缓存，重新生成并写入
+        readonly: 只读取缓存，不写入
+    """
+    
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        mode: Optional[str] = None,
+        max_age_days: Optional[float] = None,
+        max_size_mb: Optional[float] = None,
+    ):
+        """
+        初始化缓存
+        
+        Args:
+            cache_dir: 缓存目录，默认使用Settings中的配置
+            mode: 缓存模式，默认使用Settings中的配置
+            max_age_days: 条目最长保留天数，默认使用Settings中的配置
+            max_size_mb: 缓存总大小上限（MB），默认使用Settings中的配置
+        """
+        self.cache_dir = Path(cache_dir or Settings.SUMMARY_CACHE_DIR)
+        self.mode = mode or Settings.SUMMARY_CACHE_MODE
+        if self.mode not in CACHE_MODES:
+            raise ValueError(f"未知缓存模式: {self.mode}，可选: {', '.join(CACHE_MODES)}")
+        self.max_age = (max_age_days if max_age_days is not None else Settings.SUMMARY_CACHE_MAX_AGE_DAYS) * 86400
+        self.max_size = (max_size_mb if max_size_mb is not None else Settings.SUMMARY_CACHE_MAX_SIZE_MB) * 1024 * 1024
+        self._lock = threading.Lock()
+        # 上次扫描得到的缓存总大小（之后的写入在此基础上累加），未扫描时为None
+        self._size: Optional[int] = None
+        self._scanned_at = 0.0
+    
+    @property
+    def readable(self) -> bool:
+        """是否读取缓存"""
+        return self.mode in ("on", "readonly")
+    
+    @property
+    def writable(self) -> bool:
+        """是否写入缓存"""
+        return self.mode in ("on", "refresh")
+    
+    @staticmethod
+    def make_key(subtitle_text: str, video_title: str, model: str, prompt_version: str) -> str:
+        """计算缓存键"""
+        digest = hashlib.sha256()
+        for part in (prompt_version, model, video_title, subtitle_text):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存
+        
+        Args:
+            key: 缓存键
+        
+        Returns:
+            缓存的总结内容，未命中或已过期返回None
+        """
+        if not self.readable:
+            return None
+        path = self._path(key)
+        try:
+            if self.max_age and time.time() - path.stat().st_mtime > self.max_age:
+                logger.info(f"总结缓存已过期: {key[:12]}")
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                summary = json.load(f).get('summary')
+        except (OSError, ValueError):
+            logger.info(f"总结缓存未命中: {key[:12]}")
+            return None
+        
+        if self.mode == "on":
+            # 刷新访问时间，用于LRU淘汰
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        logger.info(f"总结缓存命中: {key[:12]}")
+        return summary
+    
+    def put(self, key: str, summary: str, **meta):
+        """
+        写入缓存（原子写入），写入后按需淘汰
+        
+        Args:
+            key: 缓存键
+            summary: 总结内容
+            meta: 附加的元信息（模型、标题等），仅用于排查
+        """
+        if not self.writable:
+            return
+        path = self._path(key)
+        record = dict(meta, summary=summary, created=time.time())
+        try:
+            try:
+                previous_size = path.stat().st_size
+            except OSError:
+                previous_size = 0
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(record, f, ensure_ascii=False)
+                os.replace(tmp_name, path)
+                size = path.stat().st_size
+            except Exception:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+        except OSError as e:
+            # 缓存写入失败不影响总结结果
+            logger.warning(f"写入总结缓存失败: {str(e)}")
+            return
+        logger.info(f"总结已写入缓存: {key[:12]}")
+        
+        with self._lock:
+            if self._size is not None:
+                self._size += size - previous_size
+            scan = (
+                self._size is None
+                or (self.max_size and self._size > self.max_size)
+                or time.time() - self._scanned_at > _RESCAN_INTERVAL
+            )
+        if scan:
+            self.evict()
+    
+    def evict(self):
+        """扫描缓存目录，删除过期条目，并在超出容量上限时删除最久未使用的条目"""
+        with self._lock:
+            now = time.time()
+            self._scanned_at = now
+            entries = []
+            total_size = 0
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if self.max_age and now - stat.st_mtime > self.max_age:
+                    path.unlink(missing_ok=True)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+            
+            self._size = total_size
+            if not self.max_size or total_size <= self.max_size:
+                return
+            entries.sort()
+            removed = 0
+            target = self.max_size * _EVICT_TARGET
+            for _, size, path in entries:
+                if total_size <= target:
+                    break
+                path.unlink(missing_ok=True)
+                total_size -= size
+                removed += 1
+            self._size = total_size
+            logger.info(f"总结缓存超出容量上限，已淘汰 {removed} 条")
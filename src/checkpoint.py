@@ -0,0 +1,160 @@
+"""
+分阶段检查点：重新运行时跳过已完成的阶段
+
+每个视频（BV号+分P）在检查点目录下有一个固定的子目录，其中的 manifest.json 记录各阶段的完成情况：
+    metadata  视频信息（标题、BV号、UP主、输出子目录、选中的字幕语言）
+    subtitle  原始字幕内容（subtitle.<格式>）
+    parsed    解析后的字幕条目（cues.json）
+    summary   总结文件路径和使用的模型
+    playlist  URL对应多P视频或合集时的分P列表，以及全部完成后的合集文档路径（批量模式）
+
+重新运行时从第一个未完成的阶段继续：已解析的字幕不再下载，已完成总结的视频直接跳过，
+并继续使用第一次运行时创建的输出子目录。
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+from config.settings import Settings
+from utils.logger import setup_logger
+from utils.video import video_key
+from src.subtitle_parser import Cue
+
+logger = setup_logger()
+
+MANIFEST_FILENAME = "manifest.json"
+CUES_FILENAME = "cues.json"
+
+# 阶段
+METADATA = "metadata"
+SUBTITLE = "subtitle"
+PARSED = "parsed"
+SUMMARY = "summary"
+PLAYLIST = "playlist"
+
+
+def write_atomic(path: Path, content: str):
+    """先写临时文件再重命名，中途崩溃不会留下不完整的文件"""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class Checkpoint:
+    """单个视频的检查点"""
+    
+    def __init__(self, directory: Path, url: str):
+        """
+        Args:
+            directory: 该视频的检查点目录
+            url: 视频URL
+        """
+        self.dir = directory
+        self.url = url
+        self._lock = threading.Lock()
+        self._manifest = self._load()
+    
+    def _load(self) -> dict:
+        try:
+            return json.loads((self.dir / MANIFEST_FILENAME).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return {'url': self.url, 'stages': {}}
+        except (OSError, ValueError) as e:
+            logger.warning(f"检查点已损坏，重新开始: {self.dir}: {str(e)}")
+            return {'url': self.url, 'stages': {}}
+    
+    def get(self, stage: str) -> Optional[dict]:
+        """已完成阶段的记录，未完成时返回None"""
+        with self._lock:
+            return self._manifest['stages'].get(stage)
+    
+    def mark(self, stage: str, **data):
+        """记录阶段完成并写出manifest"""
+        with self._lock:
+            self._manifest['stages'][stage] = {**data, 'completed_at': datetime.now().isoformat(timespec='seconds')}
+            self.dir.mkdir(parents=True, exist_ok=True)
+            write_atomic(self.dir / MANIFEST_FILENAME, json.dumps(self._manifest, ensure_ascii=False, indent=2))
+    
+    def save_subtitle(self, content: str, fmt: str):
+        """保存原始字幕内容并记录subtitle阶段"""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        filename = f"subtitle.{fmt}"
+        write_atomic(self.dir / filename, content)
+        self.mark(SUBTITLE, file=filename, format=fmt)
+    
+    def load_subtitle(self) -> Optional[Tuple[str, str]]:
+        """
+        读取保存的原始字幕
+        
+        Returns:
+            (字幕内容, 格式)，没有或文件已丢失时返回None
+        """
+        stage = self.get(SUBTITLE)
+        if not stage:
+            return None
+        try:
+            return (self.dir / stage['file']).read_text(encoding='utf-8'), stage['format']
+        except OSError:
+            return None
+    
+    def save_cues(self, cues: List[Cue]):
+        """保存解析后的字幕条目并记录parsed阶段"""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        payload = [[cue.start, cue.end, cue.text] for cue in cues]
+        write_atomic(self.dir / CUES_FILENAME, json.dumps(payload, ensure_ascii=False))
+        self.mark(PARSED, file=CUES_FILENAME, cues=len(cues))
+    
+    def load_cues(self) -> Optional[List[Cue]]:
+        """读取解析后的字幕条目，没有或文件已丢失时返回None"""
+        if not self.get(PARSED):
+            return None
+        try:
+            payload = json.loads((self.dir / CUES_FILENAME).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        return [Cue(start=start, end=end, text=text) for start, end, text in payload]
+    
+    def mark_summary(self, output_file: Path, model: Optional[str] = None):
+        """记录summary阶段"""
+        self.mark(SUMMARY, path=str(output_file), model=model)
+    
+    def completed_summary(self, model: Optional[str] = None) -> Optional[Path]:
+        """
+        已完成的总结文件
+        
+        Args:
+            model: 当前使用的模型，与记录的模型不同时视为未完成
+        
+        Returns:
+            总结文件路径；未完成、模型不同或文件已被删除时返回None
+        """
+        stage = self.get(SUMMARY)
+        if not stage or (model and stage.get('model') and stage['model'] != model):
+            return None
+        path = Path(stage['path'])
+        return path if path.is_file() else None
+
+
+class CheckpointStore:
+    """检查点目录，每个视频对应其中一个固定的子目录"""
+    
+    def __init__(self, root: Optional[Path] = None):
+        """
+        Args:
+            root: 检查点根目录，默认使用Settings中的配置
+        """
+        self.root = Path(root or Settings.CHECKPOINT_DIR)
+    
+    def open(self, url: str) -> Checkpoint:
+        """打开视频的检查点（不存在时不会创建目录，直到第一个阶段完成）"""
+        name = re.sub(r'[^0-9A-Za-z._-]+', '_', video_key(url)).strip('_') or 'video'
+        return Checkpoint(self.root / name, url)
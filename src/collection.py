@@ -0,0 +1,206 @@
+"""多P视频和合集：并发获取各分P字幕、并发总结，生成带目录的分层总结"""
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional
+from config.settings import Settings
+from utils.logger import bind_log_context, log_context, setup_logger
+from src.downloader import PlaylistEntry, PlaylistResult, SubtitleResult
+from src.metrics import RunMetrics
+from src.preprocess import prepare_subtitle_text
+
+logger = setup_logger()
+
+# Markdown标题行
+_HEADING = re.compile(r'^(#{1,6})(?=\s)', re.MULTILINE)
+# 分P标题中yt-dlp添加的序号，例如 "p01 "
+_PART_NUMBER = re.compile(r'^p\d+\s*', re.IGNORECASE)
+
+
+@dataclass
+class PartResult:
+    """单个分P的处理结果"""
+    entry: PlaylistEntry
+    label: str
+    summary: Optional[str] = None
+    output_file: Optional[Path] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class CollectionResult:
+    """多P视频/合集的处理结果"""
+    title: str
+    sub_dir: Path
+    parts: List[PartResult] = field(default_factory=list)
+    overview: Optional[str] = None
+    output_file: Optional[Path] = None
+    
+    @property
+    def succeeded(self) -> List[PartResult]:
+        return [p for p in self.parts if p.summary]
+
+
+def demote_headings(text: str, levels: int) -> str:
+    """将Markdown标题降低若干级，以便嵌入到上一级文档中（最多6级）"""
+    return _HEADING.sub(lambda m: '#' * min(6, len(m.group(1)) + levels), text)
+
+
+def part_label(entry: PlaylistEntry, video_title: Optional[str], collection_title: str) -> str:
+    """
+    生成分P的显示名称，例如 "P03 环境配置"
+    
+    yt-dlp为多P视频的分P标题加上了整体标题和序号（"标题 p03 环境配置"），这里去掉重复部分。
+    """
+    title = (video_title or entry.title or "").strip()
+    if collection_title and title.startswith(collection_title) and title != collection_title:
+        title = title[len(collection_title):].strip()
+    title = _PART_NUMBER.sub('', title).strip()
+    return f"P{entry.index:02d} {title}".strip()
+
+
+class CollectionPipeline:
+    """
+    多P视频/合集流水线
+    
+    各分P的字幕获取和AI总结分别在两个有界线程池中进行，某个分P的字幕获取完成后立即提交总结，
+    因此下载和总结可以重叠。所有分P完成后生成总览，并写出包含目录和各分P总结的合集文档。
+    """
+    
+    def __init__(
+        self,
+        downloader,
+        summarizer,
+        save_func: Callable[..., Path],
+        download_workers: Optional[int] = None,
+        summarize_workers: Optional[int] = None,
+        refresh: bool = False,
+    ):
+        """
+        Args:
+            downloader: 字幕下载器（SubtitleDownloader）
+            summarizer: AI总结器（AISummarizer）
+            save_func: 保存总结的函数，签名为 (summary, video_title, sub_dir, subtitle=None) -> Path
+            download_workers: 字幕获取并发数，默认使用Settings中的配置
+            summarize_workers: 总结并发数，默认使用Settings中的配置
+            refresh: 是否忽略字幕存储重新下载各分P的字幕（见 SubtitleDownloader.fetch_subtitle）
+        """
+        self.downloader = downloader
+        self.summarizer = summarizer
+        self.save_func = save_func
+        self.download_workers = max(1, download_workers or Settings.BATCH_DOWNLOAD_WORKERS)
+        self.summarize_workers = max(1, summarize_workers or Settings.BATCH_SUMMARIZE_WORKERS)
+        self.refresh = refresh
+    
+    def run(self, playlist: PlaylistResult, metrics: Optional[RunMetrics] = None) -> CollectionResult:
+        """
+        处理多P视频/合集的所有分P
+        
+        Args:
+            playlist: 分P列表（SubtitleDownloader.fetch 的返回值）
+            metrics: 运行指标（可选），各分P的耗时和token用量累加到同一个指标中
+        
+        Returns:
+            处理结果；总览和合集文档在至少一个分P成功时生成
+        """
+        metrics = metrics or RunMetrics(url=playlist.title)
+        result = CollectionResult(title=playlist.title, sub_dir=playlist.sub_dir)
+        result.parts = [PartResult(entry=entry, label=f"P{entry.index:02d} {entry.title or ''}".strip())
+                        for entry in playlist.entries]
+        total = len(result.parts)
+        logger.info(
+            f"开始处理 {total} 个分P（字幕获取并发: {self.download_workers}，总结并发: {self.summarize_workers}）"
+        )
+        
+        summarize_futures: List[Future] = []
+        futures_lock = threading.Lock()
+        
+        with ThreadPoolExecutor(max_workers=self.summarize_workers, thread_name_prefix="part-summarize") as summarize_pool:
+            def download(part: PartResult):
+                with log_context(part=f"{part.entry.index}/{total}"):
+                    subtitle = self.downloader.fetch_subtitle(
+                        part.entry.url, metrics=metrics, sub_dir=playlist.sub_dir, refresh=self.refresh,
+                    )
+                    if not subtitle:
+                        part.error = "字幕获取失败或没有字幕"
+                        logger.warning("%s: %s", part.entry.url, part.error)
+                        return
+                    part.label = part_label(part.entry, subtitle.video_title, playlist.title)
+                    with metrics.timer('preprocess'):
+                        subtitle_text = prepare_subtitle_text(subtitle.cues, subtitle.text)
+                    future = summarize_pool.submit(bind_log_context(summarize), part, subtitle, subtitle_text)
+                with futures_lock:
+                    summarize_futures.append(future)
+            
+            def summarize(part: PartResult, subtitle: SubtitleResult, subtitle_text: str):
+                summary = self.summarizer.summarize(subtitle_text, f"{playlist.title} {part.label}", metrics=metrics)
+                if not summary:
+                    part.error = "AI总结失败"
+                    logger.warning("%s: %s", part.label, part.error)
+                    return
+                part.summary = summary
+                with metrics.timer('save'):
+                    part.output_file = self.save_func(summary, part.label, playlist.sub_dir, subtitle=subtitle)
+                logger.info("分P总结已保存到: %s", part.output_file)
+            
+            download = bind_log_context(download)
+            with ThreadPoolExecutor(max_workers=self.download_workers, thread_name_prefix="part-download") as download_pool:
+                for future in [download_pool.submit(download, part) for part in result.parts]:
+                    self._check(future)
+            for future in summarize_futures:
+                self._check(future)
+        
+        metrics.video_title = playlist.title
+        succeeded = result.succeeded
+        logger.info(f"分P处理完成: 成功 {len(succeeded)}，失败 {total - len(succeeded)}")
+        if not succeeded:
+            return result
+        
+        result.overview = self.summarizer.summarize_collection(
+            [(p.label, p.summary) for p in succeeded], playlist.title, metrics=metrics
+        )
+        with metrics.timer('save'):
+            result.output_file = self.save_func(self.render(result), playlist.title, playlist.sub_dir)
+        return result
+    
+    @staticmethod
+    def _check(future: Future):
+        """单个分P出错只记录日志，不影响其他分P"""
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"分P处理出错: {str(e)}")
+    
+    @staticmethod
+    def render(result: CollectionResult) -> str:
+        """
+        生成合集文档：总览、分P目录（链接到各分P的总结文件）、各分P总结
+        
+        Args:
+            result: 处理结果
+        
+        Returns:
+            Markdown文档
+        """
+        lines = [f"# {result.title}", ""]
+        lines.append(f"> 共 {len(result.parts)} 个分P，已总结 {len(result.succeeded)} 个")
+        lines.append("")
+        
+        lines += ["## 总览", ""]
+        lines.append(demote_headings(result.overview.strip(), 2) if result.overview else "（总览生成失败，请参阅各分P总结）")
+        lines.append("")
+        
+        lines += ["## 目录", ""]
+        for part in result.parts:
+            if part.output_file:
+                lines.append(f"{part.entry.index}. [{part.label}](<{part.output_file.name}>)")
+            else:
+                lines.append(f"{part.entry.index}. {part.label}（{part.error or '未完成'}）")
+        lines.append("")
+        
+        lines += ["## 分P总结", ""]
+        for part in result.succeeded:
+            lines += [f"### {part.label}", "", demote_headings(part.summary.strip(), 3), ""]
+        return "\n".join(lines)
@@ -0,0 +1,230 @@
+"""
+多账号cookies池：在多个Bilibili账号之间分配字幕下载请求
+
+单个账号能承受的请求量有限，超过后会收到412/-352等风控响应。池中每个账号对应一个cookies文件:
+    - 按最近最少使用（lru，优先选择进行中请求最少的账号）或轮询（round_robin）分配账号
+    - 限制每个账号和所有账号合计的并发请求数，达到上限时等待
+    - 账号被限流后进入冷却期，连续被限流时冷却时间加倍；冷却期内不分配该账号，
+      所有账号都在冷却时等待最早结束冷却的账号
+    - 统计每个账号的请求数、成功/失败/被限流次数，用于判断账号状态
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+from config.settings import Settings
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+STRATEGIES = ("lru", "round_robin")
+
+# yt-dlp错误信息中表示被风控/限流的部分：HTTP 412/429，或Bilibili接口返回的 -352/-412
+_THROTTLE_PATTERN = re.compile(
+    r'HTTP Error (?:412|429)|blocked by server|\((?:-?352|-?412|429)\)|code[":\s]+-(?:352|412)|风控',
+    re.IGNORECASE,
+)
+
+
+def is_throttled(error: BaseException) -> bool:
+    """异常是否表示账号被Bilibili风控或限流"""
+    return bool(_THROTTLE_PATTERN.search(str(error)))
+
+
+@dataclass
+class Account:
+    """池中的一个账号（cookies文件）及其状态，字段由所属的池在锁内更新"""
+    name: str
+    cookies_file: Path
+    in_flight: int = 0
+    last_used: float = 0.0
+    cooldown_until: float = 0.0
+    consecutive_throttles: int = 0
+    requests: int = 0
+    successes: int = 0
+    failures: int = 0
+    throttled: int = 0
+    last_error: Optional[str] = None
+    
+    def cooling_down(self, now: float) -> bool:
+        return self.cooldown_until > now
+    
+    def snapshot(self, now: float) -> dict:
+        return {
+            'name': self.name,
+            'cookies_file': str(self.cookies_file),
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'throttled': self.throttled,
+            'cooldown_remaining': round(max(0.0, self.cooldown_until - now), 1),
+            'last_error': self.last_error,
+        }
+
+
+class CookiePool:
+    """
+    多账号cookies池
+    
+    同一个池由下载器的所有线程共享，账号的分配和状态更新在条件变量的锁内完成。
+    """
+    
+    def __init__(
+        self,
+        cookie_files: Sequence[Path],
+        strategy: Optional[str] = None,
+        account_concurrency: Optional[int] = None,
+        global_concurrency: Optional[int] = None,
+        cooldown: Optional[float] = None,
+        max_cooldown: Optional[float] = None,
+    ):
+        """
+        Args:
+            cookie_files: 各账号的cookies文件
+            strategy: 分配策略 lru / round_robin，默认使用Settings中的配置
+            account_concurrency: 每个账号的并发请求数上限，0为不限制
+            global_concurrency: 所有账号合计的并发请求数上限，0为不限制
+            cooldown: 账号被限流后的冷却时间（秒），连续被限流时加倍
+            max_cooldown: 冷却时间上限（秒）
+        """
+        if not cookie_files:
+            raise ValueError("cookies池中至少需要一个cookies文件")
+        missing = [str(p) for p in cookie_files if not Path(p).is_file()]
+        if missing:
+            raise FileNotFoundError(f"Cookies文件不存在: {', '.join(missing)}")
+        self.strategy = strategy or Settings.COOKIE_POOL_STRATEGY
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"未知账号分配策略: {self.strategy}，可选: {', '.join(STRATEGIES)}")
+        self.account_concurrency = (
+            account_concurrency if account_concurrency is not None else Settings.COOKIE_ACCOUNT_CONCURRENCY
+        )
+        self.global_concurrency = (
+            global_concurrency if global_concurrency is not None else Settings.COOKIE_GLOBAL_CONCURRENCY
+        )
+        self.cooldown = cooldown if cooldown is not None else Settings.COOKIE_COOLDOWN
+        self.max_cooldown = max_cooldown if max_cooldown is not None else Settings.COOKIE_MAX_COOLDOWN
+        
+        self.accounts: List[Account] = []
+        for path in cookie_files:
+            path = Path(path)
+            # 不同目录中的同名文件（例如 a/cookies.txt 和 b/cookies.txt）使用带目录的名称区分
+            name = path.stem if sum(Path(p).stem == path.stem for p in cookie_files) == 1 else f"{path.parent.name}/{path.stem}"
+            self.accounts.append(Account(name=name, cookies_file=path))
+        self._in_flight = 0
+        self._next = 0
+        self._cond = threading.Condition()
+    
+    @classmethod
+    def from_settings(cls) -> 'CookiePool':
+        """按Settings中的cookies文件列表（未配置时为单个COOKIES_FILE）创建池"""
+        return cls(Settings.cookie_files())
+    
+    def __len__(self) -> int:
+        return len(self.accounts)
+    
+    @contextmanager
+    def account(self) -> Iterator[Account]:
+        """
+        分配一个账号，退出时归还并按是否抛出异常更新账号状态
+        
+        Yields:
+            分配的账号
+        """
+        account = self.acquire()
+        try:
+            yield account
+        except BaseException as e:
+            self.release(account, e)
+            raise
+        self.release(account)
+    
+    def acquire(self) -> Account:
+        """
+        分配一个账号：跳过冷却中和并发已满的账号，没有可用账号时等待
+        
+        Returns:
+            分配的账号，使用完后必须调用 release
+        """
+        waited = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                account = self._pick(now) if self._global_available() else None
+                if account:
+                    account.in_flight += 1
+                    account.requests += 1
+                    account.last_used = now
+                    self._in_flight += 1
+                    return account
+                
+                # 所有账号都在冷却时等到最早结束冷却的时刻，否则等待其他请求归还账号
+                cooling = [a.cooldown_until for a in self.accounts if a.cooling_down(now)]
+                timeout = min(cooling) - now if len(cooling) == len(self.accounts) else None
+                if timeout and not waited:
+                    logger.warning("所有账号都在冷却中，%.0f 秒后继续下载", timeout)
+                waited = True
+                self._cond.wait(timeout)
+    
+    def release(self, account: Account, error: Optional[BaseException] = None):
+        """
+        归还账号
+        
+        Args:
+            account: acquire 分配的账号
+            error: 使用账号时抛出的异常，None表示成功；风控/限流错误使账号进入冷却
+        """
+        with self._cond:
+            account.in_flight -= 1
+            self._in_flight -= 1
+            if error is None:
+                account.successes += 1
+                account.consecutive_throttles = 0
+            elif is_throttled(error):
+                account.throttled += 1
+                account.consecutive_throttles += 1
+                account.last_error = str(error)
+                seconds = min(self.max_cooldown, self.cooldown * 2 ** (account.consecutive_throttles - 1))
+                account.cooldown_until = time.monotonic() + seconds
+                logger.warning(
+                    "账号 %s 被限流（连续第 %d 次），冷却 %.0f 秒", account.name, account.consecutive_throttles, seconds
+                )
+            else:
+                account.failures += 1
+                account.last_error = str(error)
+            self._cond.notify_all()
+    
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            return {
+                'strategy': self.strategy,
+                'in_flight': self._in_flight,
+                'available': sum(1 for a in self.accounts if not a.cooling_down(now)),
+                'accounts': [a.snapshot(now) for a in self.accounts],
+            }
+    
+    def _global_available(self) -> bool:
+        return self.global_concurrency <= 0 or self._in_flight < self.global_concurrency
+    
+    def _pick(self, now: float) -> Optional[Account]:
+        """按分配策略选择一个未在冷却且并发未满的账号（在锁内调用）"""
+        candidates = [
+            a for a in self.accounts
+            if not a.cooling_down(now) and (self.account_concurrency <= 0 or a.in_flight < self.account_concurrency)
+        ]
+        if not candidates:
+            return None
+        if self.strategy == "lru":
+            return min(candidates, key=lambda a: (a.in_flight, a.last_used))
+        
+        # 轮询：从上次分配的账号之后开始找第一个可用账号
+        for offset in range(len(self.accounts)):
+            account = self.accounts[(self._next + offset) % len(self.accounts)]
+            if account in candidates:
+                self._next = (self._next + offset + 1) % len(self.accounts)
+                return account
+        return None
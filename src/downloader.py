@@ -1,28 +1,198 @@
 """使用yt-dlp下载Bilibili视频字幕"""
-import json
+import functools
+import logging
+import os
 import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Tuple
-import yt_dlp
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, Union
 from config.settings import Settings
-from utils.logger import setup_logger
+from utils.logger import YT_DLP_LOGGER, setup_logger
+from src.checkpoint import METADATA
+from src.cookie_pool import Account, CookiePool, is_throttled
+from src.metrics import RunMetrics
+from src.subtitle_store import StoredSubtitle, SubtitleStore
+from src.subtitle_parser import (
+    SUPPORTED_FORMATS, Cue, cues_to_srt, cues_to_text, parse_subtitle_file, parse_subtitle_text,
+)
+
+if TYPE_CHECKING:
+    import yt_dlp
+    from yt_dlp.cookies import YoutubeDLCookieJar
+    from src.checkpoint import Checkpoint
 
 logger = setup_logger()
 
+# 字幕语言优先级
+PREFERRED_LANGS = ['ai-zh', 'zh-CN', 'zh', 'ai-en', 'en', 'ai-ja', 'ja']
+# 字幕格式优先级
+PREFERRED_FORMATS = ['srt', 'vtt', 'ass', 'ssa']
+
+# 各线程复用的YoutubeDL的基础参数，单次调用的差异（字幕语言、扁平提取等）在调用期间临时覆盖
+_BASE_OPTIONS = {
+    'writesubtitles': True,
+    'writeautomaticsub': True,
+    'subtitleslangs': PREFERRED_LANGS,
+    'skip_download': True,
+    # 多P视频和合集只列出分P，不逐个提取
+    'extract_flat': 'in_playlist',
+}
+_MISSING = object()
+
+
+def _base_options() -> dict:
+    """YoutubeDL的基础参数：输出转发到日志，只有DEBUG级别时才启用yt-dlp的详细输出"""
+    ytdlp_logger = logging.getLogger(YT_DLP_LOGGER)
+    return {**_BASE_OPTIONS, 'logger': ytdlp_logger, 'verbose': ytdlp_logger.isEnabledFor(logging.DEBUG)}
+
+
+@dataclass
+class SubtitleResult:
+    """字幕获取结果"""
+    text: str
+    video_title: str
+    sub_dir: Path
+    cues: List[Cue] = field(default_factory=list)
+    video_id: Optional[str] = None
+    uploader: Optional[str] = None
+    lang: Optional[str] = None
+    subtitle_file: Optional[Path] = None
+
+
+@dataclass
+class PlaylistEntry:
+    """多P视频中的一个分P，或合集中的一个视频"""
+    index: int
+    url: str
+    title: Optional[str] = None
+    video_id: Optional[str] = None
+
+
+@dataclass
+class PlaylistResult:
+    """URL对应多P视频或合集时的获取结果：只包含分P列表，字幕需要逐个获取"""
+    title: str
+    sub_dir: Path
+    entries: List[PlaylistEntry] = field(default_factory=list)
+    playlist_id: Optional[str] = None
+    uploader: Optional[str] = None
+
 
 class SubtitleDownloader:
     """字幕下载器"""
     
-    def __init__(self, cookies_file: Optional[Path] = None):
+    def __init__(
+        self,
+        cookies_file: Optional[Path] = None,
+        reuse_instances: bool = True,
+        subtitle_store: Optional[SubtitleStore] = None,
+        cookie_pool: Optional[CookiePool] = None,
+    ):
         """
         初始化下载器
         
         Args:
-            cookies_file: cookies文件路径，默认使用Settings中的配置
+            cookies_file: cookies文件路径（只使用这一个账号），默认使用Settings中的cookies池配置
+            reuse_instances: 是否在各线程中复用YoutubeDL实例；为False时每次调用新建实例并重新读取cookies文件
+            subtitle_store: 字幕存储，默认按Settings中的配置创建
+            cookie_pool: 多账号cookies池，指定时忽略cookies_file
+        """
+        if cookie_pool is None:
+            cookie_pool = CookiePool([cookies_file]) if cookies_file else CookiePool.from_settings()
+        self.cookie_pool = cookie_pool
+        self.reuse_instances = reuse_instances
+        self.subtitle_store = subtitle_store or SubtitleStore()
+        
+        # 每个视频URL调用提取器（extract_info）的次数，用于验证网络请求次数
+        self.extractor_calls: Dict[str, int] = {}
+        self._calls_lock = threading.Lock()
+        
+        # 每个线程、每个账号一个YoutubeDL实例（提取器实例和HTTP连接在该线程的各次调用间复用），
+        # 同一账号的所有实例共享同一个已解析的cookie jar
+        self._instances: Dict[Tuple[threading.Thread, str], 'yt_dlp.YoutubeDL'] = {}
+        self._instances_lock = threading.Lock()
+        self._cookie_jars: Dict[str, 'YoutubeDLCookieJar'] = {}
+    
+    def __enter__(self) -> 'SubtitleDownloader':
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+    
+    def close(self):
+        """关闭各线程的YoutubeDL实例，并将各账号的cookie jar（可能包含服务器更新的cookies）写回cookies文件"""
+        with self._instances_lock:
+            instances = list(self._instances.values())
+            self._instances.clear()
+            cookie_jars, self._cookie_jars = self._cookie_jars, {}
+        for ydl in instances:
+            ydl.close()
+        for cookie_jar in cookie_jars.values():
+            try:
+                cookie_jar.save()
+            except Exception as e:
+                logger.warning(f"保存cookies失败: {str(e)}")
+    
+    @contextmanager
+    def _ydl(self, account: Account, **overrides) -> Iterator['yt_dlp.YoutubeDL']:
+        """
+        获取当前线程使用该账号的YoutubeDL实例，调用期间临时使用overrides中的参数
+        
+        YoutubeDL实例不是线程安全的，因此每个线程使用自己的实例。
+        
+        Args:
+            account: cookies池分配的账号
         """
-        self.cookies_file = cookies_file or Settings.COOKIES_FILE
-        if not self.cookies_file.exists():
-            raise FileNotFoundError(f"Cookies文件不存在: {self.cookies_file}")
+        # yt-dlp导入较慢（数百个提取器模块），只在真正需要下载时才导入
+        import yt_dlp
+        
+        if not self.reuse_instances:
+            with yt_dlp.YoutubeDL({**_base_options(), 'cookiefile': str(account.cookies_file), **overrides}) as ydl:
+                yield ydl
+            return
+        
+        ydl = self._thread_instance(account)
+        saved = {key: ydl.params.get(key, _MISSING) for key in overrides}
+        ydl.params.update(overrides)
+        try:
+            yield ydl
+        finally:
+            for key, value in saved.items():
+                if value is _MISSING:
+                    ydl.params.pop(key, None)
+                else:
+                    ydl.params[key] = value
+    
+    def _thread_instance(self, account: Account) -> 'yt_dlp.YoutubeDL':
+        """当前线程使用该账号的YoutubeDL实例，不存在时创建；已退出线程的实例在此时关闭"""
+        import yt_dlp
+        from yt_dlp.cookies import YoutubeDLCookieJar
+        
+        key = (threading.current_thread(), account.name)
+        with self._instances_lock:
+            ydl = self._instances.get(key)
+            if ydl is not None:
+                return ydl
+            dead = [k for k in self._instances if not k[0].is_alive()]
+            stale = [self._instances.pop(k) for k in dead]
+            cookie_jar = self._cookie_jars.get(account.name)
+            if cookie_jar is None:
+                logger.debug("加载Cookies文件: %s", account.cookies_file)
+                cookie_jar = YoutubeDLCookieJar(str(account.cookies_file))
+                cookie_jar.load()
+                self._cookie_jars[account.name] = cookie_jar
+        for old in stale:
+            old.close()
+        
+        # 不设置cookiefile：实例关闭时不会各自写回cookies文件，避免并发读写同一文件
+        ydl = yt_dlp.YoutubeDL(_base_options())
+        # cookiejar是惰性属性，在第一次请求前替换为共享的cookie jar
+        ydl.__dict__['cookiejar'] = cookie_jar
+        with self._instances_lock:
+            self._instances[key] = ydl
+        return ydl
     
     def download_subtitle(self, video_url: str, output_dir: Optional[Path] = None) -> Tuple[Optional[str], Optional[str], Optional[Path]]:
         """
@@ -35,201 +205,461 @@ class SubtitleDownloader:
         Returns:
             (字幕文本内容, 视频标题, 子目录路径) 元组，如果下载失败返回 (None, None, None)
         """
+        result = self.fetch_subtitle(video_url, output_dir)
+        if not result:
+            return None, None, None
+        return result.text, result.video_title, result.sub_dir
+    
+    def fetch_subtitle(
+        self,
+        video_url: str,
+        output_dir: Optional[Path] = None,
+        save_subtitle_file: Optional[bool] = None,
+        metrics: Optional[RunMetrics] = None,
+        sub_dir: Optional[Path] = None,
+        langs: Optional[List[str]] = None,
+        formats: Optional[List[str]] = None,
+        checkpoint: Optional['Checkpoint'] = None,
+        refresh: bool = False,
+    ) -> Optional[SubtitleResult]:
+        """
+        获取视频字幕
+        
+        从视频信息中选出字幕轨道后直接在内存中获取并解析（Bilibili的字幕内容通常已包含在
+        视频信息中，否则通过字幕URL下载），不依赖yt-dlp写出的临时文件。
+        字幕存储中已有该视频的字幕时不发出任何网络请求。
+        URL对应多P视频或合集时返回None，此类URL需要使用 fetch 获取分P列表。
+        
+        Args:
+            video_url: Bilibili视频URL
+            output_dir: 输出目录，默认使用Settings中的配置
+            save_subtitle_file: 是否在子目录中保存SRT字幕文件，默认使用Settings中的配置
+            metrics: 运行指标（可选），记录提取视频信息、获取字幕和解析的耗时
+            sub_dir: 使用已有的输出子目录（例如多P视频的目录），默认新建时间戳子目录
+            langs: 本次调用的字幕语言优先级，默认使用 PREFERRED_LANGS
+            formats: 本次调用的字幕格式优先级，默认使用 PREFERRED_FORMATS
+            checkpoint: 检查点（可选）；已下载或已解析的字幕直接从检查点恢复，并沿用第一次运行的输出子目录
+            refresh: 不读取字幕存储，重新下载并替换存储中该视频的记录（用于检查字幕是否被更新）
+        
+        Returns:
+            字幕结果，失败返回None
+        """
+        result = self.fetch(
+            video_url, output_dir, save_subtitle_file, metrics, sub_dir, langs, formats, checkpoint, refresh,
+        )
+        if isinstance(result, PlaylistResult):
+            logger.error(f"该URL是多P视频或合集（共 {len(result.entries)} 个），请单独处理")
+            return None
+        return result
+    
+    def fetch(
+        self,
+        video_url: str,
+        output_dir: Optional[Path] = None,
+        save_subtitle_file: Optional[bool] = None,
+        metrics: Optional[RunMetrics] = None,
+        sub_dir: Optional[Path] = None,
+        langs: Optional[List[str]] = None,
+        formats: Optional[List[str]] = None,
+        checkpoint: Optional['Checkpoint'] = None,
+        refresh: bool = False,
+    ) -> Union[SubtitleResult, PlaylistResult, None]:
+        """
+        获取视频字幕；URL对应多P视频（未指定 ?p=）或合集时只返回分P列表
+        
+        分P列表使用扁平提取，只需一次请求，不会逐个提取每个分P的信息。
+        参数与 fetch_subtitle 相同。
+        
+        Returns:
+            单个视频返回字幕结果，多P视频或合集返回分P列表，失败返回None
+        """
         output_dir = output_dir or Settings.OUTPUT_DIR
+        if save_subtitle_file is None:
+            save_subtitle_file = Settings.SAVE_SUBTITLE_FILES
         Settings.ensure_output_dir()
         
+        metadata = checkpoint.get(METADATA) if checkpoint else None
+        if sub_dir is None and metadata:
+            # 从检查点恢复时沿用第一次运行创建的子目录
+            sub_dir = Path(metadata['sub_dir'])
+            sub_dir.mkdir(parents=True, exist_ok=True)
+        
         # 创建子目录（使用时间戳）
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        sub_dir = output_dir / timestamp
-        sub_dir.mkdir(exist_ok=True)
-        logger.info(f"创建输出子目录: {sub_dir}")
+        if sub_dir is None:
+            from datetime import datetime
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            sub_dir = self._create_sub_dir(output_dir, timestamp)
+            logger.debug("创建输出子目录: %s", sub_dir)
+        
+        metrics = metrics or RunMetrics(url=video_url)
         
         try:
-            logger.info(f"开始下载字幕: {video_url}")
-            logger.info(f"输出目录: {output_dir}")
-            logger.info(f"Cookies文件: {self.cookies_file}")
+            if metadata:
+                resumed = self._resume(checkpoint, metadata, sub_dir, save_subtitle_file, metrics)
+                if resumed:
+                    return resumed
             
-            # 先获取视频信息，确定可用字幕
-            temp_opts = {
-                'skip_download': True,
-                'cookiefile': str(self.cookies_file),
-                'quiet': False,
-            }
+            stored = None if refresh else self.subtitle_store.get(
+                video_url, functools.partial(self._select_subtitle, langs=langs, formats=formats)
+            )
+            if stored:
+                return self._from_store(stored, sub_dir, save_subtitle_file, metrics, checkpoint)
             
-            with yt_dlp.YoutubeDL(temp_opts) as ydl:
-                logger.info("正在获取视频信息...")
-                info = ydl.extract_info(video_url, download=False)
-                video_title = info.get('title', 'unknown')
-                logger.info(f"视频标题: {video_title}")
-                
-                # 检查可用的字幕 - 尝试多个可能的字段
-                subtitles = info.get('subtitles', {})
-                automatic_captions = info.get('automatic_captions', {})
-                
-                # 调试：打印所有包含 'sub' 的键
-                logger.debug("=" * 50)
-                logger.debug("视频信息中所有包含 'sub' 的键:")
-                for key in info.keys():
-                    if 'sub' in key.lower() or 'caption' in key.lower():
-                        logger.debug(f"  {key}: {type(info[key])}")
-                logger.debug("=" * 50)
-                
-                # 如果 subtitles 和 automatic_captions 都为空，尝试直接下载看看
-                if not subtitles and not automatic_captions:
-                    logger.warning("在视频信息中未找到字幕，尝试直接下载字幕...")
-                    # 打印完整的 info 字典结构（仅键名）
-                    logger.debug(f"视频信息的所有键: {list(info.keys())}")
-                    
-                    # 尝试使用 writesubtitles 参数重新获取
-                    temp_opts_with_subs = {
-                        'skip_download': True,
-                        'cookiefile': str(self.cookies_file),
-                        'writesubtitles': True,
-                        'writeautomaticsub': True,
-                        'subtitleslangs': ['ai-zh', 'zh-CN', 'zh', 'ai-en', 'en'],
-                        'quiet': False,
-                    }
-                    logger.info("使用字幕参数重新获取信息...")
-                    ydl2 = yt_dlp.YoutubeDL(temp_opts_with_subs)
-                    info2 = ydl2.extract_info(video_url, download=False)
-                    subtitles = info2.get('subtitles', {})
-                    automatic_captions = info2.get('automatic_captions', {})
-                
-                logger.info("=" * 50)
-                logger.info("可用字幕信息:")
-                if subtitles:
-                    logger.info(f"手动字幕: {list(subtitles.keys())}")
-                    for lang, subs in subtitles.items():
-                        logger.info(f"  {lang}: {[s.get('ext', 'unknown') for s in subs]}")
-                else:
-                    logger.info("未找到手动字幕")
-                
-                if automatic_captions:
-                    logger.info(f"自动字幕: {list(automatic_captions.keys())}")
-                    for lang, subs in automatic_captions.items():
-                        logger.info(f"  {lang}: {[s.get('ext', 'unknown') for s in subs]}")
-                else:
-                    logger.info("未找到自动字幕")
-                logger.info("=" * 50)
-                
-                # 动态选择字幕语言和格式
-                available_langs = list(subtitles.keys()) + list(automatic_captions.keys())
-                selected_lang = None
-                selected_format = None
-                
-                if available_langs:
-                    # 优先选择中文字幕
-                    preferred_langs = ['ai-zh', 'zh-CN', 'zh', 'ai-en', 'en', 'ai-ja', 'ja']
-                    for pref_lang in preferred_langs:
-                        if pref_lang in available_langs:
-                            selected_lang = pref_lang
-                            break
-                    
-                    # 如果没找到优先语言，使用第一个可用语言
-                    if not selected_lang and available_langs:
-                        selected_lang = available_langs[0]
-                    
-                    if selected_lang:
-                        # 获取该语言可用的格式
-                        lang_subs = subtitles.get(selected_lang) or automatic_captions.get(selected_lang)
-                        if lang_subs:
-                            # 优先选择 srt，其次 vtt
-                            preferred_formats = ['srt', 'vtt', 'ass', 'ssa']
-                            for pref_format in preferred_formats:
-                                if any(s.get('ext') == pref_format for s in lang_subs):
-                                    selected_format = pref_format
-                                    break
-                
-                if not selected_lang:
-                    # 即使信息中没有字幕，也尝试下载常见语言的字幕
-                    logger.warning("信息中未找到字幕，尝试下载常见语言字幕...")
-                    selected_lang = 'ai-zh'  # 默认尝试中文字幕
-                    selected_format = 'srt'  # 默认使用 srt 格式
-                    logger.info(f"将尝试下载: {selected_lang} ({selected_format})")
-                else:
-                    logger.info(f"选择字幕: {selected_lang} ({selected_format or 'auto'})")
+            # 账号被限流时换用其他账号重试（被限流的账号已进入冷却，不会再被分配）
+            attempts = len(self.cookie_pool)
+            for attempt in range(1, attempts + 1):
+                try:
+                    return self._download(
+                        video_url, sub_dir, save_subtitle_file, metrics, langs, formats, checkpoint, refresh,
+                    )
+                except Exception as e:
+                    if attempt == attempts or not is_throttled(e):
+                        raise
+                    logger.warning("账号被限流，换用其他账号重试（%d/%d）: %s", attempt + 1, attempts, video_url)
+        
+        except Exception as e:
+            logger.error(f"下载字幕失败: {str(e)}")
+            return None
+    
+    def _download(
+        self,
+        video_url: str,
+        sub_dir: Path,
+        save_subtitle_file: bool,
+        metrics: RunMetrics,
+        langs: Optional[List[str]],
+        formats: Optional[List[str]],
+        checkpoint: Optional['Checkpoint'],
+        refresh: bool = False,
+    ) -> Union[SubtitleResult, PlaylistResult, None]:
+        """使用cookies池分配的账号提取视频信息并获取字幕，账号被限流时抛出的异常由调用方决定是否重试"""
+        logger.info("开始下载字幕: %s", video_url)
+        
+        # 提取信息时就带上字幕参数（见 _BASE_OPTIONS），使提取器在同一次请求中获取字幕列表
+        overrides = {'subtitleslangs': langs} if langs else {}
+        with self.cookie_pool.account() as account, self._ydl(account, **overrides) as ydl:
+            metrics.cookie_account = account.name
+            logger.debug("使用账号: %s", account.name)
+            logger.debug("正在获取视频信息...")
+            with metrics.timer('extract_info'):
+                info = self._extract_info(ydl, video_url)
+            if info.get('_type') == 'playlist':
+                return self._playlist_result(info, sub_dir)
+            video_title = info.get('title', 'unknown')
+            metrics.video_title, metrics.video_id = video_title, info.get('id')
+            logger.info("视频标题: %s", video_title)
             
-            # 配置yt-dlp选项，使用选定的语言和格式
-            ydl_opts = {
-                'writesubtitles': True,
-                'writeautomaticsub': True,
-                'subtitleslangs': [selected_lang, 'zh-CN', 'zh', 'ai-en', 'en'],  # 尝试多个语言
-                'skip_download': True,
-                'outtmpl': str(sub_dir / '%(title)s.%(ext)s'),
-                'cookiefile': str(self.cookies_file),
-                'verbose': True,  # 启用详细日志
-            }
+            subtitles = info.get('subtitles') or {}
+            automatic_captions = info.get('automatic_captions') or {}
+            if logger.isEnabledFor(logging.DEBUG):
+                self._log_available(subtitles, automatic_captions)
             
-            # 如果指定了格式，使用指定格式；否则让yt-dlp自动选择
-            if selected_format:
-                ydl_opts['subtitlesformat'] = selected_format
-            else:
-                # 不指定格式，让yt-dlp自动选择可用格式
-                ydl_opts['subtitlesformat'] = 'srt/vtt/ass/ssa'
+            selected_lang, selected_format = self._select_subtitle(subtitles, automatic_captions, langs, formats)
+            if not selected_lang:
+                logger.warning("未找到字幕: %s", video_title)
+                return None
+            logger.info("选择字幕: %s (%s)", selected_lang, selected_format or 'auto')
             
-            # 下载字幕
-            logger.info("开始下载字幕文件...")
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
-                
-                # 列出输出子目录中的所有文件
-                logger.info(f"输出子目录中的文件:")
-                for file in sub_dir.iterdir():
-                    if file.is_file():
-                        logger.info(f"  - {file.name} ({file.stat().st_size} bytes)")
-                
-                # 查找下载的字幕文件
-                subtitle_file = self._find_subtitle_file(sub_dir, video_title)
-                
-                if subtitle_file:
-                    logger.info(f"找到字幕文件: {subtitle_file}")
-                    # 读取并解析字幕内容
-                    subtitle_text = self._parse_subtitle(subtitle_file)
-                    logger.info(f"字幕下载成功，共 {len(subtitle_text)} 字符")
-                    return subtitle_text, video_title, sub_dir
-                else:
-                    logger.warning("未找到字幕文件")
-                    logger.warning(f"已搜索目录: {sub_dir}")
-                    logger.warning(f"视频标题: {video_title}")
-                    return None, None, None
-                    
+            tracks = subtitles.get(selected_lang) or automatic_captions.get(selected_lang) or []
+            track = next((t for t in tracks if t.get('ext') == selected_format), tracks[0] if tracks else None)
+            if not track:
+                logger.warning("字幕轨道不可用: %s", selected_lang)
+                return None
+            
+            if checkpoint:
+                checkpoint.mark(
+                    METADATA, title=video_title, video_id=info.get('id'), uploader=info.get('uploader'),
+                    sub_dir=str(sub_dir), lang=selected_lang,
+                )
+            with metrics.timer('subtitle_fetch'):
+                content, fmt = self._read_track(ydl, track)
+            if checkpoint:
+                checkpoint.save_subtitle(content, fmt)
+        stored_file = self.subtitle_store.put(
+            video_url, info, selected_lang, selected_format, content, fmt, replace=refresh,
+        )
+        
+        return self._finish(
+            content, fmt, None, video_title, sub_dir, info.get('id'), info.get('uploader'), selected_lang,
+            save_subtitle_file, metrics, checkpoint, stored_file,
+        )
+    
+    @staticmethod
+    def _log_available(subtitles: dict, automatic_captions: dict):
+        """调试输出视频的所有字幕语言和格式"""
+        for label, tracks in (("手动字幕", subtitles), ("自动字幕", automatic_captions)):
+            if not tracks:
+                logger.debug("未找到%s", label)
+                continue
+            logger.debug("%s: %s", label, list(tracks))
+            for lang, subs in tracks.items():
+                logger.debug("  %s: %s", lang, [s.get('ext', 'unknown') for s in subs])
+    
+    def _from_store(
+        self,
+        stored: StoredSubtitle,
+        sub_dir: Path,
+        save_subtitle_file: bool,
+        metrics: RunMetrics,
+        checkpoint: Optional['Checkpoint'],
+    ) -> Optional[SubtitleResult]:
+        """使用字幕存储中的字幕，不请求Bilibili"""
+        metrics.video_title, metrics.video_id = stored.video_title, stored.video_id
+        metrics.subtitle_store_hit = True
+        logger.info("视频标题: %s", stored.video_title)
+        logger.info("使用已存储的字幕，跳过下载: %s (%s)", stored.lang, stored.fmt)
+        if checkpoint:
+            checkpoint.mark(
+                METADATA, title=stored.video_title, video_id=stored.video_id, uploader=stored.uploader,
+                sub_dir=str(sub_dir), lang=stored.lang,
+            )
+        return self._finish(
+            stored.content, stored.fmt, None, stored.video_title, sub_dir, stored.video_id, stored.uploader,
+            stored.lang, save_subtitle_file, metrics, checkpoint, stored.path,
+        )
+    
+    def _resume(
+        self,
+        checkpoint: 'Checkpoint',
+        metadata: dict,
+        sub_dir: Path,
+        save_subtitle_file: bool,
+        metrics: RunMetrics,
+    ) -> Optional[SubtitleResult]:
+        """从检查点恢复已下载或已解析的字幕，检查点中没有字幕内容时返回None（需要重新下载）"""
+        cues = checkpoint.load_cues()
+        saved = None if cues else checkpoint.load_subtitle()
+        if not cues and not saved:
+            return None
+        content, fmt = saved or (None, None)
+        video_title = metadata.get('title') or 'unknown'
+        metrics.video_title, metrics.video_id = video_title, metadata.get('video_id')
+        logger.info(f"从检查点恢复字幕（{'已解析' if cues else '未解析'}），跳过下载: {video_title}")
+        return self._finish(
+            content, fmt, cues, video_title, sub_dir, metadata.get('video_id'), metadata.get('uploader'),
+            metadata.get('lang'), save_subtitle_file, metrics, checkpoint,
+        )
+    
+    def _finish(
+        self,
+        content: Optional[str],
+        fmt: Optional[str],
+        cues: Optional[List[Cue]],
+        video_title: str,
+        sub_dir: Path,
+        video_id: Optional[str],
+        uploader: Optional[str],
+        lang: Optional[str],
+        save_subtitle_file: bool,
+        metrics: RunMetrics,
+        checkpoint: Optional['Checkpoint'],
+        stored_file: Optional[Path] = None,
+    ) -> Optional[SubtitleResult]:
+        """解析字幕内容（已有解析结果时跳过）、按需保存字幕文件并生成字幕结果"""
+        if cues is None:
+            with metrics.timer('parse'):
+                cues = parse_subtitle_text(content, fmt)
+            logger.debug("解析完成，共 %d 条字幕", len(cues))
+            if not cues:
+                logger.warning("字幕内容为空")
+                return None
+            if checkpoint:
+                checkpoint.save_cues(cues)
+        
+        subtitle_file = None
+        if save_subtitle_file:
+            subtitle_file = self._save_subtitle_file(
+                sub_dir, video_title, lang or 'unknown', fmt, content, cues, stored_file
+            )
+            logger.debug("字幕已保存到: %s", subtitle_file)
+        
+        subtitle_text = cues_to_text(cues)
+        logger.info("字幕获取成功，共 %d 条、%d 字符", len(cues), len(subtitle_text))
+        return SubtitleResult(
+            text=subtitle_text,
+            cues=cues,
+            video_title=video_title,
+            sub_dir=sub_dir,
+            video_id=video_id,
+            uploader=uploader,
+            lang=lang,
+            subtitle_file=subtitle_file,
+        )
+    
+    def list_videos(self, channel_url: str, limit: Optional[int] = None) -> Optional[List[PlaylistEntry]]:
+        """
+        列出UP主空间（或合集）中的视频，例如 https://space.bilibili.com/<mid>/video
+        
+        只做扁平提取，不会逐个提取视频信息；投稿列表按页获取，指定limit时只请求需要的页数。
+        
+        Args:
+            channel_url: UP主空间或合集URL
+            limit: 最多列出的视频数（按列表顺序，UP主空间为最新投稿在前），None表示全部
+        
+        Returns:
+            视频列表，失败返回None
+        """
+        try:
+            overrides = {'extract_flat': True, 'playlistend': limit or None, 'quiet': True}
+            with self.cookie_pool.account() as account, self._ydl(account, **overrides) as ydl:
+                info = self._extract_info(ydl, channel_url)
         except Exception as e:
-            logger.error(f"下载字幕失败: {str(e)}")
-            return None, None, None
+            logger.error("获取视频列表失败: %s: %s", channel_url, e)
+            return None
+        
+        if info.get('_type') != 'playlist':
+            return [PlaylistEntry(index=1, url=info.get('webpage_url') or channel_url,
+                                  title=info.get('title'), video_id=info.get('id'))]
+        entries = self._flat_entries(info)
+        logger.info("获取视频列表: %s，共 %d 个", info.get('title') or channel_url, len(entries))
+        return entries[:limit] if limit else entries
+    
+    @staticmethod
+    def _playlist_result(info: dict, sub_dir: Path) -> PlaylistResult:
+        """由扁平提取得到的播放列表信息生成分P列表"""
+        entries = SubtitleDownloader._flat_entries(info)
+        result = PlaylistResult(
+            title=info.get('title') or info.get('id') or 'playlist',
+            sub_dir=sub_dir,
+            entries=entries,
+            playlist_id=info.get('id'),
+            uploader=info.get('uploader'),
+        )
+        logger.info(f"多P视频/合集: {result.title}，共 {len(entries)} 个")
+        return result
+    
+    @staticmethod
+    def _flat_entries(info: dict) -> List[PlaylistEntry]:
+        """扁平提取结果中的条目，缺少URL的条目被跳过"""
+        entries = []
+        for index, entry in enumerate(info.get('entries') or [], 1):
+            url = entry.get('webpage_url') or entry.get('url')
+            if url:
+                entries.append(PlaylistEntry(index=index, url=url, title=entry.get('title'), video_id=entry.get('id')))
+        return entries
+    
+    @staticmethod
+    def _read_track(ydl: 'yt_dlp.YoutubeDL', track: dict) -> Tuple[str, str]:
+        """
+        在内存中读取字幕轨道内容
+        
+        Returns:
+            (字幕内容, 格式) 元组；Bilibili字幕接口返回的JSON格式为 "json"
+        """
+        fmt = (track.get('ext') or 'srt').lower()
+        if track.get('data') is not None:
+            return track['data'], fmt
+        
+        logger.debug("下载字幕内容: %s", track['url'])
+        # 使用yt-dlp的网络层下载，复用cookies和请求头
+        with ydl.urlopen(track['url']) as response:
+            content = response.read().decode('utf-8-sig')
+        if fmt == 'json' or content.lstrip().startswith('{'):
+            fmt = 'json'
+        return content, fmt
+    
+    @staticmethod
+    def _save_subtitle_file(
+        sub_dir: Path,
+        video_title: str,
+        lang: str,
+        fmt: Optional[str],
+        content: Optional[str],
+        cues: List[Cue],
+        stored_file: Optional[Path] = None,
+    ) -> Path:
+        """
+        将字幕写入子目录，JSON字幕（或只有解析结果时）转换为SRT保存
+        
+        原始格式的字幕在字幕存储中时创建指向存储文件的硬链接，不支持硬链接时（例如跨文件系统）写入副本。
+        """
+        safe_title = re.sub(r'[<>:"/\\|?*]', '', video_title).strip() or 'subtitle'
+        if content is None or fmt not in ('srt', 'vtt', 'ass', 'ssa'):
+            fmt, content, stored_file = 'srt', cues_to_srt(cues), None
+        subtitle_file = sub_dir / f"{safe_title}.{lang}.{fmt}"
+        # 已有的文件可能是指向存储文件的硬链接，先删除，避免覆盖写入时修改存储的字幕
+        subtitle_file.unlink(missing_ok=True)
+        if stored_file is not None:
+            try:
+                os.link(stored_file, subtitle_file)
+                return subtitle_file
+            except OSError:
+                pass
+        with open(subtitle_file, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        return subtitle_file
     
-    def _find_subtitle_file(self, output_dir: Path, video_title: str) -> Optional[Path]:
-        """查找字幕文件"""
-        # 清理标题中的特殊字符，用于匹配文件名
-        safe_title = re.sub(r'[<>:"/\\|?*]', '', video_title)
-        logger.info(f"搜索字幕文件，清理后的标题: {safe_title}")
-        
-        # 查找.vtt文件
-        for ext in ['.vtt', '.srt']:
-            pattern = f"{safe_title}*{ext}"
-            logger.info(f"搜索模式: {pattern}")
-            matches = list(output_dir.glob(pattern))
-            if matches:
-                logger.info(f"找到匹配文件: {[str(m) for m in matches]}")
-                return matches[0]
-        
-        # 如果没找到，尝试查找所有.vtt文件（可能是自动生成的文件名）
-        logger.info("未找到精确匹配，搜索所有.vtt文件...")
-        vtt_files = list(output_dir.glob("*.vtt"))
-        srt_files = list(output_dir.glob("*.srt"))
-        all_subtitle_files = vtt_files + srt_files
-        
-        if all_subtitle_files:
-            logger.info(f"找到字幕文件: {[str(f) for f in all_subtitle_files]}")
-            # 返回最新的文件
-            return max(all_subtitle_files, key=lambda p: p.stat().st_mtime)
-        
-        logger.warning("未找到任何字幕文件")
-        return None
+    def _extract_info(self, ydl: 'yt_dlp.YoutubeDL', video_url: str) -> dict:
+        """调用提取器获取视频信息，并记录每个视频的提取次数"""
+        with self._calls_lock:
+            self.extractor_calls[video_url] = self.extractor_calls.get(video_url, 0) + 1
+        return ydl.extract_info(video_url, download=False)
+    
+    @staticmethod
+    def _select_subtitle(
+        subtitles: Dict[str, list],
+        automatic_captions: Dict[str, list],
+        langs: Optional[List[str]] = None,
+        formats: Optional[List[str]] = None,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        动态选择字幕语言和格式
+        
+        Args:
+            subtitles: 手动字幕
+            automatic_captions: 自动字幕
+            langs: 语言优先级，默认使用 PREFERRED_LANGS
+            formats: 格式优先级，默认使用 PREFERRED_FORMATS
+        
+        Returns:
+            (语言, 格式) 元组，没有可用字幕时语言为None
+        """
+        available_langs = [
+            lang for lang in list(subtitles.keys()) + list(automatic_captions.keys())
+            if lang != 'danmaku'  # 弹幕不是字幕
+        ]
+        selected_lang = None
+        selected_format = None
+        
+        if available_langs:
+            # 优先选择中文字幕
+            for pref_lang in langs or PREFERRED_LANGS:
+                if pref_lang in available_langs:
+                    selected_lang = pref_lang
+                    break
+            
+            # 如果没找到优先语言，使用第一个可用语言
+            if not selected_lang:
+                selected_lang = available_langs[0]
+            
+            # 获取该语言可用的格式
+            lang_subs = subtitles.get(selected_lang) or automatic_captions.get(selected_lang)
+            if lang_subs:
+                # 优先选择 srt，其次 vtt
+                for pref_format in formats or PREFERRED_FORMATS:
+                    if any(s.get('ext') == pref_format for s in lang_subs):
+                        selected_format = pref_format
+                        break
+        
+        return selected_lang, selected_format
+    
+    @staticmethod
+    def _create_sub_dir(output_dir: Path, timestamp: str) -> Path:
+        """创建时间戳子目录，批量并发时同一秒内的目录追加序号避免冲突"""
+        output_dir.mkdir(parents=True, exist_ok=True)
+        sub_dir = output_dir / timestamp
+        suffix = 1
+        while True:
+            try:
+                sub_dir.mkdir()
+                return sub_dir
+            except FileExistsError:
+                sub_dir = output_dir / f"{timestamp}_{suffix}"
+                suffix += 1
     
     def _parse_subtitle(self, subtitle_file: Path) -> str:
         """
-        解析字幕文件（VTT或SRT格式），提取纯文本
+        解析字幕文件（SRT、VTT或ASS格式），提取纯文本
         
         Args:
             subtitle_file: 字幕文件路径
@@ -237,60 +667,28 @@ class SubtitleDownloader:
         Returns:
             纯文本字幕内容
         """
+        return cues_to_text(self._parse_cues(subtitle_file))
+    
+    def _parse_cues(self, subtitle_file: Path) -> List[Cue]:
+        """
+        解析字幕文件为带时间信息的字幕条目
+        
+        Args:
+            subtitle_file: 字幕文件路径
+        
+        Returns:
+            字幕条目列表
+        """
         try:
             file_ext = subtitle_file.suffix.lower()
-            logger.info(f"解析字幕文件: {subtitle_file.name} (格式: {file_ext})")
-            
-            with open(subtitle_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            if file_ext == '.vtt':
-                # 解析VTT格式
-                # 移除WEBVTT头部
-                content = re.sub(r'WEBVTT.*?\n\n', '', content, flags=re.DOTALL)
-                # 移除时间戳行 (格式: 00:00:00.000 --> 00:00:00.000)
-                content = re.sub(r'\d{2}:\d{2}:\d{2}\.\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}\.\d{3}.*?\n', '\n', content)
-            elif file_ext == '.srt':
-                # 解析SRT格式
-                # SRT格式: 序号\n时间戳\n文本\n空行
-                # 移除序号行和时间戳行
-                lines = content.split('\n')
-                text_lines = []
-                skip_next = False
-                for i, line in enumerate(lines):
-                    line = line.strip()
-                    # 跳过空行
-                    if not line:
-                        skip_next = False
-                        continue
-                    # 跳过序号行（纯数字）
-                    if re.match(r'^\d+$', line):
-                        skip_next = True
-                        continue
-                    # 跳过时间戳行
-                    if skip_next and re.match(r'\d{2}:\d{2}:\d{2}[,.]\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}[,.]\d{3}', line):
-                        skip_next = False
-                        continue
-                    # 收集文本行
-                    if not skip_next:
-                        text_lines.append(line)
-                content = '\n'.join(text_lines)
-            else:
-                # 其他格式，尝试通用解析
+            logger.debug("解析字幕文件: %s (格式: %s)", subtitle_file.name, file_ext)
+            if file_ext.lstrip('.') not in SUPPORTED_FORMATS:
                 logger.warning(f"未知字幕格式: {file_ext}，尝试通用解析")
             
-            # 移除HTML标签
-            content = re.sub(r'<[^>]+>', '', content)
-            
-            # 移除多余的空行
-            content = re.sub(r'\n{3,}', '\n\n', content)
-            
-            # 清理每行，移除前后空格
-            lines = [line.strip() for line in content.split('\n') if line.strip()]
-            
-            return '\n'.join(lines)
-            
+            cues = parse_subtitle_file(subtitle_file)
+            logger.debug("解析完成，共 %d 条字幕", len(cues))
+            return cues
+        
         except Exception as e:
             logger.error(f"解析字幕文件失败: {str(e)}")
             raise
-
@@ -0,0 +1,239 @@
+"""
+对冲请求：降低AI API的尾延迟
+
+请求在近期延迟的某个百分位（默认p95）之后仍未返回响应（流式请求为首个token）时，
+再向备用目标（相同或另一个模型/接口）发出一个请求，取先返回的结果，取消另一个。
+主请求在阈值之前就失败时立即发出备用请求，此时备用目标相当于降级模型。
+
+阈值按近期成功请求的延迟动态计算，样本不足时使用固定的初始阈值。
+"""
+import math
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+from config.settings import Settings
+from utils.logger import bind_log_context, setup_logger
+
+logger = setup_logger()
+
+# 延迟类型：非流式请求统计完整响应时间，流式请求统计首个token时间
+RESPONSE = "response"
+FIRST_TOKEN = "first_token"
+
+PRIMARY = "primary"
+BACKUP = "backup"
+
+
+class HedgeCancelled(Exception):
+    """另一个请求已经胜出，本请求被取消"""
+
+
+@dataclass(frozen=True)
+class HedgeTarget:
+    """请求目标：接口地址、模型和API密钥（None表示使用总结器的密钥）"""
+    url: str
+    model: str
+    api_key: Optional[str] = None
+
+
+@dataclass
+class HedgeOutcome:
+    """一次对冲调用的结果"""
+    value: Any
+    winner: str
+    hedged: bool
+    seconds: float
+
+
+class LatencyTracker:
+    """最近若干次请求的延迟，用于计算百分位"""
+    
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+    
+    def percentile(self, p: float) -> Optional[float]:
+        """第p百分位（最近秩法），没有样本时返回None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = math.ceil(p / 100 * len(samples))
+        return samples[min(len(samples), max(1, rank)) - 1]
+
+
+class HedgePolicy:
+    """
+    对冲策略
+    
+    同一个策略由所有并发请求共享，延迟样本和对冲次数统计在锁内更新。
+    """
+    
+    def __init__(
+        self,
+        backup: HedgeTarget,
+        percentile: Optional[float] = None,
+        initial_delay: Optional[float] = None,
+        min_delay: Optional[float] = None,
+        min_samples: Optional[int] = None,
+        window: int = 200,
+    ):
+        """
+        Args:
+            backup: 备用请求的目标
+            percentile: 对冲阈值使用的延迟百分位，默认使用Settings中的配置
+            initial_delay: 样本不足时使用的阈值（秒），默认使用Settings中的配置
+            min_delay: 阈值下限（秒），避免延迟普遍很低时几乎每个请求都被对冲
+            min_samples: 开始使用百分位阈值所需的样本数
+            window: 保留的延迟样本数
+        """
+        self.backup = backup
+        self.percentile = percentile if percentile is not None else Settings.AI_HEDGE_PERCENTILE
+        self.initial_delay = initial_delay if initial_delay is not None else Settings.AI_HEDGE_DELAY
+        self.min_delay = min_delay if min_delay is not None else Settings.AI_HEDGE_MIN_DELAY
+        self.min_samples = min_samples if min_samples is not None else Settings.AI_HEDGE_MIN_SAMPLES
+        self._latency = {RESPONSE: LatencyTracker(window), FIRST_TOKEN: LatencyTracker(window)}
+        self._counts = {'requests': 0, 'hedged': 0, 'backup_wins': 0, 'failed': 0}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_settings(cls, api_url: str, model: str) -> 'HedgePolicy':
+        """按Settings中的备用模型/接口配置创建策略，未配置时备用请求与主请求相同"""
+        backup = HedgeTarget(
+            url=Settings.AI_HEDGE_API_URL or api_url,
+            model=Settings.AI_HEDGE_MODEL or model,
+            api_key=Settings.AI_HEDGE_API_KEY or None,
+        )
+        return cls(backup)
+    
+    def delay(self, kind: str) -> float:
+        """当前的对冲阈值（秒）"""
+        tracker = self._latency[kind]
+        if len(tracker) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, tracker.percentile(self.percentile))
+    
+    def run(
+        self,
+        kind: str,
+        primary: HedgeTarget,
+        attempt: Callable[[HedgeTarget, threading.Event], Any],
+        discard: Optional[Callable[[Any], None]] = None,
+    ) -> HedgeOutcome:
+        """
+        发出主请求，超过阈值仍未返回（或已失败）时发出备用请求，返回先成功的结果
+        
+        请求在后台线程中执行。落败的请求会收到取消信号，attempt应在重试之间和读取数据的间隙检查
+        并抛出 HedgeCancelled；已经返回的落败结果交给 discard 释放（例如关闭响应）。
+        
+        Args:
+            kind: 延迟类型（RESPONSE / FIRST_TOKEN）
+            primary: 主请求目标
+            attempt: 执行一次请求，参数为 (目标, 取消信号)，返回结果或抛出异常
+            discard: 释放落败结果的函数（可选）
+        
+        Returns:
+            对冲调用的结果
+        
+        Raises:
+            Exception: 所有请求都失败时抛出主请求的异常
+        """
+        results: queue.Queue = queue.Queue()
+        cancels: Dict[str, threading.Event] = {}
+        state = {'winner': None}
+        state_lock = threading.Lock()
+        start = time.monotonic()
+        
+        def launch(name: str, target: HedgeTarget):
+            cancel = cancels[name] = threading.Event()
+            
+            def worker():
+                started = time.monotonic()
+                try:
+                    value = attempt(target, cancel)
+                except Exception as e:
+                    with state_lock:
+                        if state['winner'] is None:
+                            results.put((name, None, e))
+                    return
+                # 落败但完成的请求也计入样本，否则只统计胜出者会使阈值偏低
+                self._latency[kind].record(time.monotonic() - started)
+                with state_lock:
+                    lost = state['winner'] is not None
+                    if not lost:
+                        state['winner'] = name
+                if lost:
+                    if discard:
+                        discard(value)
+                else:
+                    results.put((name, value, None))
+            
+            threading.Thread(target=bind_log_context(worker), name=f"hedge-{name}", daemon=True).start()
+        
+        launch(PRIMARY, primary)
+        threshold = self.delay(kind)
+        hedged = False
+        errors: Dict[str, Exception] = {}
+        while True:
+            try:
+                timeout = None if hedged else max(0.0, threshold - (time.monotonic() - start))
+                name, value, error = results.get(timeout=timeout)
+            except queue.Empty:
+                name = error = None
+            if name and not error:
+                break
+            if error:
+                errors[name] = error
+                if len(errors) == len(cancels) and hedged:
+                    self._count(hedged, None)
+                    raise errors[PRIMARY]
+            if not hedged:
+                hedged = True
+                if error:
+                    logger.warning("AI请求失败，改用备用请求（%s）: %s", self.backup.model, error)
+                else:
+                    logger.info("AI请求 %.1fs 内未返回，发出备用请求（%s）", threshold, self.backup.model)
+                launch(BACKUP, self.backup)
+        
+        for other, cancel in cancels.items():
+            if other != name:
+                cancel.set()
+        if name == BACKUP:
+            logger.info("备用请求先返回（%s）", self.backup.model)
+        self._count(hedged, name)
+        return HedgeOutcome(value=value, winner=name, hedged=hedged, seconds=time.monotonic() - start)
+    
+    def _count(self, hedged: bool, winner: Optional[str]):
+        with self._lock:
+            self._counts['requests'] += 1
+            self._counts['hedged'] += int(hedged)
+            self._counts['backup_wins'] += int(winner == BACKUP)
+            self._counts['failed'] += int(winner is None)
+    
+    def stats(self) -> dict:
+        """对冲次数、对冲比例和各类延迟的分位数，用于调整阈值"""
+        with self._lock:
+            counts = dict(self._counts)
+        counts['hedge_rate'] = round(counts['hedged'] / counts['requests'], 4) if counts['requests'] else 0.0
+        latency = {}
+        for kind, tracker in self._latency.items():
+            if len(tracker):
+                latency[kind] = {
+                    'samples': len(tracker),
+                    'p50': round(tracker.percentile(50), 3),
+                    'p95': round(tracker.percentile(95), 3),
+                    'p99': round(tracker.percentile(99), 3),
+                    'threshold': round(self.delay(kind), 3),
+                }
+        return {**counts, 'percentile': self.percentile, 'backup_model': self.backup.model, 'latency': latency}
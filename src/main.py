@@ -1,65 +1,712 @@
 """主程序入口"""
 import argparse
+import json
+import os
 import re
 import sys
+import time
 from pathlib import Path
 from datetime import datetime
+from typing import List, Optional
 
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from config.settings import Settings
-from utils.logger import setup_logger
-from src.downloader import SubtitleDownloader
+from utils.logger import configure_logging, flush_logs, setup_logger
+from src.downloader import PlaylistResult, SubtitleDownloader, SubtitleResult
 from src.summarizer import AISummarizer
+from src.batch import BatchPipeline
+from src.batch_api import BatchApiRunner
+from src.checkpoint import CheckpointStore
+from src.collection import CollectionPipeline
+from src.metrics import RunMetrics, write_prometheus_textfile
+from src.preprocess import prepare_subtitle_text
+from src import profiling
+from src.resummarize import resummarize_dir, resummarize_file, title_from_subtitle_file
+from src.search_index import SUBTITLE, SUMMARY, SearchIndex, index_summary
+from src.service import SummaryService, make_server
+from src.video_index import VideoIndex
+from src.watch import ChannelWatcher
 
 logger = setup_logger()
 
 
-def save_summary(summary: str, video_title: str, sub_dir: Path) -> Path:
+def add_logging_arguments(parser: argparse.ArgumentParser):
+    """添加日志相关的命令行参数"""
+    parser.add_argument("--quiet", action="store_true", help="只输出警告和错误，不输出每个视频的处理过程（适合生产环境）")
+    parser.add_argument("--verbose", action="store_true", help="输出调试信息，包括字幕列表和yt-dlp的详细输出")
+    parser.add_argument("--log-format", choices=["text", "json"], help=f"日志格式（默认: {Settings.LOG_FORMAT}）")
+
+
+def apply_logging_arguments(args: argparse.Namespace):
+    """按命令行参数重新配置日志"""
+    level = "WARNING" if args.quiet else "DEBUG" if args.verbose else None
+    if level or args.log_format:
+        configure_logging(level=level, fmt=args.log_format)
+
+
+def summary_path(video_title: str, sub_dir: Path) -> Path:
     """
-    保存总结到Markdown文件
+    根据视频标题生成总结文件路径
     
     Args:
-        summary: 总结内容
         video_title: 视频标题
         sub_dir: 输出子目录（与字幕文件在同一目录）
     
     Returns:
-        保存的文件路径
+        总结文件路径
     """
-    # 确保子目录存在
-    sub_dir.mkdir(parents=True, exist_ok=True)
-    
     # 清理文件名中的特殊字符（保留中文、英文、数字、空格、横线、下划线）
     safe_title = re.sub(r'[<>:"/\\|?*]', '', video_title).strip()
     safe_title = safe_title[:50]  # 限制长度
     
     # 生成文件名：标题.md
     filename = f"{safe_title}.md" if safe_title else "summary.md"
-    output_file = sub_dir / filename
+    return sub_dir / filename
+
+
+def save_summary(summary: str, video_title: str, sub_dir: Path, subtitle: Optional[SubtitleResult] = None) -> Path:
+    """
+    保存总结到Markdown文件，并更新检索索引
+    
+    Args:
+        summary: 总结内容
+        video_title: 视频标题
+        sub_dir: 输出子目录（与字幕文件在同一目录）
+        subtitle: 字幕获取结果（可选），用于在索引中记录BV号、UP主、字幕语言和字幕全文
+    
+    Returns:
+        保存的文件路径
+    """
+    # 确保子目录存在
+    sub_dir.mkdir(parents=True, exist_ok=True)
+    
+    output_file = summary_path(video_title, sub_dir)
     
     # 写入文件
     with open(output_file, 'w', encoding='utf-8') as f:
         f.write(summary)
     
+    index_summary(output_file, summary, video_title, subtitle)
     return output_file
 
 
+class StreamingSummaryWriter:
+    """
+    流式写入总结
+    
+    生成过程中内容逐段追加到 "<标题>.md.part"，完成后原子重命名为 "<标题>.md"，
+    因此最终文件要么不存在，要么是完整的总结。
+    """
+    
+    def __init__(self, video_title: str, sub_dir: Path, echo: bool = False):
+        """
+        Args:
+            video_title: 视频标题
+            sub_dir: 输出子目录
+            echo: 是否同时输出到标准输出
+        """
+        sub_dir.mkdir(parents=True, exist_ok=True)
+        self.output_file = summary_path(video_title, sub_dir)
+        self.part_file = self.output_file.with_name(self.output_file.name + '.part')
+        self.echo = echo
+        self._file = open(self.part_file, 'w', encoding='utf-8')
+    
+    def write(self, text: str):
+        """追加一段内容"""
+        self._file.write(text)
+        self._file.flush()
+        if self.echo:
+            flush_logs()
+            sys.stdout.write(text)
+            sys.stdout.flush()
+    
+    def finalize(self) -> Path:
+        """完成写入，将临时文件重命名为最终文件"""
+        self._file.close()
+        if self.echo:
+            sys.stdout.write("\n")
+        os.replace(self.part_file, self.output_file)
+        return self.output_file
+    
+    def abort(self):
+        """放弃写入，删除临时文件"""
+        self._file.close()
+        self.part_file.unlink(missing_ok=True)
+
+
+def read_urls(url_args: List[str], url_file: Optional[str] = None) -> List[str]:
+    """
+    汇总命令行参数和URL文件中的视频URL
+    
+    Args:
+        url_args: 命令行中传入的URL
+        url_file: URL文件路径，每行一个URL，"-" 表示从标准输入读取
+    
+    Returns:
+        去除空行和注释行（#开头）后的URL列表
+    """
+    urls = list(url_args)
+    if url_file:
+        if url_file == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            lines = Path(url_file).read_text(encoding='utf-8').splitlines()
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                urls.append(line)
+    return urls
+
+
+def record_metrics(metrics: List[RunMetrics], sub_dir: Optional[Path] = None, wall_seconds: Optional[float] = None):
+    """
+    输出运行指标：单个视频的 metrics.json（批量模式由流水线逐个写出）以及可选的Prometheus textfile
+    
+    Args:
+        metrics: 本次运行的指标
+        sub_dir: 单个视频的输出子目录（可选）
+        wall_seconds: 整个运行的耗时（可选）
+    """
+    if sub_dir and Settings.WRITE_METRICS_FILE:
+        for m in metrics:
+            m.write_sidecar(sub_dir)
+    if Settings.METRICS_TEXTFILE:
+        write_prometheus_textfile(metrics, Path(Settings.METRICS_TEXTFILE), wall_seconds)
+
+
+def run_single(
+    url: str,
+    stream: bool = False,
+    echo: bool = False,
+    download_workers: Optional[int] = None,
+    summarize_workers: Optional[int] = None,
+):
+    """
+    处理单个视频，任一步骤失败即退出；URL对应多P视频或合集时处理所有分P
+    
+    Args:
+        url: 视频URL
+        stream: 是否流式生成并逐段写入总结文件
+        echo: 流式生成时是否同时输出到标准输出
+        download_workers: 多P视频：字幕获取并发数
+        summarize_workers: 多P视频：总结并发数
+    """
+    # 步骤1: 下载字幕
+    logger.info("=" * 50)
+    logger.info("步骤1: 下载字幕")
+    logger.info("=" * 50)
+    
+    checkpoint = CheckpointStore().open(url) if Settings.RESUME else None
+    if checkpoint:
+        done = checkpoint.completed_summary(Settings.AI_MODEL)
+        if done:
+            logger.info(f"该视频已在之前的运行中完成总结: {done}（使用 --no-resume 重新处理）")
+            return
+    
+    metrics = RunMetrics(url=url)
+    downloader = SubtitleDownloader()
+    try:
+        subtitle = downloader.fetch(url, metrics=metrics, checkpoint=checkpoint)
+        if isinstance(subtitle, PlaylistResult):
+            if stream:
+                logger.warning("多P视频/合集不支持流式输出，忽略 --stream/--echo")
+            run_collection(subtitle, downloader, metrics, download_workers, summarize_workers)
+            return
+    finally:
+        downloader.close()
+    if not subtitle:
+        logger.error("字幕下载失败，程序退出")
+        sys.exit(1)
+    video_title, sub_dir = subtitle.video_title, subtitle.sub_dir
+    with metrics.timer('preprocess'):
+        subtitle_text = prepare_subtitle_text(subtitle.cues, subtitle.text)
+    
+    # 步骤2: AI总结
+    logger.info("=" * 50)
+    logger.info("步骤2: AI总结")
+    logger.info("=" * 50)
+    
+    summarizer = AISummarizer()
+    writer = StreamingSummaryWriter(video_title or "summary", sub_dir, echo) if stream else None
+    summary = summarizer.summarize(
+        subtitle_text, video_title or "", on_token=writer.write if writer else None, metrics=metrics
+    )
+    
+    if not summary:
+        if writer:
+            writer.abort()
+        metrics.error = "AI总结失败"
+        record_metrics([metrics], sub_dir)
+        logger.error("AI总结失败，程序退出")
+        sys.exit(1)
+    
+    # 步骤3: 保存结果
+    logger.info("=" * 50)
+    logger.info("步骤3: 保存结果")
+    logger.info("=" * 50)
+    
+    with metrics.timer('save'):
+        if writer:
+            output_file = writer.finalize()
+            index_summary(output_file, summary, video_title, subtitle)
+        else:
+            output_file = save_summary(summary, video_title or "summary", sub_dir, subtitle=subtitle)
+    if checkpoint:
+        checkpoint.mark_summary(output_file, summarizer.model)
+    logger.info(f"总结已保存到: {output_file}")
+    metrics.success = True
+    metrics.log_summary()
+    record_metrics([metrics], sub_dir)
+    
+    logger.info("=" * 50)
+    logger.info("完成！")
+    logger.info("=" * 50)
+
+
+def run_collection(
+    playlist: PlaylistResult,
+    downloader: SubtitleDownloader,
+    metrics: RunMetrics,
+    download_workers: Optional[int] = None,
+    summarize_workers: Optional[int] = None,
+):
+    """处理多P视频/合集的所有分P，生成各分P总结和带目录的合集总结"""
+    logger.info("=" * 50)
+    logger.info(f"步骤2: 获取并总结 {len(playlist.entries)} 个分P")
+    logger.info("=" * 50)
+    
+    pipeline = CollectionPipeline(
+        downloader, AISummarizer(), save_summary,
+        download_workers=download_workers, summarize_workers=summarize_workers,
+    )
+    result = pipeline.run(playlist, metrics)
+    
+    if not result.output_file:
+        metrics.error = "所有分P均处理失败"
+        record_metrics([metrics], playlist.sub_dir)
+        logger.error("所有分P均处理失败，程序退出")
+        sys.exit(1)
+    
+    metrics.success = True
+    metrics.log_summary()
+    record_metrics([metrics], playlist.sub_dir)
+    
+    logger.info("=" * 50)
+    logger.info(f"合集总结已保存到: {result.output_file}")
+    failed = [p for p in result.parts if not p.summary]
+    if failed:
+        logger.warning(f"{len(failed)} 个分P未能总结: {', '.join(p.label for p in failed)}")
+    logger.info("=" * 50)
+
+
+def run_from_subtitle(subtitle_file: Path, stream: bool = False, echo: bool = False):
+    """
+    直接总结磁盘上的字幕文件（不下载、不导入yt-dlp），总结保存在字幕文件所在目录
+    
+    Args:
+        subtitle_file: 字幕文件路径
+        stream: 是否流式生成并逐段写入总结文件
+        echo: 流式生成时是否同时输出到标准输出
+    """
+    if not subtitle_file.is_file():
+        logger.error(f"字幕文件不存在: {subtitle_file}")
+        sys.exit(1)
+    
+    summarizer = AISummarizer()
+    writer = None
+    if stream:
+        video_title = title_from_subtitle_file(subtitle_file)
+        writer = StreamingSummaryWriter(video_title or "summary", subtitle_file.parent, echo)
+        
+        def save_func(summary: str, title: str, sub_dir: Path) -> Path:
+            output_file = writer.finalize()
+            index_summary(output_file, summary, title)
+            return output_file
+    else:
+        video_title, save_func = None, save_summary
+    
+    result = resummarize_file(
+        summarizer, subtitle_file, save_func, video_title=video_title, on_token=writer.write if writer else None
+    )
+    if not result.success:
+        if writer:
+            writer.abort()
+        logger.error(f"{result.error}，程序退出")
+        sys.exit(1)
+    
+    logger.info(f"总结已保存到: {result.output_file}")
+    result.metrics.log_summary()
+    record_metrics([result.metrics])
+
+
+def run_resummarize(argv: List[str]):
+    """
+    resummarize子命令：对目录中已有的字幕文件重新总结（例如换用其他模型）
+    
+    Args:
+        argv: 子命令之后的命令行参数
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py resummarize",
+        description="对目录（含子目录）中已下载的字幕重新生成总结，每个子目录处理一个字幕文件，不需要cookies"
+    )
+    parser.add_argument("directory", help="字幕所在目录，例如 output/")
+    parser.add_argument("--api-key", type=str, help="AI API密钥（也可通过环境变量AI_API_KEY设置）")
+    parser.add_argument("--model", type=str, help=f"AI模型名称（默认: {Settings.AI_MODEL}）")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help=f"并发数（默认: {Settings.BATCH_SUMMARIZE_WORKERS}）"
+    )
+    parser.add_argument(
+        "--cache",
+        choices=["on", "off", "refresh", "readonly"],
+        help=f"总结缓存模式（默认: {Settings.SUMMARY_CACHE_MODE}）"
+    )
+    parser.add_argument("--no-preprocess", action="store_true", help="不对字幕做预处理，原样发送给AI")
+    parser.add_argument("--no-metrics-file", action="store_true", help="不写出运行指标 metrics.json")
+    parser.add_argument("--metrics-textfile", type=str, help="将运行指标以Prometheus textfile格式写入该文件")
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    apply_logging_arguments(args)
+    
+    if args.api_key:
+        Settings.AI_API_KEY = args.api_key
+    if args.model:
+        Settings.AI_MODEL = args.model
+    if args.cache:
+        Settings.SUMMARY_CACHE_MODE = args.cache
+    if args.no_preprocess:
+        Settings.PREPROCESS_SUBTITLES = False
+    if args.no_metrics_file:
+        Settings.WRITE_METRICS_FILE = False
+    if args.metrics_textfile:
+        Settings.METRICS_TEXTFILE = args.metrics_textfile
+    
+    directory = Path(args.directory)
+    if not directory.is_dir():
+        parser.error(f"目录不存在: {directory}")
+    if not Settings.AI_API_KEY:
+        logger.error("AI_API_KEY未设置")
+        logger.info("请通过环境变量AI_API_KEY或--api-key参数设置")
+        sys.exit(1)
+    
+    start = time.perf_counter()
+    results = resummarize_dir(AISummarizer(), directory, save_summary, workers=args.workers)
+    record_metrics([r.metrics for r in results], wall_seconds=time.perf_counter() - start)
+    
+    succeeded = sum(1 for r in results if r.success)
+    logger.info(f"重新总结完成: 成功 {succeeded}，失败 {len(results) - succeeded}")
+    if succeeded < len(results):
+        sys.exit(1)
+
+
+def run_serve(argv: List[str]):
+    """
+    serve子命令：以HTTP服务方式常驻运行，复用下载器、总结器和连接池
+    
+    Args:
+        argv: 子命令之后的命令行参数
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py serve",
+        description="HTTP服务模式：POST /jobs 提交任务，GET /jobs/<id> 查询状态，GET /jobs/<id>/result 获取总结"
+    )
+    parser.add_argument("--host", type=str, help=f"监听地址（默认: {Settings.SERVICE_HOST}）")
+    parser.add_argument("--port", type=int, help=f"监听端口（默认: {Settings.SERVICE_PORT}）")
+    parser.add_argument("--workers", type=int, help=f"工作线程数（默认: {Settings.SERVICE_WORKERS}）")
+    parser.add_argument("--cookies", action="append", help=f"Cookies文件路径，可重复指定或指定目录以使用多个账号（默认: {Settings.COOKIES_FILE}）")
+    parser.add_argument("--api-key", type=str, help="AI API密钥（也可通过环境变量AI_API_KEY设置）")
+    parser.add_argument("--model", type=str, help=f"AI模型名称（默认: {Settings.AI_MODEL}）")
+    parser.add_argument("--output", type=str, help=f"输出目录（默认: {Settings.OUTPUT_DIR}）")
+    parser.add_argument("--hedge", action="store_true", help="AI请求超过近期延迟的p95仍未返回时发出备用请求")
+    parser.add_argument("--hedge-model", type=str, help="备用请求使用的模型（隐含 --hedge）")
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    apply_logging_arguments(args)
+    
+    if args.cookies:
+        Settings.COOKIES_FILES = ",".join(args.cookies)
+    if args.api_key:
+        Settings.AI_API_KEY = args.api_key
+    if args.model:
+        Settings.AI_MODEL = args.model
+    if args.output:
+        Settings.OUTPUT_DIR = Path(args.output)
+    if args.hedge or args.hedge_model:
+        Settings.AI_HEDGE_ENABLED = True
+    if args.hedge_model:
+        Settings.AI_HEDGE_MODEL = args.hedge_model
+    
+    if not Settings.validate_cookies():
+        logger.error(f"Cookies文件不存在: {Settings.COOKIES_FILES or Settings.COOKIES_FILE}")
+        sys.exit(1)
+    if not Settings.AI_API_KEY:
+        logger.error("AI_API_KEY未设置")
+        logger.info("请通过环境变量AI_API_KEY或--api-key参数设置")
+        sys.exit(1)
+    
+    downloader = SubtitleDownloader()
+    service = SummaryService(downloader, AISummarizer(), save_summary, workers=args.workers).start()
+    server = make_server(service, args.host or Settings.SERVICE_HOST, args.port or Settings.SERVICE_PORT)
+    host, port = server.server_address[:2]
+    logger.info(f"服务已启动: http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.stop(timeout=5)
+        downloader.close()
+
+
+def run_watch(argv: List[str]):
+    """
+    watch子命令：定期轮询UP主的投稿，只处理索引中没有的新视频
+    
+    Args:
+        argv: 子命令之后的命令行参数
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py watch",
+        description="监视UP主投稿：每轮只列出投稿列表，已处理过的视频（记录在SQLite索引中）不会再次提取"
+    )
+    parser.add_argument("channels", nargs="+", help="UP主空间URL，例如 https://space.bilibili.com/<mid>/video")
+    parser.add_argument("--interval", type=float, help=f"轮询间隔秒数（默认: {Settings.WATCH_INTERVAL:.0f}）")
+    parser.add_argument("--once", action="store_true", help="只轮询一轮后退出（适合cron调用）")
+    parser.add_argument("--limit", type=int, help=f"每轮列出的最新投稿数，0表示全部（默认: {Settings.WATCH_LIST_LIMIT}）")
+    parser.add_argument("--recheck", action="store_true", help="重新获取已处理视频的字幕，字幕变化时重新总结")
+    parser.add_argument("--index", type=str, help=f"已处理视频索引文件（默认: {Settings.WATCH_INDEX_DB}）")
+    parser.add_argument("--workers", type=int, help=f"视频处理并发数（默认: {Settings.BATCH_SUMMARIZE_WORKERS}）")
+    parser.add_argument("--cookies", action="append", help=f"Cookies文件路径，可重复指定或指定目录以使用多个账号（默认: {Settings.COOKIES_FILE}）")
+    parser.add_argument("--api-key", type=str, help="AI API密钥（也可通过环境变量AI_API_KEY设置）")
+    parser.add_argument("--model", type=str, help=f"AI模型名称（默认: {Settings.AI_MODEL}）")
+    parser.add_argument("--output", type=str, help=f"输出目录（默认: {Settings.OUTPUT_DIR}）")
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    apply_logging_arguments(args)
+    
+    if args.cookies:
+        Settings.COOKIES_FILES = ",".join(args.cookies)
+    if args.api_key:
+        Settings.AI_API_KEY = args.api_key
+    if args.model:
+        Settings.AI_MODEL = args.model
+    if args.output:
+        Settings.OUTPUT_DIR = Path(args.output)
+    if args.index:
+        Settings.WATCH_INDEX_DB = Path(args.index)
+    
+    if not Settings.validate_cookies():
+        logger.error(f"Cookies文件不存在: {Settings.COOKIES_FILES or Settings.COOKIES_FILE}")
+        sys.exit(1)
+    if not Settings.AI_API_KEY:
+        logger.error("AI_API_KEY未设置")
+        logger.info("请通过环境变量AI_API_KEY或--api-key参数设置")
+        sys.exit(1)
+    
+    index = VideoIndex(Settings.WATCH_INDEX_DB)
+    downloader = SubtitleDownloader()
+    watcher = ChannelWatcher(
+        downloader, AISummarizer(), save_summary, index,
+        workers=args.workers, limit=args.limit, recheck=args.recheck,
+    )
+    logger.info(f"已处理视频索引: {Settings.WATCH_INDEX_DB}")
+    try:
+        results = watcher.watch(args.channels, interval=args.interval, once=args.once)
+    except KeyboardInterrupt:
+        logger.info("已停止监视")
+        return
+    finally:
+        index.close()
+        downloader.close()
+    if any(r.error or r.failed for r in results):
+        sys.exit(1)
+
+
+def run_search(argv: List[str]):
+    """
+    search子命令：按关键词或BV号检索已生成的总结和字幕
+    
+    Args:
+        argv: 子命令之后的命令行参数
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py search",
+        description="检索已生成的总结和字幕（多个关键词需同时出现），索引在保存总结时自动更新"
+    )
+    parser.add_argument("query", nargs="*", help="关键词")
+    parser.add_argument("--bv", type=str, help="只返回该视频（BV号）的结果")
+    parser.add_argument("--kind", choices=[SUMMARY, SUBTITLE], help="只检索总结或字幕")
+    parser.add_argument("--limit", type=int, default=20, help="最多返回的条数（默认: 20）")
+    parser.add_argument("--index", type=str, help=f"检索索引文件（默认: {Settings.SEARCH_INDEX_DB}）")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    args = parser.parse_args(argv)
+    
+    if not args.query and not args.bv:
+        parser.error("请指定关键词或 --bv")
+    index_file = Path(args.index) if args.index else Settings.SEARCH_INDEX_DB
+    if not index_file.is_file():
+        logger.error(f"检索索引不存在: {index_file}，请先运行 main.py reindex")
+        sys.exit(1)
+    
+    index = SearchIndex(index_file)
+    try:
+        hits = index.search(" ".join(args.query), video_id=args.bv, kind=args.kind, limit=args.limit)
+    finally:
+        index.close()
+    
+    flush_logs()
+    if args.json:
+        print(json.dumps([hit.to_dict() for hit in hits], ensure_ascii=False, indent=2))
+        return
+    if not hits:
+        logger.info("没有找到匹配的结果")
+        return
+    for hit in hits:
+        label = "总结" if hit.kind == SUMMARY else "字幕"
+        print(f"[{label}] {hit.title or hit.path.stem}" + (f" ({hit.video_id})" if hit.video_id else ""))
+        print(f"    {hit.path}")
+        if hit.snippet:
+            print(f"    {hit.snippet}")
+
+
+def run_reindex(argv: List[str]):
+    """
+    reindex子命令：扫描输出目录，为已有的总结和字幕建立检索索引
+    
+    Args:
+        argv: 子命令之后的命令行参数
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py reindex",
+        description="扫描输出目录（含子目录）中的总结和字幕文件并更新检索索引，修改时间未变的文件跳过"
+    )
+    parser.add_argument("directory", nargs="?", help=f"输出目录（默认: {Settings.OUTPUT_DIR}）")
+    parser.add_argument("--index", type=str, help=f"检索索引文件（默认: {Settings.SEARCH_INDEX_DB}）")
+    parser.add_argument("--no-prune", action="store_true", help="保留索引中已被删除的文件")
+    args = parser.parse_args(argv)
+    
+    directory = Path(args.directory) if args.directory else Settings.OUTPUT_DIR
+    if not directory.is_dir():
+        parser.error(f"目录不存在: {directory}")
+    
+    index = SearchIndex(Path(args.index) if args.index else Settings.SEARCH_INDEX_DB)
+    try:
+        start = time.perf_counter()
+        counts = index.reindex(directory, prune=not args.no_prune)
+        logger.info(
+            f"索引完成（{time.perf_counter() - start:.2f}s）: 更新 {counts['indexed']}，未变化 {counts['unchanged']}，"
+            f"删除 {counts['removed']}；当前文档数: {index.stats()}"
+        )
+    finally:
+        index.close()
+
+
+def run_batch(
+    urls: List[str],
+    download_workers: Optional[int] = None,
+    summarize_workers: Optional[int] = None,
+    batch_api: bool = False,
+):
+    """
+    批量处理多个视频，单个视频失败不影响其他视频
+    
+    Args:
+        urls: 视频URL列表
+        download_workers: 字幕下载并发数
+        summarize_workers: AI总结并发数（使用批处理接口时不需要）
+        batch_api: 是否通过批处理接口提交所有总结请求（等待批次完成，适合夜间大批量任务）
+    """
+    downloader = SubtitleDownloader()
+    summarizer = AISummarizer()
+    checkpoints = CheckpointStore() if Settings.RESUME else None
+    if batch_api:
+        pipeline = BatchApiRunner(
+            downloader, summarizer, save_summary, download_workers=download_workers, checkpoints=checkpoints,
+        )
+    else:
+        pipeline = BatchPipeline(
+            downloader,
+            summarizer,
+            save_summary,
+            download_workers=download_workers,
+            summarize_workers=summarize_workers,
+            checkpoints=checkpoints,
+        )
+    start = time.perf_counter()
+    try:
+        results = pipeline.run(urls)
+    finally:
+        downloader.close()
+    wall_seconds = time.perf_counter() - start
+    
+    record_metrics([r.metrics for r in results], wall_seconds=wall_seconds)
+    
+    logger.info("=" * 50)
+    logger.info("批量处理结果:")
+    for i, result in enumerate(results, 1):
+        if result.success:
+            logger.info(f"  [{i}] 成功 {result.url} -> {result.output_file}")
+        else:
+            logger.info(f"  [{i}] 失败 {result.url}: {result.error}")
+        for part in result.parts:
+            if not part.success:
+                logger.info(f"      分P失败 {part.url}: {part.error}")
+    if summarizer.hedge:
+        logger.info(f"对冲请求统计: {json.dumps(summarizer.hedge.stats(), ensure_ascii=False)}")
+    if len(downloader.cookie_pool) > 1:
+        for account in downloader.cookie_pool.stats()['accounts']:
+            logger.info(
+                f"  账号 {account['name']}: 请求 {account['requests']}，成功 {account['successes']}，"
+                f"失败 {account['failures']}，被限流 {account['throttled']}"
+            )
+    logger.info("=" * 50)
+    
+    if not all(r.success for r in results):
+        sys.exit(1)
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
-        description="Bilibili视频AI总结工具 - 下载字幕并使用AI生成总结"
+        description="Bilibili视频AI总结工具 - 下载字幕并使用AI生成总结",
+        epilog="子命令: main.py resummarize <目录>  对已下载的字幕重新总结；main.py serve  以HTTP服务方式运行；main.py watch <UP主空间URL>  监视UP主投稿；main.py search <关键词>  检索已生成的总结；main.py reindex  重建检索索引（详见 <子命令> --help）"
     )
     parser.add_argument(
-        "url",
-        help="Bilibili视频URL"
+        "urls",
+        nargs="*",
+        metavar="url",
+        help="Bilibili视频URL（可传入多个，多个时进入批量模式）"
     )
     parser.add_argument(
-        "--cookies",
+        "--url-file",
         type=str,
-        help=f"Cookies文件路径（默认: {Settings.COOKIES_FILE}）"
+        help="批量模式：URL列表文件，每行一个URL，\"-\" 表示从标准输入读取"
+    )
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        help=f"批量模式/多P视频：字幕下载并发数（默认: {Settings.BATCH_DOWNLOAD_WORKERS}）"
+    )
+    parser.add_argument(
+        "--summarize-workers",
+        type=int,
+        help=f"批量模式/多P视频：AI总结并发数（默认: {Settings.BATCH_SUMMARIZE_WORKERS}）"
+    )
+    parser.add_argument(
+        "--batch-api",
+        action="store_true",
+        help="批量模式：所有总结请求通过批处理接口一次提交并等待完成（延迟高、费用低，适合夜间大批量任务）；"
+             "中断后使用相同参数重新运行会继续等待同一批次"
+    )
+    parser.add_argument(
+        "--cookies",
+        action="append",
+        help=f"Cookies文件路径（默认: {Settings.COOKIES_FILE}）；可重复指定多个文件，或指定目录（其中每个 .txt 文件为一个账号），"
+             "在多个账号之间分配下载请求"
     )
     parser.add_argument(
         "--api-key",
@@ -71,28 +718,150 @@ def main():
         type=str,
         help=f"AI模型名称（默认: {Settings.AI_MODEL}）"
     )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="AI请求超过近期延迟的p95仍未返回时发出备用请求，取先返回的结果"
+    )
+    parser.add_argument(
+        "--hedge-model",
+        type=str,
+        help="备用请求使用的模型（隐含 --hedge，默认与 --model 相同）"
+    )
+    parser.add_argument(
+        "--cache",
+        choices=["on", "off", "refresh", "readonly"],
+        help=f"总结缓存模式：on读写 / off不使用 / refresh强制重新生成 / readonly只读（默认: {Settings.SUMMARY_CACHE_MODE}）"
+    )
+    parser.add_argument(
+        "--near-dup",
+        choices=["on", "off", "refresh", "readonly"],
+        help=f"近似重复检测模式：字幕与已总结视频高度相似时复用总结（默认: {Settings.NEAR_DUP_MODE}）"
+    )
+    parser.add_argument(
+        "--subtitle-store",
+        choices=["on", "off", "refresh", "readonly"],
+        help=f"字幕存储模式：on读写 / off不使用 / refresh强制重新下载 / readonly只读（默认: {Settings.SUBTITLE_STORE_MODE}）"
+    )
+    parser.add_argument(
+        "--no-subtitle-files",
+        action="store_true",
+        help="不在输出目录中保存字幕文件，只保存总结"
+    )
+    parser.add_argument(
+        "--no-preprocess",
+        action="store_true",
+        help="不对字幕做预处理（合并碎片、去重），原样发送给AI"
+    )
+    parser.add_argument(
+        "--from-subtitle",
+        type=str,
+        metavar="FILE",
+        help="直接总结已有的字幕文件（SRT/VTT/ASS/JSON），不下载、不需要cookies"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="流式生成总结，边生成边写入Markdown文件（仅单个视频模式）"
+    )
+    parser.add_argument(
+        "--echo",
+        action="store_true",
+        help="流式生成时同时将总结输出到终端"
+    )
+    parser.add_argument(
+        "--no-metrics-file",
+        action="store_true",
+        help="不在输出子目录中写出运行指标 metrics.json"
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        type=str,
+        help="将各阶段耗时和token用量以Prometheus textfile格式写入该文件（用于node_exporter采集）"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="性能分析：用cProfile、调用栈采样和tracemalloc分析每个阶段，结果写入各视频输出子目录的 profile/ "
+             "和输出目录的 profile_<时间戳>/（处理速度会变慢）"
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="不使用检查点：已完成或已下载字幕的视频也重新下载和总结"
+    )
     parser.add_argument(
         "--output",
         type=str,
         help=f"输出目录（默认: {Settings.OUTPUT_DIR}）"
     )
+    add_logging_arguments(parser)
     
-    args = parser.parse_args()
+    # 子命令：main.py resummarize <目录> / serve / watch <UP主空间URL> / search <关键词> / reindex [目录]
+    subcommands = {
+        "resummarize": run_resummarize,
+        "serve": run_serve,
+        "watch": run_watch,
+        "search": run_search,
+        "reindex": run_reindex,
+    }
+    subcommand = subcommands.get(sys.argv[1]) if len(sys.argv) > 1 else None
+    args = parser.parse_args() if not subcommand else None
     
     try:
+        if subcommand:
+            subcommand(sys.argv[2:])
+            return
+        
         # 配置设置
+        apply_logging_arguments(args)
         if args.cookies:
-            Settings.COOKIES_FILE = Path(args.cookies)
+            Settings.COOKIES_FILES = ",".join(args.cookies)
         if args.api_key:
             Settings.AI_API_KEY = args.api_key
         if args.model:
             Settings.AI_MODEL = args.model
+        if args.hedge or args.hedge_model:
+            Settings.AI_HEDGE_ENABLED = True
+        if args.hedge_model:
+            Settings.AI_HEDGE_MODEL = args.hedge_model
         if args.output:
             Settings.OUTPUT_DIR = Path(args.output)
+        if args.cache:
+            Settings.SUMMARY_CACHE_MODE = args.cache
+        if args.near_dup:
+            Settings.NEAR_DUP_MODE = args.near_dup
+        if args.subtitle_store:
+            Settings.SUBTITLE_STORE_MODE = args.subtitle_store
+        if args.no_subtitle_files:
+            Settings.SAVE_SUBTITLE_FILES = False
+        if args.no_preprocess:
+            Settings.PREPROCESS_SUBTITLES = False
+        if args.no_metrics_file:
+            Settings.WRITE_METRICS_FILE = False
+        if args.metrics_textfile:
+            Settings.METRICS_TEXTFILE = args.metrics_textfile
+        if args.no_resume:
+            Settings.RESUME = False
+        
+        if args.from_subtitle:
+            if args.urls or args.url_file:
+                parser.error("--from-subtitle 不能与视频URL同时使用")
+            if not Settings.AI_API_KEY:
+                logger.error("AI_API_KEY未设置")
+                logger.info("请通过环境变量AI_API_KEY或--api-key参数设置")
+                sys.exit(1)
+            with profiling.session(args.profile):
+                run_from_subtitle(Path(args.from_subtitle), stream=args.stream or args.echo, echo=args.echo)
+            return
+        
+        urls = read_urls(args.urls, args.url_file)
+        if not urls:
+            parser.error("请提供至少一个视频URL或--url-file")
         
         # 验证cookies文件
         if not Settings.validate_cookies():
-            logger.error(f"Cookies文件不存在: {Settings.COOKIES_FILE}")
+            logger.error(f"Cookies文件不存在: {Settings.COOKIES_FILES or Settings.COOKIES_FILE}")
             logger.info("请确保cookies.txt文件存在于项目根目录")
             sys.exit(1)
         
@@ -102,42 +871,17 @@ def main():
             logger.info("请通过环境变量AI_API_KEY或--api-key参数设置")
             sys.exit(1)
         
-        # 步骤1: 下载字幕
-        logger.info("=" * 50)
-        logger.info("步骤1: 下载字幕")
-        logger.info("=" * 50)
-        
-        downloader = SubtitleDownloader()
-        subtitle_text, video_title, sub_dir = downloader.download_subtitle(args.url)
-        
-        if not subtitle_text or not sub_dir:
-            logger.error("字幕下载失败，程序退出")
-            sys.exit(1)
-        
-        # 步骤2: AI总结
-        logger.info("=" * 50)
-        logger.info("步骤2: AI总结")
-        logger.info("=" * 50)
-        
-        summarizer = AISummarizer()
-        summary = summarizer.summarize(subtitle_text, video_title or "")
-        
-        if not summary:
-            logger.error("AI总结失败，程序退出")
-            sys.exit(1)
-        
-        # 步骤3: 保存结果
-        logger.info("=" * 50)
-        logger.info("步骤3: 保存结果")
-        logger.info("=" * 50)
-        
-        output_file = save_summary(summary, video_title or "summary", sub_dir)
-        logger.info(f"总结已保存到: {output_file}")
-        
-        logger.info("=" * 50)
-        logger.info("完成！")
-        logger.info("=" * 50)
-        
+        with profiling.session(args.profile):
+            if len(urls) == 1 and not args.url_file and not args.batch_api:
+                run_single(
+                    urls[0], stream=args.stream or args.echo, echo=args.echo,
+                    download_workers=args.download_workers, summarize_workers=args.summarize_workers,
+                )
+            else:
+                if args.stream or args.echo:
+                    logger.warning("批量模式不支持流式输出，忽略 --stream/--echo")
+                run_batch(urls, args.download_workers, args.summarize_workers, batch_api=args.batch_api)
+    
     except KeyboardInterrupt:
         logger.info("\n用户中断操作")
         sys.exit(0)
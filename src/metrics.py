@@ -0,0 +1,239 @@
+"""运行指标：记录每个视频各阶段耗时和token用量，输出JSON和Prometheus textfile"""
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+from utils.logger import setup_logger
+from src import profiling
+
+if TYPE_CHECKING:
+    from src.profiling import StageProfile
+
+logger = setup_logger()
+
+# 阶段名称，按流水线顺序排列
+STAGES = ('extract_info', 'subtitle_fetch', 'parse', 'preprocess', 'fingerprint', 'llm', 'save')
+
+METRICS_FILENAME = "metrics.json"
+
+
+@dataclass
+class RunMetrics:
+    """
+    单个视频的运行指标
+    
+    下载和总结可能在不同线程中进行（分块总结时还会并发多个请求），
+    因此累加操作都在锁内完成。
+    """
+    url: str
+    video_title: Optional[str] = None
+    video_id: Optional[str] = None
+    started_at: str = field(default_factory=lambda: datetime.now().isoformat(timespec='seconds'))
+    timings: Dict[str, float] = field(default_factory=dict)
+    llm_requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tokens_estimated: bool = False
+    first_token_seconds: Optional[float] = None
+    hedged_requests: int = 0
+    hedge_wins: int = 0
+    cache_hit: bool = False
+    # 字幕与已总结视频近似重复时的处理方式（reuse复用总结 / diff只总结新增内容）、相似视频和相似度
+    near_duplicate: Optional[str] = None
+    near_duplicate_of: Optional[str] = None
+    near_duplicate_similarity: Optional[float] = None
+    subtitle_store_hit: bool = False
+    cookie_account: Optional[str] = None
+    success: bool = False
+    error: Optional[str] = None
+    # 启用了性能分析（--profile）时各阶段的分析结果
+    profile: Optional['StageProfile'] = field(default=None, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def timer(self, stage: str):
+        """记录一个阶段的耗时，同一阶段多次计时会累加；启用了性能分析时同时分析该阶段"""
+        start = time.perf_counter()
+        try:
+            with profiling.stage(self, stage):
+                yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+    
+    def add_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+    
+    def add_usage(self, prompt_tokens: int, completion_tokens: int, estimated: bool = False):
+        """
+        累加一次API调用的token用量
+        
+        Args:
+            prompt_tokens: 提示词token数
+            completion_tokens: 生成token数
+            estimated: 接口未返回usage、数值为本地估算时为True
+        """
+        with self._lock:
+            self.llm_requests += 1
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+            self.tokens_estimated = self.tokens_estimated or estimated
+    
+    def add_hedge(self, backup_won: bool):
+        """
+        记录一次发出了备用请求的AI调用
+        
+        Args:
+            backup_won: 备用请求是否先返回
+        """
+        with self._lock:
+            self.hedged_requests += 1
+            self.hedge_wins += int(backup_won)
+    
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.timings.values())
+    
+    def to_dict(self) -> dict:
+        return {
+            'url': self.url,
+            'video_title': self.video_title,
+            'video_id': self.video_id,
+            'started_at': self.started_at,
+            'success': self.success,
+            'error': self.error,
+            'cache_hit': self.cache_hit,
+            'near_duplicate': self.near_duplicate,
+            'near_duplicate_of': self.near_duplicate_of,
+            'near_duplicate_similarity': self.near_duplicate_similarity,
+            'subtitle_store_hit': self.subtitle_store_hit,
+            'cookie_account': self.cookie_account,
+            'timings': {stage: round(seconds, 4) for stage, seconds in self.timings.items()},
+            'total_seconds': round(self.total_seconds, 4),
+            'first_token_seconds': round(self.first_token_seconds, 4) if self.first_token_seconds is not None else None,
+            'llm_requests': self.llm_requests,
+            'hedged_requests': self.hedged_requests,
+            'hedge_wins': self.hedge_wins,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.prompt_tokens + self.completion_tokens,
+            'tokens_estimated': self.tokens_estimated,
+        }
+    
+    def write_sidecar(self, sub_dir: Path) -> Optional[Path]:
+        """
+        将指标写入子目录中的 metrics.json（与总结文件放在一起），有性能分析结果时同时写入 profile/
+        
+        Returns:
+            写出的文件路径，失败返回None
+        """
+        try:
+            sub_dir.mkdir(parents=True, exist_ok=True)
+            path = sub_dir / METRICS_FILENAME
+            path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2) + "\n", encoding='utf-8')
+            if self.profile is not None:
+                self.profile.write(sub_dir / profiling.PROFILE_DIRNAME)
+            return path
+        except OSError as e:
+            logger.warning(f"写入运行指标失败: {str(e)}")
+            return None
+    
+    def log_summary(self):
+        """输出一行阶段耗时汇总"""
+        parts = [f"{stage} {self.timings[stage]:.2f}s" for stage in STAGES if stage in self.timings]
+        tokens = f"，token {self.prompt_tokens}+{self.completion_tokens}" if self.llm_requests else ""
+        hedges = f"，对冲 {self.hedged_requests} 次（备用请求胜出 {self.hedge_wins} 次）" if self.hedged_requests else ""
+        logger.info(f"阶段耗时: {'，'.join(parts) or '无'}{tokens}{hedges}")
+
+
+def write_prometheus_textfile(metrics: Iterable[RunMetrics], path: Path, wall_seconds: Optional[float] = None) -> bool:
+    """
+    以Prometheus textfile格式（node_exporter textfile collector）写出汇总指标
+    
+    文件先写入同目录的临时文件再原子替换，避免采集到写了一半的内容。
+    
+    Args:
+        metrics: 本次运行所有视频的指标
+        path: 输出文件路径（通常以 .prom 结尾）
+        wall_seconds: 整个批次的耗时（可选）
+    
+    Returns:
+        是否写入成功
+    """
+    metrics = list(metrics)
+    stage_sum: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+    stage_count: Dict[str, int] = {stage: 0 for stage in STAGES}
+    for m in metrics:
+        for stage, seconds in m.timings.items():
+            stage_sum[stage] = stage_sum.get(stage, 0.0) + seconds
+            stage_count[stage] = stage_count.get(stage, 0) + 1
+    succeeded = sum(1 for m in metrics if m.success)
+    
+    lines = [
+        "# HELP bilibili_summary_videos_total Videos processed in the last run.",
+        "# TYPE bilibili_summary_videos_total gauge",
+        f'bilibili_summary_videos_total{{status="success"}} {succeeded}',
+        f'bilibili_summary_videos_total{{status="failure"}} {len(metrics) - succeeded}',
+        "# HELP bilibili_summary_cache_hits_total Summaries served from the summary cache in the last run.",
+        "# TYPE bilibili_summary_cache_hits_total gauge",
+        f"bilibili_summary_cache_hits_total {sum(1 for m in metrics if m.cache_hit)}",
+        "# HELP bilibili_summary_near_duplicates_total Videos whose subtitle was a near-duplicate of an already summarized video in the last run.",
+        "# TYPE bilibili_summary_near_duplicates_total gauge",
+        f'bilibili_summary_near_duplicates_total{{action="reuse"}} {sum(1 for m in metrics if m.near_duplicate == "reuse")}',
+        f'bilibili_summary_near_duplicates_total{{action="diff"}} {sum(1 for m in metrics if m.near_duplicate == "diff")}',
+        "# HELP bilibili_summary_subtitle_store_hits_total Subtitles served from the subtitle store (no Bilibili request) in the last run.",
+        "# TYPE bilibili_summary_subtitle_store_hits_total gauge",
+        f"bilibili_summary_subtitle_store_hits_total {sum(1 for m in metrics if m.subtitle_store_hit)}",
+        "# HELP bilibili_summary_stage_seconds Time spent per pipeline stage in the last run.",
+        "# TYPE bilibili_summary_stage_seconds summary",
+    ]
+    for stage in stage_sum:
+        lines.append(f'bilibili_summary_stage_seconds_sum{{stage="{stage}"}} {stage_sum[stage]:.6f}')
+        lines.append(f'bilibili_summary_stage_seconds_count{{stage="{stage}"}} {stage_count[stage]}')
+    lines += [
+        "# HELP bilibili_summary_llm_requests_total LLM API calls in the last run.",
+        "# TYPE bilibili_summary_llm_requests_total gauge",
+        f"bilibili_summary_llm_requests_total {sum(m.llm_requests for m in metrics)}",
+        "# HELP bilibili_summary_llm_hedged_requests_total LLM calls that fired a backup (hedged) request in the last run.",
+        "# TYPE bilibili_summary_llm_hedged_requests_total gauge",
+        f'bilibili_summary_llm_hedged_requests_total{{winner="primary"}} {sum(m.hedged_requests - m.hedge_wins for m in metrics)}',
+        f'bilibili_summary_llm_hedged_requests_total{{winner="backup"}} {sum(m.hedge_wins for m in metrics)}',
+        "# HELP bilibili_summary_tokens_total LLM tokens used in the last run.",
+        "# TYPE bilibili_summary_tokens_total gauge",
+        f'bilibili_summary_tokens_total{{type="prompt"}} {sum(m.prompt_tokens for m in metrics)}',
+        f'bilibili_summary_tokens_total{{type="completion"}} {sum(m.completion_tokens for m in metrics)}',
+        "# HELP bilibili_summary_last_run_timestamp_seconds Unix time the last run finished.",
+        "# TYPE bilibili_summary_last_run_timestamp_seconds gauge",
+        f"bilibili_summary_last_run_timestamp_seconds {time.time():.0f}",
+    ]
+    if wall_seconds is not None:
+        lines += [
+            "# HELP bilibili_summary_run_duration_seconds Wall-clock duration of the last run.",
+            "# TYPE bilibili_summary_run_duration_seconds gauge",
+            f"bilibili_summary_run_duration_seconds {wall_seconds:.6f}",
+        ]
+    
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+    except OSError as e:
+        logger.warning(f"写入Prometheus指标文件失败: {str(e)}")
+        return False
+    logger.info(f"Prometheus指标已写入: {path}")
+    return True
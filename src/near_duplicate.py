@@ -0,0 +1,477 @@
+"""
+近似重复视频检测：用字幕指纹（MinHash）和本地LSH索引找出与新视频字幕高度相似的已总结视频
+
+搬运、重新上传和剪辑版本的字幕与原视频几乎相同，但总结缓存按完整字幕文本计算键，稍有不同就无法命中。
+每个已总结视频的字幕计算一个MinHash签名并写入SQLite索引:
+    - 字幕去掉空白和标点、统一大小写和全半角后，切分为字符n-gram（shingle）
+    - 签名使用单次哈希的分桶MinHash（one permutation hashing）：每个shingle只计算一次哈希，
+      按哈希值分配到一个桶并保留桶内最小值，空桶从右侧最近的非空桶补齐
+    - 签名分为若干段（band），每段的哈希写入索引表；查询时只取至少一段完全相同的候选，
+      再用完整签名估算Jaccard相似度，查询耗时与索引中的指纹总数基本无关
+    - 字幕按句子切分为片段并记录各片段的哈希，用于找出新视频中新增的内容（见 split_segments）
+"""
+import functools
+import hashlib
+import re
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Set, Tuple
+from config.settings import Settings
+from src.cache import CACHE_MODES
+
+# 签名取值范围（32位）和空桶标记
+_MAX_HASH = 0xFFFFFFFF
+# 补齐空桶时每向右移动一个桶叠加的偏移，使补齐的值与被借用桶的值不同
+_DENSIFY_OFFSET = 0x9E3779B1
+# 归一化时去掉的字符：空白、标点和符号
+_NON_WORD = re.compile(r'[\W_]+')
+# 句末标点：切分片段的固定边界
+_SENTENCE_END = re.compile(r'[。！？!?；;…]')
+# 没有句末标点的长句按内容切分：片段的最少、最多字符数（归一化后）
+_MIN_SEGMENT = 8
+_MAX_SEGMENT = 48
+# 内容边界：最近几个字符的哈希低位全为0处（中文平均每16个字符一个，英文平均每4个单词一个）
+_BOUNDARY_WINDOW = 4
+_BOUNDARY_MASK = 0xF
+_WORD_BOUNDARY_MASK = 0x3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    title TEXT,
+    url TEXT,
+    length INTEGER NOT NULL,
+    signature BLOB NOT NULL,
+    line_hashes BLOB NOT NULL,
+    summary BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (content_hash, model, prompt_version)
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    bucket INTEGER NOT NULL,
+    fingerprint_id INTEGER NOT NULL,
+    PRIMARY KEY (bucket, fingerprint_id)
+) WITHOUT ROWID;
+"""
+
+
+def normalize(text: str) -> str:
+    """归一化字幕文本：全角转半角、转小写，去掉空白和标点"""
+    return _NON_WORD.sub('', unicodedata.normalize('NFKC', text).lower())
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def _line_hash(line: str) -> int:
+    return zlib.crc32(line.encode('utf-8'))
+
+
+def split_segments(text: str) -> List[str]:
+    """
+    将字幕文本切分为用于比较新增内容的片段，大致对应一条或几条字幕
+    
+    预处理后的字幕中同一段落的多条字幕连接为一行，按行比较时一处改动会使整个段落被当作新增内容，
+    而且段落的划分本身会随字幕改动而移动。这里忽略换行，在句末标点处切分，过长（或没有标点）的句子
+    再在内容决定的边界处切分（最近几个字符的哈希满足条件处，英文只在单词末尾）：边界只取决于附近的内容，
+    插入或修改一条字幕只影响它所在和相邻的片段。
+    
+    Args:
+        text: 字幕文本
+    
+    Returns:
+        原文中的片段（保持顺序，换行替换为空格），不包含归一化后为空的部分
+    """
+    return [_clean(text[start:end]) for start, end in _segment_spans(text)]
+
+
+def _segment_spans(text: str) -> List[Tuple[int, int]]:
+    """split_segments 的各片段在原文中的起止位置，相邻片段首尾相接"""
+    spans = []
+    start, count, window = 0, 0, ''
+    for i, ch in enumerate(text):
+        chars = _normalize_char(ch)
+        if chars:
+            count += len(chars)
+            window = (window + chars)[-_BOUNDARY_WINDOW:]
+        if _SENTENCE_END.match(ch):
+            boundary = count > 0
+        elif not chars or count < _MIN_SEGMENT:
+            boundary = False
+        elif ch.isascii():
+            # 英文只在单词末尾切分，约每4个单词一个边界
+            at_word_end = i + 1 == len(text) or not (text[i + 1].isascii() and text[i + 1].isalnum())
+            boundary = at_word_end and (count >= _MAX_SEGMENT or not _window_hash(window) & _WORD_BOUNDARY_MASK)
+        else:
+            boundary = count >= _MAX_SEGMENT or not _window_hash(window) & _BOUNDARY_MASK
+        if boundary:
+            spans.append((start, i + 1))
+            start, count = i + 1, 0
+    if count:
+        spans.append((start, len(text)))
+    return spans
+
+
+def _clean(segment: str) -> str:
+    """片段中的换行和连续空白替换为一个空格"""
+    return ' '.join(segment.split())
+
+
+@functools.lru_cache(maxsize=8192)
+def _normalize_char(ch: str) -> str:
+    return normalize(ch)
+
+
+def _window_hash(window: str) -> int:
+    return zlib.crc32(window.encode('utf-8'))
+
+
+@dataclass
+class Fingerprint:
+    """一段字幕的指纹"""
+    signature: array
+    # 各片段（见 split_segments）归一化后的哈希
+    line_hashes: array
+    content_hash: str
+    length: int
+    
+    def similarity(self, other: 'Fingerprint') -> float:
+        return similarity(self.signature, other.signature)
+
+
+@dataclass
+class NearDuplicate:
+    """索引中与查询字幕最相似的已总结视频"""
+    fingerprint_id: int
+    similarity: float
+    title: Optional[str]
+    url: Optional[str]
+    summary: str
+    line_hashes: Set[int]
+    
+    @property
+    def source(self) -> str:
+        """用于日志的来源视频描述"""
+        return self.title or self.url or f"#{self.fingerprint_id}"
+    
+    def record(self, metrics, action: str):
+        """在运行指标（可选）中记录处理方式（reuse / diff）和来源视频"""
+        if metrics:
+            metrics.near_duplicate = action
+            metrics.near_duplicate_of = self.url or self.title
+            metrics.near_duplicate_similarity = round(self.similarity, 4)
+    
+    def note(self, action: str) -> str:
+        """
+        附加在总结末尾的来源说明，使保存的总结可以追溯到被复用的视频
+        
+        Args:
+            action: 处理方式（reuse / diff）
+        """
+        source = f"《{self.title}》" if self.title else "已总结视频"
+        if self.url:
+            source += f"（{self.url}）"
+        if action == "reuse":
+            text = f"本总结复用了字幕相似度 {self.similarity:.2f} 的视频{source}的总结"
+        else:
+            text = f"本总结在字幕相似度 {self.similarity:.2f} 的视频{source}的总结基础上补充了新增内容"
+        return f"\n\n> {text}\n"
+    
+    def added_lines(self, subtitle_text: str) -> List[str]:
+        """
+        新字幕中已总结视频没有的内容（按片段比较，见 split_segments），保持原顺序
+        
+        相邻的新增片段合并为一项，避免把一句新字幕拆成几行发给AI。
+        """
+        added: List[Tuple[int, int]] = []
+        for start, end in _segment_spans(subtitle_text):
+            if _line_hash(normalize(subtitle_text[start:end])) in self.line_hashes:
+                continue
+            if added and added[-1][1] == start:
+                added[-1] = (added[-1][0], end)
+            else:
+                added.append((start, end))
+        return [_clean(subtitle_text[start:end]) for start, end in added]
+
+
+def fingerprint(text: str, num_perm: int = 128, shingle_size: int = 5) -> Fingerprint:
+    """
+    计算字幕指纹
+    
+    Args:
+        text: 字幕文本
+        num_perm: 签名长度（桶数）
+        shingle_size: 每个shingle的字符数
+    
+    Returns:
+        字幕指纹；归一化后没有内容时签名全部为空桶
+    """
+    normalized = normalize(text)
+    shingles = {normalized[i:i + shingle_size] for i in range(max(1, len(normalized) - shingle_size + 1))}
+    shingles.discard('')
+    
+    bins = [_MAX_HASH] * num_perm
+    for shingle in shingles:
+        h = _hash64(shingle.encode('utf-8'))
+        index, value = h % num_perm, (h // num_perm) & _MAX_HASH
+        if value < bins[index]:
+            bins[index] = value
+    
+    # 补齐空桶：使用右侧（循环）最近的非空桶的值，两段字幕的补齐方式相同因此仍可比较
+    filled = [i for i, value in enumerate(bins) if value != _MAX_HASH]
+    if filled and len(filled) < num_perm:
+        original = list(bins)
+        for i in range(num_perm):
+            if original[i] != _MAX_HASH:
+                continue
+            distance = 1
+            while original[(i + distance) % num_perm] == _MAX_HASH:
+                distance += 1
+            bins[i] = (original[(i + distance) % num_perm] + distance * _DENSIFY_OFFSET) % _MAX_HASH
+    
+    line_hashes = sorted({_line_hash(normalize(segment)) for segment in split_segments(text)})
+    return Fingerprint(
+        signature=array('I', bins),
+        line_hashes=array('I', line_hashes),
+        content_hash=hashlib.sha256(normalized.encode('utf-8')).hexdigest(),
+        length=len(normalized),
+    )
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """由两个签名估算字幕的Jaccard相似度（相同位置取值相等的比例）"""
+    if len(a) != len(b) or not a:
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+class FingerprintIndex:
+    """
+    字幕指纹索引（SQLite）
+    
+    每个指纹保存签名、各片段的哈希（用于找出新增的内容）和压缩后的总结。
+    索引的签名参数写入meta表，参数与当前配置不一致时已有的签名无法比较，拒绝打开。
+    连接在线程间共享，所有操作在锁内执行。
+    
+    模式与总结缓存相同:
+        on: 查询并写入指纹
+        refresh: 不查询，只写入（重新生成的总结覆盖索引中的总结）
+        readonly: 只查询，不写入
+    """
+    
+    def __init__(
+        self,
+        db_path: Path,
+        mode: str = "on",
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 5,
+    ):
+        """
+        Args:
+            db_path: SQLite数据库文件路径，不存在时自动创建
+            mode: 索引模式（on/refresh/readonly）
+            num_perm: 签名长度
+            bands: LSH分段数，必须整除签名长度；分段越多，相似度较低的视频越容易成为候选
+            shingle_size: 每个shingle的字符数
+        """
+        if mode not in CACHE_MODES or mode == "off":
+            raise ValueError(f"未知近似重复检测模式: {mode}，可选: {', '.join(CACHE_MODES)}")
+        if bands <= 0 or num_perm % bands:
+            raise ValueError(f"LSH分段数 {bands} 必须整除签名长度 {num_perm}")
+        self.mode = mode
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 索引丢失最近几条指纹只会让对应视频重新总结，每次写入不必等待同步到磁盘
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._check_params()
+    
+    @classmethod
+    def from_settings(cls, mode: Optional[str] = None) -> 'FingerprintIndex':
+        """按Settings中的配置打开索引"""
+        return cls(
+            Settings.NEAR_DUP_DB,
+            mode=mode or Settings.NEAR_DUP_MODE,
+            num_perm=Settings.NEAR_DUP_NUM_PERM,
+            bands=Settings.NEAR_DUP_BANDS,
+            shingle_size=Settings.NEAR_DUP_SHINGLE_SIZE,
+        )
+    
+    @property
+    def readable(self) -> bool:
+        """是否查询索引"""
+        return self.mode in ("on", "readonly")
+    
+    @property
+    def writable(self) -> bool:
+        """是否写入索引"""
+        return self.mode in ("on", "refresh")
+    
+    def _check_params(self):
+        params = {'num_perm': str(self.num_perm), 'bands': str(self.bands), 'shingle_size': str(self.shingle_size)}
+        with self._lock, self._conn:
+            stored = {row['key']: row['value'] for row in self._conn.execute("SELECT key, value FROM meta")}
+            if not stored:
+                self._conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", params.items())
+                return
+        if stored != params:
+            raise ValueError(
+                f"指纹索引 {self.db_path} 的参数 {stored} 与当前配置 {params} 不一致，"
+                "请恢复原配置或删除该索引文件"
+            )
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    def fingerprint(self, text: str) -> Fingerprint:
+        """按索引的参数计算字幕指纹"""
+        return fingerprint(text, self.num_perm, self.shingle_size)
+    
+    def _buckets(self, signature: Sequence[int]) -> List[int]:
+        """签名每一段的哈希（带段序号），作为LSH桶的键"""
+        buckets = []
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            data = struct.pack(f'<I{self.rows}I', band, *values)
+            buckets.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little', signed=True))
+        return buckets
+    
+    def find(self, fp: Fingerprint, model: str, prompt_version: str, min_similarity: float) -> Optional[NearDuplicate]:
+        """
+        查找使用同一模型和提示词版本总结过的最相似视频
+        
+        Args:
+            fp: 新视频字幕的指纹
+            model: 模型名称
+            prompt_version: 提示词模板版本
+            min_similarity: 最低相似度
+        
+        Returns:
+            相似度最高且不低于 min_similarity 的视频，没有时（或索引不可读）返回None
+        """
+        if not self.readable:
+            return None
+        buckets = self._buckets(fp.signature)
+        with self._lock:
+            # 完全相同的字幕（归一化后）直接按内容哈希命中
+            row = self._conn.execute(
+                "SELECT id FROM fingerprints WHERE content_hash = ? AND model = ? AND prompt_version = ?",
+                (fp.content_hash, model, prompt_version),
+            ).fetchone()
+            if row:
+                best_id, best = row['id'], 1.0
+            else:
+                rows = self._conn.execute(
+                    f"""
+                    SELECT DISTINCT f.id, f.signature FROM lsh_buckets b JOIN fingerprints f ON f.id = b.fingerprint_id
+                    WHERE b.bucket IN ({','.join('?' * len(buckets))}) AND f.model = ? AND f.prompt_version = ?
+                    """,
+                    (*buckets, model, prompt_version),
+                ).fetchall()
+                best_id, best = None, 0.0
+                for row in rows:
+                    score = similarity(fp.signature, array('I', row['signature']))
+                    if score > best:
+                        best_id, best = row['id'], score
+                if best_id is None or best < min_similarity:
+                    return None
+            row = self._conn.execute(
+                "SELECT id, title, url, line_hashes, summary FROM fingerprints WHERE id = ?", (best_id,)
+            ).fetchone()
+        return NearDuplicate(
+            fingerprint_id=row['id'],
+            similarity=best,
+            title=row['title'],
+            url=row['url'],
+            summary=zlib.decompress(row['summary']).decode('utf-8'),
+            line_hashes=set(array('I', row['line_hashes'])),
+        )
+    
+    def add(
+        self,
+        fp: Fingerprint,
+        summary: str,
+        model: str,
+        prompt_version: str,
+        title: Optional[str] = None,
+        url: Optional[str] = None,
+    ) -> Optional[int]:
+        """
+        写入一个已总结视频的指纹；同一字幕和模型已存在时只更新总结，保留最早的来源视频
+        
+        Args:
+            fp: 字幕指纹
+            summary: 总结内容
+            model: 生成总结使用的模型
+            prompt_version: 提示词模板版本
+            title: 视频标题
+            url: 视频URL
+        
+        Returns:
+            指纹ID，索引不可写时返回None
+        """
+        if not self.writable:
+            return None
+        compressed = zlib.compress(summary.encode('utf-8'))
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id FROM fingerprints WHERE content_hash = ? AND model = ? AND prompt_version = ?",
+                (fp.content_hash, model, prompt_version),
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    """
+                    UPDATE fingerprints SET summary = ?, created_at = ? WHERE id = ?
+                    """,
+                    (compressed, now, row['id']),
+                )
+                return row['id']
+            cursor = self._conn.execute(
+                """
+                INSERT INTO fingerprints (content_hash, model, prompt_version, title, url, length,
+                                          signature, line_hashes, summary, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (fp.content_hash, model, prompt_version, title, url, fp.length,
+                 fp.signature.tobytes(), fp.line_hashes.tobytes(), compressed, now),
+            )
+            fingerprint_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO lsh_buckets (bucket, fingerprint_id) VALUES (?, ?)",
+                [(bucket, fingerprint_id) for bucket in self._buckets(fp.signature)],
+            )
+        return fingerprint_id
+    
+    def stats(self) -> dict:
+        """索引中的指纹数和各模型的指纹数"""
+        with self._lock:
+            rows = self._conn.execute("SELECT model, COUNT(*) AS n FROM fingerprints GROUP BY model").fetchall()
+        models = {row['model']: row['n'] for row in rows}
+        return {'fingerprints': sum(models.values()), 'models': models}
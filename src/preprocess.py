@@ -0,0 +1,231 @@
+"""字幕预处理：在调用AI之前合并碎片化字幕、去除重复和语气词，减少提示词token数"""
+import re
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import List, Optional
+from config.settings import Settings
+from utils.logger import setup_logger
+from utils.tokens import estimate_tokens
+from src.subtitle_parser import Cue, cues_to_text
+
+logger = setup_logger()
+
+# 单独成句时没有信息量的语气词
+_FILLER_CHARS = set('嗯啊呃额哦噢唉诶哈呀嘛')
+_FILLER_WORDS = {'uh', 'um', 'uhm', 'er', 'ah', 'hmm', 'oh', 'mm'}
+# 判断语气词时忽略的标点和空白
+_PUNCT = re.compile(r'[\s,.!?;:，。！？；：、…~～\-—]+')
+# 相邻两条字幕开头与结尾的重复部分至少包含的字符数，更短的重复可能只是常用词
+_MIN_OVERLAP = 4
+
+
+@dataclass
+class PreprocessResult:
+    """预处理结果"""
+    text: str
+    cues_before: int
+    cues_after: int
+    tokens_before: int
+    tokens_after: int
+    
+    @property
+    def reduction(self) -> float:
+        """估算token数的减少比例（0~1）"""
+        if not self.tokens_before:
+            return 0.0
+        return 1 - self.tokens_after / self.tokens_before
+
+
+def _is_filler(text: str) -> bool:
+    """整条字幕是否只包含语气词"""
+    stripped = _PUNCT.sub('', text.lower())
+    if not stripped:
+        return True
+    if all(ch in _FILLER_CHARS for ch in stripped):
+        return True
+    words = [w for w in _PUNCT.split(text.lower()) if w]
+    return bool(words) and all(w in _FILLER_WORDS for w in words)
+
+
+def _normalize(text: str) -> str:
+    """比较重复时忽略的差异：大小写、标点和空白"""
+    return _PUNCT.sub('', text.lower())
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+def _strip_overlap(prev: str, text: str) -> str:
+    """
+    去掉 text 开头与 prev 结尾重复的部分
+    
+    滚动字幕（以及搬运时从YouTube自动字幕转换的字幕）每一条会重复上一条的最后一行或最后几个词，
+    字幕识别也常在相邻两条的边界重复几个字。重复部分至少 _MIN_OVERLAP 个字符，且不能切断英文单词。
+    """
+    for size in range(min(len(prev), len(text)), _MIN_OVERLAP - 1, -1):
+        if not prev.endswith(text[:size]):
+            continue
+        if size < len(text) and _is_word_char(text[size - 1]) and _is_word_char(text[size]):
+            continue
+        if size < len(prev) and _is_word_char(prev[-size - 1]) and _is_word_char(prev[-size]):
+            continue
+        return text[size:].lstrip()
+    return text
+
+
+def dedupe_cues(cues: List[Cue], similarity: float) -> List[Cue]:
+    """
+    去除语气词字幕以及与上一条重复的字幕
+    
+    - 与上一条相同（忽略标点和空白）、是上一条的一部分或高度相似时合并到上一条
+    - 滚动字幕中后一条是前一条的延续（前一条是后一条的前缀）时只保留较长的一条
+    - 后一条开头重复了前一条的结尾（多行滚动字幕、识别边界重复）时去掉重复部分
+    
+    Args:
+        cues: 字幕条目
+        similarity: 相似度阈值（0~1），达到该值视为重复
+    
+    Returns:
+        去重后的字幕条目（新的Cue对象，不修改输入）
+    """
+    result: List[Cue] = []
+    prev_lines: List[str] = []
+    for cue in cues:
+        lines = [line.strip() for line in cue.text.splitlines() if line.strip()]
+        # 多行滚动字幕：开头几行与上一条的最后几行相同时去掉这几行
+        repeated = next(
+            (k for k in range(min(len(lines) - 1, len(prev_lines)), 0, -1) if lines[:k] == prev_lines[-k:]), 0
+        )
+        prev_lines = lines
+        text = _join(lines[repeated:])
+        if not text or _is_filler(text):
+            continue
+        if result:
+            prev = result[-1]
+            norm, prev_norm = _normalize(text), _normalize(prev.text)
+            if norm == prev_norm or (len(norm) >= _MIN_OVERLAP and norm in prev_norm):
+                prev.end = max(prev.end, cue.end)
+                continue
+            if prev_norm and norm.startswith(prev_norm):
+                prev.text = text
+                prev.end = max(prev.end, cue.end)
+                continue
+            matcher = SequenceMatcher(None, prev_norm, norm, autojunk=False)
+            if matcher.real_quick_ratio() >= similarity and matcher.ratio() >= similarity:
+                if len(text) > len(prev.text):
+                    prev.text = text
+                prev.end = max(prev.end, cue.end)
+                continue
+            text = _strip_overlap(prev.text, text)
+            if not _normalize(text):
+                prev.end = max(prev.end, cue.end)
+                continue
+        result.append(Cue(cue.start, cue.end, text))
+    return result
+
+
+def _separator(left: str, right: str) -> str:
+    """段落内两个碎片之间的分隔：英文单词之间用空格，中文等不用空格分词的文字直接连接"""
+    if _is_word_char(left[-1:]) and _is_word_char(right[:1]):
+        return ' '
+    if left[-1:] in ',.!?;:' and right[:1].isascii():
+        return ' '
+    return ''
+
+
+def _join(fragments: List[str]) -> str:
+    text = ''
+    for fragment in fragments:
+        text = text + _separator(text, fragment) + fragment if text else fragment
+    return text
+
+
+def merge_cues(cues: List[Cue], max_gap: float, max_chars: int) -> List[str]:
+    """
+    将相邻的字幕碎片合并为段落
+    
+    两条字幕之间的停顿超过 max_gap 秒，或者段落长度达到 max_chars 个字符时开始新段落；
+    段落内的英文碎片以空格连接，中文碎片直接连接。
+    
+    Args:
+        cues: 字幕条目
+        max_gap: 段落内允许的最大停顿（秒）
+        max_chars: 段落的最大字符数
+    
+    Returns:
+        段落列表
+    """
+    paragraphs: List[str] = []
+    current: List[str] = []
+    length = 0
+    prev_end: Optional[float] = None
+    
+    for cue in cues:
+        gap = cue.start - prev_end if prev_end is not None else 0.0
+        if current and (gap > max_gap or length >= max_chars):
+            paragraphs.append(_join(current))
+            current, length = [], 0
+        current.append(cue.text)
+        length += len(cue.text)
+        prev_end = cue.end
+    
+    if current:
+        paragraphs.append(_join(current))
+    return paragraphs
+
+
+def preprocess_cues(
+    cues: List[Cue],
+    similarity: Optional[float] = None,
+    max_gap: Optional[float] = None,
+    max_chars: Optional[int] = None,
+) -> PreprocessResult:
+    """
+    预处理字幕：去重、去除语气词、合并碎片为段落
+    
+    Args:
+        cues: 解析得到的字幕条目
+        similarity: 去重的相似度阈值，默认使用Settings中的配置
+        max_gap: 段落内允许的最大停顿（秒），默认使用Settings中的配置
+        max_chars: 段落的最大字符数，默认使用Settings中的配置
+    
+    Returns:
+        预处理结果，包含处理后的文本和处理前后的估算token数
+    """
+    similarity = similarity if similarity is not None else Settings.PREPROCESS_DEDUP_SIMILARITY
+    max_gap = max_gap if max_gap is not None else Settings.PREPROCESS_PARAGRAPH_GAP
+    max_chars = max_chars or Settings.PREPROCESS_PARAGRAPH_CHARS
+    
+    deduped = dedupe_cues(cues, similarity)
+    text = '\n'.join(merge_cues(deduped, max_gap, max_chars))
+    
+    result = PreprocessResult(
+        text=text,
+        cues_before=len(cues),
+        cues_after=len(deduped),
+        tokens_before=estimate_tokens(cues_to_text(cues)),
+        tokens_after=estimate_tokens(text),
+    )
+    logger.info(
+        f"字幕预处理: {result.cues_before} 条 → {result.cues_after} 条，"
+        f"估算token {result.tokens_before} → {result.tokens_after}（减少 {result.reduction:.1%}）"
+    )
+    return result
+
+
+def prepare_subtitle_text(cues: List[Cue], text: str) -> str:
+    """
+    得到用于提示词的字幕文本：开启预处理时返回预处理结果，否则原样返回
+    
+    Args:
+        cues: 字幕条目
+        text: 未经预处理的纯文本字幕
+    
+    Returns:
+        用于总结的字幕文本
+    """
+    if not Settings.PREPROCESS_SUBTITLES or not cues:
+        return text
+    result = preprocess_cues(cues)
+    return result.text or text
@@ -0,0 +1,329 @@
+"""
+性能分析（--profile）：分阶段记录CPU耗时、调用栈采样和内存分配
+
+启用后，RunMetrics.timer 计时的每个阶段（extract_info、subtitle_fetch、parse、preprocess、fingerprint、llm、save）同时:
+    - 使用cProfile记录该阶段在当前线程中的函数调用（每个阶段一个 .pstats 文件，可用 snakeviz 等工具查看）
+    - 由采样线程定期记录执行该阶段的线程的调用栈，输出火焰图工具可直接使用的折叠栈（stacks.collapsed，
+      按墙钟时间采样，包括等待网络和磁盘的时间）
+    - 使用tracemalloc比较阶段前后的内存快照，记录新增内存最多的代码行（tracemalloc开启时所有内存分配
+      都会变慢，因此只在每个阶段的前几次执行期间开启）
+
+每个视频的结果与 metrics.json 一起写入输出子目录的 profile/ 中，整个运行的汇总写入输出目录的
+profile_<时间戳>/ 中。阶段内提交到其他线程的工作（分块总结、对冲请求）只记录为等待时间。
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+from config.settings import Settings
+from utils.logger import setup_logger
+
+logger = setup_logger()
+
+PROFILE_DIRNAME = "profile"
+STACKS_FILENAME = "stacks.collapsed"
+ALLOCATIONS_FILENAME = "allocations.txt"
+SUMMARY_FILENAME = "summary.txt"
+
+# 分析器自身分配内存的文件，不计入阶段的内存分配
+_PROFILER_FILES = {os.path.basename(m.__file__) for m in (tracemalloc, cProfile, pstats)} | {os.path.basename(__file__)}
+
+_active: Optional['Profiler'] = None
+_local = threading.local()
+
+
+def _frame_name(code) -> str:
+    """折叠栈中的一帧：函数名（文件:行号），项目内文件使用相对路径，第三方库只保留包内路径"""
+    filename = code.co_filename
+    if filename.startswith(str(Settings.BASE_DIR)):
+        filename = os.path.relpath(filename, Settings.BASE_DIR)
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages', 1)[1].lstrip('/\\')
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ',')
+
+
+class StageProfile:
+    """一个视频（或整个运行汇总）的分阶段分析结果，各线程的结果在锁内合并"""
+    
+    def __init__(self):
+        self.stats: Dict[str, pstats.Stats] = {}
+        self.stacks: Counter = Counter()
+        self.allocations: Dict[str, Dict[str, list]] = {}
+        self.executions: Counter = Counter()
+        self._lock = threading.Lock()
+    
+    def add_profile(self, stage: str, profile: cProfile.Profile):
+        with self._lock:
+            self.executions[stage] += 1
+            if stage in self.stats:
+                self.stats[stage].add(profile)
+            else:
+                self.stats[stage] = pstats.Stats(profile)
+    
+    def add_sample(self, stack: str):
+        with self._lock:
+            self.stacks[stack] += 1
+    
+    def add_allocations(self, stage: str, sites: Dict[str, tuple]):
+        """累加一次阶段执行中新增内存的代码行：位置 -> (新增字节数, 新增内存块数)"""
+        with self._lock:
+            totals = self.allocations.setdefault(stage, {})
+            for site, (size, count) in sites.items():
+                entry = totals.setdefault(site, [0, 0])
+                entry[0] += size
+                entry[1] += count
+    
+    def write(self, directory: Path, top: Optional[int] = None) -> Optional[Path]:
+        """
+        写出分析结果
+        
+        Args:
+            directory: 输出目录（不存在时创建）
+            top: 摘要中每个阶段列出的函数数和内存分配位置数，默认使用Settings中的配置
+        
+        Returns:
+            输出目录，没有分析数据或写入失败时返回None
+        """
+        top = top or Settings.PROFILE_TOP
+        with self._lock:
+            if not self.executions:
+                return None
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+                for stage, stats in self.stats.items():
+                    stats.dump_stats(str(directory / f"{stage}.pstats"))
+                with open(directory / STACKS_FILENAME, 'w', encoding='utf-8') as f:
+                    for stack, count in sorted(self.stacks.items()):
+                        f.write(f"{stack} {count}\n")
+                allocations = self._allocations_report(top)
+                (directory / ALLOCATIONS_FILENAME).write_text(allocations, encoding='utf-8')
+                (directory / SUMMARY_FILENAME).write_text(self._summary(top) + "\n" + allocations, encoding='utf-8')
+            except OSError as e:
+                logger.warning("写入性能分析结果失败: %s", e)
+                return None
+        return directory
+    
+    def _summary(self, top: int) -> str:
+        """各阶段按累计耗时排序的前top个函数（在锁内调用）"""
+        out = io.StringIO()
+        for stage, stats in self.stats.items():
+            samples = sum(c for s, c in self.stacks.items() if s.split(';', 1)[0] == stage)
+            out.write(f"===== {stage}：执行 {self.executions[stage]} 次，调用栈采样 {samples} 次 =====\n")
+            stats.stream = out
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+        return out.getvalue()
+    
+    def _allocations_report(self, top: int) -> str:
+        """各阶段新增内存最多的代码行（在锁内调用）"""
+        lines = []
+        for stage, sites in self.allocations.items():
+            lines.append(f"===== {stage}：新增内存最多的 {min(top, len(sites))} 个位置 =====")
+            for site, (size, count) in sorted(sites.items(), key=lambda item: -item[1][0])[:top]:
+                lines.append(f"{size / 1024:>12.1f} KiB  {count:>8} 块  {site}")
+            lines.append("")
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """
+    整个运行的性能分析器
+    
+    同一时间只有一个活动的分析器（见 enable），所有线程的阶段计时都使用它。
+    """
+    
+    def __init__(
+        self,
+        sample_interval: Optional[float] = None,
+        allocation_samples: Optional[int] = None,
+        top: Optional[int] = None,
+    ):
+        """
+        Args:
+            sample_interval: 调用栈采样间隔（秒），默认使用Settings中的配置
+            allocation_samples: 每个阶段做内存快照比较的执行次数，0为不记录内存分配
+            top: 摘要中每个阶段列出的函数数和内存分配位置数
+        """
+        self.sample_interval = sample_interval if sample_interval is not None else Settings.PROFILE_SAMPLE_INTERVAL
+        self.allocation_samples = (
+            allocation_samples if allocation_samples is not None else Settings.PROFILE_ALLOCATION_SAMPLES
+        )
+        self.top = top if top is not None else Settings.PROFILE_TOP
+        self.total = StageProfile()
+        self.started_at = datetime.now()
+        # 线程ID -> (视频的分析结果, 阶段)，采样线程据此记录正在执行阶段的线程
+        self._threads: Dict[int, tuple] = {}
+        self._allocation_runs: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        # 正在记录内存分配的阶段数：只在这些阶段执行期间开启tracemalloc（开启时所有内存分配都会变慢）
+        self._tracing = 0
+        self.peak_memory = 0
+    
+    def start(self) -> 'Profiler':
+        if tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc已在运行（例如设置了PYTHONTRACEMALLOC），无法按阶段记录内存分配")
+        self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+        self._sampler.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+    
+    def profile_for(self, owner) -> StageProfile:
+        """owner（通常是RunMetrics）的分析结果，保存在其 profile 属性中"""
+        with self._lock:
+            if getattr(owner, 'profile', None) is None:
+                owner.profile = StageProfile()
+            return owner.profile
+    
+    @contextmanager
+    def stage(self, owner, stage: str) -> Iterator[None]:
+        """分析当前线程中的一个阶段"""
+        video = self.profile_for(owner)
+        before = self._begin_tracing(stage)
+        
+        thread_id = threading.get_ident()
+        profile = cProfile.Profile()
+        with self._lock:
+            self._threads[thread_id] = (video, stage)
+        _local.stage = stage
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            _local.stage = None
+            with self._lock:
+                self._threads.pop(thread_id, None)
+            video.add_profile(stage, profile)
+            self.total.add_profile(stage, profile)
+            if before is not None:
+                sites = self._allocation_sites(before, self._end_tracing())
+                video.add_allocations(stage, sites)
+                self.total.add_allocations(stage, sites)
+    
+    def write_total(self, output_dir: Optional[Path] = None) -> Optional[Path]:
+        """将整个运行的汇总写入输出目录的 profile_<时间戳>/ 中"""
+        output_dir = output_dir or Settings.OUTPUT_DIR
+        directory = self.total.write(output_dir / f"profile_{self.started_at.strftime('%Y%m%d_%H%M%S')}", self.top)
+        if directory:
+            peak = f"，记录内存分配期间的峰值 {self.peak_memory / 1024 / 1024:.1f} MiB" if self.peak_memory else ""
+            logger.info(f"性能分析汇总已写入: {directory}（{sum(self.total.executions.values())} 次阶段执行{peak}）")
+        return directory
+    
+    def _begin_tracing(self, stage: str) -> Optional[tracemalloc.Snapshot]:
+        """
+        该阶段还需要记录内存分配时开启tracemalloc（已开启时沿用）并返回阶段开始时的快照，否则返回None
+        
+        tracemalloc只记录开启之后的分配，快照很小，比较的开销也很低；并发执行的其他阶段的分配会混入差异中。
+        """
+        with self._lock:
+            if self._allocation_runs[stage] >= self.allocation_samples:
+                return None
+            self._allocation_runs[stage] += 1
+            if not self._tracing:
+                tracemalloc.start()
+            self._tracing += 1
+            return tracemalloc.take_snapshot()
+    
+    def _end_tracing(self) -> tracemalloc.Snapshot:
+        """返回阶段结束时的快照，没有其他阶段在记录时关闭tracemalloc"""
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot()
+            self._tracing -= 1
+            if not self._tracing:
+                self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            return snapshot
+    
+    def _allocation_sites(self, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> Dict[str, tuple]:
+        """两次快照之间新增内存最多的代码行"""
+        sites = {}
+        for diff in after.compare_to(before, 'lineno'):
+            frame = diff.traceback[0]
+            # 忽略分析本身的分配（快照、其他线程中的cProfile和pstats）
+            if diff.size_diff <= 0 or os.path.basename(frame.filename) in _PROFILER_FILES:
+                continue
+            sites[f"{frame.filename}:{frame.lineno}"] = (diff.size_diff, diff.count_diff)
+            if len(sites) >= self.top:
+                break
+        return sites
+    
+    def _sample_loop(self):
+        """定期记录正在执行阶段的线程的调用栈"""
+        while not self._stop.wait(self.sample_interval):
+            with self._lock:
+                threads = dict(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for thread_id, (video, stage) in threads.items():
+                frame = frames.get(thread_id)
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack = ";".join([stage] + names[::-1])
+                video.add_sample(stack)
+                self.total.add_sample(stack)
+
+
+def enable(**kwargs) -> Profiler:
+    """启用性能分析，之后所有阶段计时都会被分析；参数见 Profiler"""
+    global _active
+    _active = Profiler(**kwargs).start()
+    logger.info("已启用性能分析（cProfile、调用栈采样、tracemalloc），处理速度会变慢")
+    return _active
+
+
+def disable() -> Optional[Profiler]:
+    """停用性能分析并返回之前的分析器"""
+    global _active
+    profiler, _active = _active, None
+    if profiler:
+        profiler.stop()
+    return profiler
+
+
+def active() -> Optional[Profiler]:
+    return _active
+
+
+@contextmanager
+def session(enabled: bool = True) -> Iterator[Optional[Profiler]]:
+    """在一次运行期间启用性能分析，结束时停用并写出整个运行的汇总；enabled为False时什么也不做"""
+    if not enabled:
+        yield None
+        return
+    profiler = enable()
+    try:
+        yield profiler
+    finally:
+        disable()
+        profiler.write_total()
+
+
+@contextmanager
+def stage(owner, name: str) -> Iterator[None]:
+    """
+    在启用了性能分析时分析一个阶段，否则什么也不做
+    
+    同一线程中嵌套的阶段计入外层阶段（cProfile在同一线程中只能有一个活动的分析器）。
+    """
+    profiler = _active
+    if profiler is None or getattr(_local, 'stage', None):
+        yield
+        return
+    with profiler.stage(owner, name):
+        yield
@@ -0,0 +1,161 @@
+"""
+对磁盘上已有的字幕文件重新总结
+
+整个过程不会导入yt-dlp，适合换模型后批量重新生成总结。
+"""
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional
+from config.settings import Settings
+from utils.logger import setup_logger
+from src.batch import BatchResult
+from src.downloader import PREFERRED_LANGS
+from src.metrics import METRICS_FILENAME, RunMetrics
+from src.preprocess import prepare_subtitle_text
+from src.subtitle_parser import SUPPORTED_FORMATS, cues_to_text, parse_subtitle_file
+
+logger = setup_logger()
+
+# 字幕文件名中的语言后缀，例如 "视频标题.ai-zh.srt" 中的 ai-zh
+_LANG_SUFFIX = re.compile(r'\.(?:ai-)?[A-Za-z]{2,3}(?:-[A-Za-z0-9]{2,8})?$')
+
+
+def find_subtitle_files(root: Path) -> List[Path]:
+    """
+    查找目录（含子目录）中的字幕文件
+    
+    Args:
+        root: 目录
+    
+    Returns:
+        按路径排序的字幕文件列表
+    """
+    extensions = {f'.{fmt}' for fmt in SUPPORTED_FORMATS}
+    return sorted(
+        path for path in root.rglob('*')
+        if path.is_file() and path.suffix.lower() in extensions and path.name != METRICS_FILENAME
+    )
+
+
+def title_from_subtitle_file(subtitle_file: Path) -> str:
+    """
+    推断字幕文件对应的视频标题
+    
+    优先使用同目录 metrics.json 中记录的标题，否则从文件名中去掉扩展名和语言后缀。
+    """
+    metrics_file = subtitle_file.parent / METRICS_FILENAME
+    if metrics_file.is_file():
+        try:
+            title = json.loads(metrics_file.read_text(encoding='utf-8')).get('video_title')
+            if title:
+                return title
+        except (OSError, ValueError):
+            pass
+    return _LANG_SUFFIX.sub('', subtitle_file.stem) or subtitle_file.stem
+
+
+def subtitle_lang(subtitle_file: Path) -> Optional[str]:
+    """字幕文件名中的语言后缀，例如 "视频标题.ai-zh.srt" 返回 "ai-zh"，没有时返回None"""
+    match = _LANG_SUFFIX.search(subtitle_file.stem)
+    return match.group(0)[1:] if match else None
+
+
+def resummarize_file(
+    summarizer,
+    subtitle_file: Path,
+    save_func: Callable[[str, str, Path], Path],
+    video_title: Optional[str] = None,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> BatchResult:
+    """
+    解析字幕文件并重新生成总结，总结保存在字幕文件所在目录
+    
+    Args:
+        summarizer: AI总结器（AISummarizer）
+        subtitle_file: 字幕文件
+        save_func: 保存总结的函数，签名为 (summary, video_title, sub_dir) -> Path
+        video_title: 视频标题，默认根据字幕文件推断
+        on_token: 流式输出回调（可选）
+    
+    Returns:
+        处理结果，url字段为字幕文件路径
+    """
+    video_title = video_title or title_from_subtitle_file(subtitle_file)
+    metrics = RunMetrics(url=str(subtitle_file), video_title=video_title)
+    result = BatchResult(url=str(subtitle_file), video_title=video_title, metrics=metrics)
+    sub_dir = subtitle_file.parent
+    
+    try:
+        with metrics.timer('parse'):
+            cues = parse_subtitle_file(subtitle_file)
+        if not cues:
+            result.error = metrics.error = "字幕内容为空"
+            return result
+        with metrics.timer('preprocess'):
+            subtitle_text = prepare_subtitle_text(cues, cues_to_text(cues))
+        
+        summary = summarizer.summarize(subtitle_text, video_title, on_token=on_token, metrics=metrics)
+        if not summary:
+            result.error = metrics.error = "AI总结失败"
+            return result
+        with metrics.timer('save'):
+            result.output_file = save_func(summary, video_title or "summary", sub_dir)
+        result.success = metrics.success = True
+    except Exception as e:
+        result.error = metrics.error = f"重新总结出错: {str(e)}"
+    finally:
+        if Settings.WRITE_METRICS_FILE:
+            metrics.write_sidecar(sub_dir)
+    return result
+
+
+def resummarize_dir(
+    summarizer,
+    root: Path,
+    save_func: Callable[[str, str, Path], Path],
+    workers: Optional[int] = None,
+) -> List[BatchResult]:
+    """
+    对目录中的所有字幕文件并发重新总结
+    
+    同一子目录中有多个字幕文件（不同语言）时，只处理按语言优先级排在最前的一个。
+    
+    Args:
+        summarizer: AI总结器（AISummarizer）
+        root: 目录，通常是输出目录或其中的某个子目录
+        save_func: 保存总结的函数
+        workers: 并发数，默认使用批量模式的总结并发数
+    
+    Returns:
+        与字幕文件顺序一致的处理结果列表
+    """
+    files = _one_per_dir(find_subtitle_files(root))
+    workers = max(1, workers or Settings.BATCH_SUMMARIZE_WORKERS)
+    logger.info(f"找到 {len(files)} 个字幕文件，开始重新总结（并发数: {workers}）")
+    
+    def process(index: int) -> BatchResult:
+        result = resummarize_file(summarizer, files[index], save_func)
+        if result.success:
+            logger.info(f"[{index + 1}/{len(files)}] 总结已保存到: {result.output_file}")
+        else:
+            logger.error(f"[{index + 1}/{len(files)}] {files[index]}: {result.error}")
+        return result
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(process, range(len(files))))
+
+
+def _one_per_dir(files: List[Path]) -> List[Path]:
+    """每个目录只保留一个字幕文件：按字幕语言优先级选择，无法识别语言时取第一个"""
+    def rank(path: Path) -> int:
+        lang = path.suffixes[-2].lstrip('.') if len(path.suffixes) >= 2 else ''
+        return PREFERRED_LANGS.index(lang) if lang in PREFERRED_LANGS else len(PREFERRED_LANGS)
+    
+    chosen = {}
+    for path in files:
+        current = chosen.get(path.parent)
+        if current is None or rank(path) < rank(current):
+            chosen[path.parent] = path
+    return sorted(chosen.values())
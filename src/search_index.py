@@ -0,0 +1,445 @@
+"""
+总结和字幕的全文检索索引（SQLite FTS5）
+
+每次保存总结时更新索引，也可以对已有的输出目录重建索引。按BV号查询走普通索引，
+关键词查询走FTS5全文索引，都不需要遍历输出目录。
+
+FTS5使用trigram分词器，支持中文任意子串检索（每个关键词至少3个字符）；
+1~2个字符的关键词使用另一张按二元组（bigram）分词的FTS5表检索，同样走索引。
+只有包含标点或符号的短关键词（例如 "C#"）退化为LIKE匹配。
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from config.settings import Settings
+from utils.logger import setup_logger
+from src.metrics import METRICS_FILENAME
+from src.resummarize import find_subtitle_files, subtitle_lang, title_from_subtitle_file
+from src.subtitle_parser import cues_to_text, parse_subtitle_file
+
+if TYPE_CHECKING:
+    from src.downloader import SubtitleResult
+
+logger = setup_logger()
+
+# 文档类型
+SUMMARY = "summary"
+SUBTITLE = "subtitle"
+
+# trigram分词器的最短检索长度
+_MIN_TERM_CHARS = 3
+# 可以通过二元组表检索的短关键词（1~2个字母、数字或汉字）
+_BIGRAM_TERM = re.compile(r'[^\W_]{1,2}')
+# 二元组表的分词单位：连续的字母、数字或汉字
+_WORD_RUN = re.compile(r'[^\W_]+')
+# 摘要片段长度（字符）
+_SNIPPET_CHARS = 80
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    video_id TEXT,
+    title TEXT,
+    uploader TEXT,
+    lang TEXT,
+    model TEXT,
+    sub_dir TEXT,
+    mtime REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_video_id ON documents (video_id);
+"""
+
+
+@dataclass
+class SearchHit:
+    """一条检索结果"""
+    kind: str
+    path: Path
+    title: Optional[str] = None
+    video_id: Optional[str] = None
+    uploader: Optional[str] = None
+    lang: Optional[str] = None
+    model: Optional[str] = None
+    snippet: str = ""
+    
+    def to_dict(self) -> dict:
+        return {
+            'kind': self.kind,
+            'path': str(self.path),
+            'title': self.title,
+            'video_id': self.video_id,
+            'uploader': self.uploader,
+            'lang': self.lang,
+            'model': self.model,
+            'snippet': self.snippet,
+        }
+
+
+def bigram_text(text: str) -> str:
+    """
+    将文本转换为二元组表的内容：每段连续的字母、数字或汉字拆为相邻两个字符的二元组，并附加该段的最后一个字符
+    
+    这样任意2个字符的子串都是一个完整的词，任意单个字符都是某个词的开头，
+    分别可以用短语查询和前缀查询在索引中找到。
+    """
+    tokens = []
+    for run in _WORD_RUN.findall(text.lower()):
+        tokens += [run[i:i + 2] for i in range(len(run) - 1)]
+        tokens.append(run[-1])
+    return " ".join(tokens)
+
+
+def make_snippet(text: str, terms: List[str], width: int = _SNIPPET_CHARS) -> str:
+    """截取第一个关键词附近的片段，关键词用【】标出"""
+    text = re.sub(r'\s+', ' ', text)
+    lower = text.lower()
+    positions = [(lower.find(t.lower()), t) for t in terms]
+    positions = [(pos, t) for pos, t in positions if pos >= 0]
+    if not positions:
+        return text[:width] + ('…' if len(text) > width else '')
+    pos, term = min(positions)
+    start = max(0, pos - width // 2)
+    end = min(len(text), start + width)
+    snippet = text[start:end]
+    for t in terms:
+        snippet = re.sub(re.escape(t), lambda m: f"【{m.group(0)}】", snippet, flags=re.IGNORECASE)
+    return ('…' if start > 0 else '') + snippet + ('…' if end < len(text) else '')
+
+
+class SearchIndex:
+    """
+    全文检索索引
+    
+    文档以文件路径为键，重复写入同一路径时更新内容；元数据为空时保留已有的值。
+    连接在线程间共享，所有操作在锁内执行。
+    """
+    
+    def __init__(self, db_path: Path):
+        """
+        Args:
+            db_path: SQLite数据库文件路径，不存在时自动创建
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._create_fts()
+        self._lock = threading.Lock()
+    
+    def _create_fts(self):
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'documents_bigram'"
+        ).fetchone()
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents_bigram USING fts5(title, body, tokenize='unicode61')"
+        )
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(title, body, tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            # SQLite 3.34 之前没有trigram分词器，中文只能按整段匹配
+            logger.warning("当前SQLite不支持trigram分词器，中文关键词检索效果较差")
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(title, body)")
+        if not exists:
+            # 旧版本创建的索引没有二元组表，根据全文表补齐
+            with self._conn:
+                for row in self._conn.execute("SELECT rowid, title, body FROM documents_fts").fetchall():
+                    self._add_bigrams(row['rowid'], row['title'], row['body'])
+    
+    def _add_bigrams(self, doc_id: int, title: str, text: str):
+        self._conn.execute(
+            "INSERT INTO documents_bigram (rowid, title, body) VALUES (?, ?, ?)",
+            (doc_id, bigram_text(title), bigram_text(text)),
+        )
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    def add(
+        self,
+        kind: str,
+        path: Path,
+        text: str,
+        title: Optional[str] = None,
+        video_id: Optional[str] = None,
+        uploader: Optional[str] = None,
+        lang: Optional[str] = None,
+        model: Optional[str] = None,
+    ):
+        """
+        写入或更新一个文档
+        
+        Args:
+            kind: 文档类型（SUMMARY / SUBTITLE）
+            path: 文件路径
+            text: 全文
+            title: 视频标题
+            video_id: 视频ID（BV号）
+            uploader: UP主
+            lang: 字幕语言
+            model: 生成总结使用的模型
+        """
+        path = Path(path).resolve()
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            mtime = None
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT id FROM documents WHERE path = ?", (str(path),)).fetchone()
+            if row:
+                doc_id = row['id']
+                self._conn.execute(
+                    """
+                    UPDATE documents SET
+                        kind = ?,
+                        video_id = COALESCE(?, video_id),
+                        title = COALESCE(?, title),
+                        uploader = COALESCE(?, uploader),
+                        lang = COALESCE(?, lang),
+                        model = COALESCE(?, model),
+                        mtime = ?,
+                        indexed_at = ?
+                    WHERE id = ?
+                    """,
+                    (kind, video_id, title, uploader, lang, model, mtime, time.time(), doc_id),
+                )
+                self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+                self._conn.execute("DELETE FROM documents_bigram WHERE rowid = ?", (doc_id,))
+            else:
+                doc_id = self._conn.execute(
+                    """
+                    INSERT INTO documents (path, kind, video_id, title, uploader, lang, model, sub_dir, mtime, indexed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (str(path), kind, video_id, title, uploader, lang, model, str(path.parent), mtime, time.time()),
+                ).lastrowid
+            self._conn.execute(
+                "INSERT INTO documents_fts (rowid, title, body) VALUES (?, ?, ?)",
+                (doc_id, title or path.stem, text),
+            )
+            self._add_bigrams(doc_id, title or path.stem, text)
+    
+    def remove(self, paths: List[str]):
+        """从索引中删除文档"""
+        with self._lock, self._conn:
+            for path in paths:
+                row = self._conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+                if row:
+                    self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row['id'],))
+                    self._conn.execute("DELETE FROM documents_bigram WHERE rowid = ?", (row['id'],))
+                    self._conn.execute("DELETE FROM documents WHERE id = ?", (row['id'],))
+    
+    def search(
+        self,
+        query: str = "",
+        video_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[SearchHit]:
+        """
+        检索文档
+        
+        Args:
+            query: 关键词，多个关键词以空格分隔（同时包含），为空时只按其他条件过滤
+            video_id: 只返回该视频（BV号）的文档
+            kind: 只返回该类型的文档
+            limit: 最多返回的条数
+        
+        Returns:
+            检索结果；有关键词时按相关度排序，否则按索引时间倒序
+        """
+        terms = query.split()
+        match, bigram_match, like_terms = self._build_match(terms)
+        
+        sql = ["SELECT d.*, documents_fts.body AS body FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid WHERE 1 = 1"]
+        params: list = []
+        if match:
+            sql.append("AND documents_fts MATCH ?")
+            params.append(match)
+        if bigram_match:
+            sql.append("AND d.id IN (SELECT rowid FROM documents_bigram WHERE documents_bigram MATCH ?)")
+            params.append(bigram_match)
+        for term in like_terms:
+            sql.append("AND (documents_fts.title LIKE ? ESCAPE '\\' OR documents_fts.body LIKE ? ESCAPE '\\')")
+            pattern = '%' + re.sub(r'([%_\\])', r'\\\1', term) + '%'
+            params += [pattern, pattern]
+        if video_id:
+            sql.append("AND d.video_id = ?")
+            params.append(video_id)
+        if kind:
+            sql.append("AND d.kind = ?")
+            params.append(kind)
+        sql.append("ORDER BY documents_fts.rank" if match else "ORDER BY d.indexed_at DESC")
+        sql.append("LIMIT ?")
+        params.append(limit)
+        
+        with self._lock:
+            rows = self._conn.execute(" ".join(sql), params).fetchall()
+        return [
+            SearchHit(
+                kind=row['kind'],
+                path=Path(row['path']),
+                title=row['title'],
+                video_id=row['video_id'],
+                uploader=row['uploader'],
+                lang=row['lang'],
+                model=row['model'],
+                snippet=make_snippet(row['body'], terms),
+            )
+            for row in rows
+        ]
+    
+    @staticmethod
+    def _build_match(terms: List[str]) -> Tuple[Optional[str], Optional[str], List[str]]:
+        """
+        把关键词拆为全文表的FTS5短语查询、二元组表的查询（均以AND连接）和需要LIKE匹配的短关键词
+        
+        二元组表中2个字符的关键词是一个完整的词（短语查询），单个字符是词的开头（前缀查询）。
+        """
+        phrases = ['"' + t.replace('"', '""') + '"' for t in terms if len(t) >= _MIN_TERM_CHARS]
+        short = [t for t in terms if len(t) < _MIN_TERM_CHARS]
+        bigrams = [f'"{t.lower()}"' if len(t) == 2 else f'"{t.lower()}" *' for t in short if _BIGRAM_TERM.fullmatch(t)]
+        like = [t for t in short if not _BIGRAM_TERM.fullmatch(t)]
+        return (" AND ".join(phrases) or None), (" AND ".join(bigrams) or None), like
+    
+    def stats(self) -> Dict[str, int]:
+        """各类型的文档数量"""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, COUNT(*) AS n FROM documents GROUP BY kind").fetchall()
+        return {row['kind']: row['n'] for row in rows}
+    
+    def reindex(self, root: Path, prune: bool = True) -> Dict[str, int]:
+        """
+        扫描输出目录，索引其中的总结（.md）和字幕文件；修改时间未变的文件跳过
+        
+        Args:
+            root: 输出目录
+            prune: 是否删除索引中位于root下但已不存在的文件
+        
+        Returns:
+            统计：indexed（新写入或更新）、unchanged、removed
+        """
+        root = Path(root).resolve()
+        with self._lock:
+            known = {
+                row['path']: row['mtime']
+                for row in self._conn.execute("SELECT path, mtime FROM documents").fetchall()
+            }
+        counts = {'indexed': 0, 'unchanged': 0, 'removed': 0}
+        seen = set()
+        
+        def changed(path: Path) -> bool:
+            seen.add(str(path))
+            if known.get(str(path)) == path.stat().st_mtime:
+                counts['unchanged'] += 1
+                return False
+            counts['indexed'] += 1
+            return True
+        
+        for subtitle_file in find_subtitle_files(root):
+            if not changed(subtitle_file):
+                continue
+            try:
+                text = cues_to_text(parse_subtitle_file(subtitle_file))
+            except Exception as e:
+                logger.warning(f"字幕解析失败，跳过: {subtitle_file}: {str(e)}")
+                continue
+            self.add(
+                SUBTITLE, subtitle_file, text,
+                title=title_from_subtitle_file(subtitle_file),
+                video_id=dir_video_id(subtitle_file.parent),
+                lang=subtitle_lang(subtitle_file),
+            )
+        
+        for summary_file in sorted(root.rglob('*.md')):
+            if not changed(summary_file):
+                continue
+            summaries = list(summary_file.parent.glob('*.md'))
+            self.add(
+                SUMMARY, summary_file, summary_file.read_text(encoding='utf-8'),
+                title=summary_file.stem,
+                # 多P视频目录中有多个总结，metrics.json 中的视频ID无法对应到单个总结
+                video_id=dir_video_id(summary_file.parent) if len(summaries) == 1 else None,
+            )
+        
+        if prune:
+            stale = [p for p in known if p not in seen and root in Path(p).parents]
+            self.remove(stale)
+            counts['removed'] = len(stale)
+        return counts
+
+
+def dir_video_id(sub_dir: Path) -> Optional[str]:
+    """输出子目录中 metrics.json 记录的视频ID"""
+    metrics_file = sub_dir / METRICS_FILENAME
+    if not metrics_file.is_file():
+        return None
+    try:
+        return json.loads(metrics_file.read_text(encoding='utf-8')).get('video_id')
+    except (OSError, ValueError):
+        return None
+
+
+_default_index: Optional[SearchIndex] = None
+_default_lock = threading.Lock()
+
+
+def default_index() -> SearchIndex:
+    """进程内共享的索引（Settings.SEARCH_INDEX_DB），配置的路径变化时重新打开"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None or _default_index.db_path != Path(Settings.SEARCH_INDEX_DB):
+            _default_index = SearchIndex(Settings.SEARCH_INDEX_DB)
+        return _default_index
+
+
+def index_summary(
+    output_file: Path,
+    summary: str,
+    video_title: Optional[str] = None,
+    subtitle: Optional['SubtitleResult'] = None,
+    model: Optional[str] = None,
+):
+    """
+    保存总结后更新索引；提供字幕结果时同时索引已保存的字幕文件
+    
+    索引失败只记录警告，不影响总结的保存。
+    
+    Args:
+        output_file: 总结文件
+        summary: 总结内容
+        video_title: 视频标题
+        subtitle: 字幕获取结果（可选），提供BV号、UP主和字幕语言
+        model: 生成总结使用的模型，默认使用Settings中的配置
+    """
+    if not Settings.SEARCH_INDEX_ENABLED:
+        return
+    try:
+        index = default_index()
+        video_id = subtitle.video_id if subtitle else dir_video_id(output_file.parent)
+        uploader = subtitle.uploader if subtitle else None
+        lang = subtitle.lang if subtitle else None
+        index.add(
+            SUMMARY, output_file, summary,
+            title=video_title, video_id=video_id, uploader=uploader, lang=lang,
+            model=model or Settings.AI_MODEL,
+        )
+        if subtitle and subtitle.subtitle_file:
+            index.add(
+                SUBTITLE, subtitle.subtitle_file, subtitle.text,
+                title=subtitle.video_title, video_id=video_id, uploader=uploader, lang=lang,
+            )
+    except sqlite3.Error as e:
+        logger.warning(f"更新检索索引失败: {str(e)}")
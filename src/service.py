@@ -0,0 +1,348 @@
+"""
+服务模式：常驻进程通过HTTP接收总结任务
+
+工作线程复用同一个 SubtitleDownloader 和 AISummarizer（共享HTTP连接池、缓存和限流器），
+同一视频（BV号和分P）的并发请求会合并为一次处理。
+
+接口:
+    POST /jobs              提交任务，请求体 {"url": "..."}，返回任务信息（202）
+    GET  /jobs/<id>         查询任务状态
+    GET  /jobs/<id>/result  获取总结内容（Markdown），未完成时返回409；多P视频/合集返回合集文档
+    GET  /health            服务状态
+"""
+import json
+import queue
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+from config.settings import Settings
+from utils.logger import log_context, setup_logger
+from utils.video import video_key
+from src.collection import CollectionPipeline
+from src.downloader import PlaylistResult
+from src.metrics import RunMetrics
+from src.preprocess import prepare_subtitle_text
+
+logger = setup_logger()
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_JOB_PATH = re.compile(r'^/jobs/([0-9a-f]+)(/result)?$')
+
+
+@dataclass
+class Job:
+    """一个总结任务"""
+    id: str
+    url: str
+    key: str
+    status: str = QUEUED
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat(timespec='seconds'))
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    video_title: Optional[str] = None
+    output_file: Optional[Path] = None
+    error: Optional[str] = None
+    # 合并到该任务的请求数（包括第一次提交）
+    requests: int = 1
+    # 多P视频/合集的分P数，单个视频为None
+    parts: Optional[int] = None
+    metrics: Optional[RunMetrics] = None
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+    
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'url': self.url,
+            'key': self.key,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'video_title': self.video_title,
+            'output_file': str(self.output_file) if self.output_file else None,
+            'error': self.error,
+            'requests': self.requests,
+            'parts': self.parts,
+            'metrics': self.metrics.to_dict() if self.metrics and self.finished else None,
+        }
+
+
+class ServiceBusy(Exception):
+    """等待队列已满"""
+
+
+class SummaryService:
+    """
+    任务队列和工作线程池
+    
+    提交时如果同一视频已有排队中或处理中的任务，直接返回该任务而不是重新处理；
+    任务完成后再次提交会创建新任务（总结缓存命中时不会再次调用AI）。
+    """
+    
+    def __init__(
+        self,
+        downloader,
+        summarizer,
+        save_func: Callable[..., Path],
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        max_jobs: Optional[int] = None,
+    ):
+        """
+        Args:
+            downloader: 字幕下载器（SubtitleDownloader），所有工作线程共享
+            summarizer: AI总结器（AISummarizer），所有工作线程共享
+            save_func: 保存总结的函数，签名为 (summary, video_title, sub_dir, subtitle=None) -> Path
+            workers: 工作线程数，默认使用Settings中的配置
+            queue_size: 等待队列容量，默认使用Settings中的配置
+            max_jobs: 内存中保留的任务记录数，超出时丢弃最早完成的任务
+        """
+        self.downloader = downloader
+        self.summarizer = summarizer
+        self.save_func = save_func
+        self.workers = max(1, workers or Settings.SERVICE_WORKERS)
+        self.max_jobs = max(1, max_jobs or Settings.SERVICE_MAX_JOBS)
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size or Settings.SERVICE_QUEUE_SIZE))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._in_flight: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        # 实际执行的处理次数（合并的请求不计入）
+        self.executions = 0
+    
+    def start(self) -> 'SummaryService':
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"service-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"服务工作线程已启动: {self.workers}")
+        return self
+    
+    def stop(self, timeout: Optional[float] = None):
+        """通知工作线程在处理完当前任务后退出"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+    
+    def submit(self, url: str) -> Tuple[Job, bool]:
+        """
+        提交任务
+        
+        Args:
+            url: 视频URL
+        
+        Returns:
+            (任务, 是否合并到已有任务)
+        
+        Raises:
+            ServiceBusy: 等待队列已满
+        """
+        key = video_key(url)
+        with self._lock:
+            existing = self._in_flight.get(key)
+            if existing:
+                existing.requests += 1
+                return existing, True
+            
+            job = Job(id=uuid.uuid4().hex[:12], url=url, key=key)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise ServiceBusy("任务队列已满，请稍后重试")
+            self._in_flight[key] = job
+            self._jobs[job.id] = job
+            self._trim_jobs()
+        logger.info(f"新任务 {job.id}: {url}")
+        return job, False
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            stats = {
+                'workers': self.workers,
+                'queue_size': self._queue.qsize(),
+                'jobs': counts,
+                'executions': self.executions,
+            }
+        hedge = getattr(self.summarizer, 'hedge', None)
+        if hedge:
+            stats['hedging'] = hedge.stats()
+        cookie_pool = getattr(self.downloader, 'cookie_pool', None)
+        if cookie_pool:
+            stats['cookie_pool'] = cookie_pool.stats()
+        return stats
+    
+    def _trim_jobs(self):
+        """丢弃最早完成的任务记录（在锁内调用）"""
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished][:excess]:
+            del self._jobs[job_id]
+    
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            with self._lock:
+                job.status = RUNNING
+                job.started_at = datetime.now().isoformat(timespec='seconds')
+                self.executions += 1
+            try:
+                with log_context(job=job.id, video=job.key):
+                    self._process(job)
+            except Exception as e:
+                job.error = f"处理出错: {str(e)}"
+            with self._lock:
+                job.status = DONE if job.output_file and not job.error else FAILED
+                job.finished_at = datetime.now().isoformat(timespec='seconds')
+                self._in_flight.pop(job.key, None)
+            if job.status == DONE:
+                logger.info("任务 %s 完成: %s", job.id, job.output_file)
+            else:
+                logger.error("任务 %s 失败: %s", job.id, job.error)
+    
+    def _process(self, job: Job):
+        """执行下载、预处理、总结和保存，结果记录在job中"""
+        metrics = job.metrics = RunMetrics(url=job.url)
+        subtitle = self.downloader.fetch(job.url, metrics=metrics)
+        if isinstance(subtitle, PlaylistResult):
+            self._process_collection(job, subtitle, metrics)
+            return
+        if not subtitle:
+            job.error = metrics.error = "字幕下载失败"
+            return
+        job.video_title = subtitle.video_title
+        with metrics.timer('preprocess'):
+            subtitle_text = prepare_subtitle_text(subtitle.cues, subtitle.text)
+        
+        summary = self.summarizer.summarize(subtitle_text, subtitle.video_title or "", metrics=metrics)
+        if summary:
+            with metrics.timer('save'):
+                job.output_file = self.save_func(
+                    summary, subtitle.video_title or "summary", subtitle.sub_dir, subtitle=subtitle
+                )
+            metrics.success = True
+        else:
+            job.error = metrics.error = "AI总结失败"
+        if Settings.WRITE_METRICS_FILE:
+            metrics.write_sidecar(subtitle.sub_dir)
+    
+    def _process_collection(self, job: Job, playlist: PlaylistResult, metrics: RunMetrics):
+        """多P视频/合集：与单视频模式相同，逐个总结各分P并生成合集文档，任务结果为合集文档"""
+        job.video_title = playlist.title
+        result = CollectionPipeline(self.downloader, self.summarizer, self.save_func).run(playlist, metrics)
+        job.parts = len(result.parts)
+        if result.output_file:
+            job.output_file = result.output_file
+            metrics.success = True
+            failed = len(result.parts) - len(result.succeeded)
+            if failed:
+                logger.warning(f"{failed} 个分P未能总结")
+        else:
+            job.error = metrics.error = "所有分P均处理失败"
+        if Settings.WRITE_METRICS_FILE:
+            metrics.write_sidecar(playlist.sub_dir)
+
+
+def make_server(service: SummaryService, host: str, port: int) -> ThreadingHTTPServer:
+    """
+    创建HTTP服务器（未启动），port为0时自动分配端口
+    
+    Args:
+        service: 任务服务
+        host: 监听地址
+        port: 监听端口
+    
+    Returns:
+        HTTP服务器，调用 serve_forever() 开始处理请求
+    """
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+        
+        def _send(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def _send_json(self, status: int, payload: dict):
+            self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+        
+        def do_POST(self):
+            if self.path.rstrip('/') != '/jobs':
+                self._send_json(404, {'error': '接口不存在'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                url = (json.loads(self.rfile.read(length) or b'{}').get('url') or '').strip()
+            except (ValueError, AttributeError):
+                self._send_json(400, {'error': '请求体必须是JSON，例如 {"url": "..."}'})
+                return
+            if not url:
+                self._send_json(400, {'error': '缺少url'})
+                return
+            try:
+                job, coalesced = service.submit(url)
+            except ServiceBusy as e:
+                self._send_json(503, {'error': str(e)})
+                return
+            self._send_json(202, {**job.to_dict(), 'coalesced': coalesced})
+        
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/health':
+                self._send_json(200, {'status': 'ok', **service.stats()})
+                return
+            match = _JOB_PATH.match(path)
+            job = service.get(match.group(1)) if match else None
+            if not job:
+                self._send_json(404, {'error': '任务不存在'})
+                return
+            if not match.group(2):
+                self._send_json(200, job.to_dict())
+                return
+            if job.status == FAILED:
+                self._send_json(409, {'error': job.error, 'status': job.status})
+            elif job.status != DONE:
+                self._send_json(409, {'error': '任务尚未完成', 'status': job.status})
+            else:
+                try:
+                    summary = Path(job.output_file).read_text(encoding='utf-8')
+                except OSError as e:
+                    self._send_json(410, {'error': f"总结文件不可读: {str(e)}"})
+                    return
+                self._send(200, summary.encode('utf-8'), 'text/markdown; charset=utf-8')
+    
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
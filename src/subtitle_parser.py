@@ -0,0 +1,280 @@
+"""字幕解析：单次遍历将SRT/VTT/ASS字幕解析为带时间信息的字幕条目"""
+import html
+import json
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# 时间轴行：SRT使用逗号分隔毫秒，VTT使用点号且小时可省略
+_TIMING = re.compile(
+    r'(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})\s*-->\s*(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})'
+)
+# HTML/VTT样式标签，如 <i>、<c.color>、<00:00:01.000>
+_TAG = re.compile(r'<[^>]+>')
+# ASS时间：H:MM:SS.cc
+_ASS_TIME = re.compile(r'(\d+):(\d{2}):(\d{2})[.](\d{1,3})')
+# ASS样式覆盖代码，如 {\an8}
+_ASS_OVERRIDE = re.compile(r'\{[^}]*\}')
+# VTT中不属于字幕的块
+_VTT_SKIP_BLOCKS = ('NOTE', 'STYLE', 'REGION')
+
+SUPPORTED_FORMATS = ('srt', 'vtt', 'ass', 'ssa', 'json')
+
+
+class Cue:
+    """一条字幕：开始时间、结束时间（秒）和文本（多行以换行分隔）"""
+    
+    __slots__ = ('start', 'end', 'text')
+    
+    def __init__(self, start: float, end: float, text: str):
+        self.start = start
+        self.end = end
+        self.text = text
+    
+    def __repr__(self) -> str:
+        return f"Cue({self.start:.3f}, {self.end:.3f}, {self.text!r})"
+    
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Cue):
+            return NotImplemented
+        return (self.start, self.end, self.text) == (other.start, other.end, other.text)
+
+
+def _seconds(hours: Optional[str], minutes: str, seconds: str, fraction: str) -> float:
+    """将时间各部分转换为秒，fraction按小数部分处理（"5"为0.5秒，"050"为0.05秒）"""
+    return (int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+            + int(fraction) / (10 ** len(fraction)))
+
+
+def _hhmmssmmm_seconds(value: int) -> float:
+    """将 HHMMSSmmm 形式的整数转换为秒"""
+    hours, value = divmod(value, 10000000)
+    minutes, value = divmod(value, 100000)
+    return hours * 3600 + minutes * 60 + value / 1000
+
+
+def _clean_line(line: str) -> str:
+    """移除标签并还原HTML实体，只在需要时调用正则"""
+    if '<' in line:
+        line = _TAG.sub('', line)
+    if '&' in line:
+        line = html.unescape(line)
+    return line.strip()
+
+
+def _parse_timing(line: str) -> Optional[Tuple[float, float]]:
+    """
+    解析时间轴行，返回 (开始, 结束) 秒数
+    
+    绝大多数字幕使用定宽的 "HH:MM:SS,mmm --> HH:MM:SS,mmm"，直接按位置切片转换；
+    其他写法（VTT省略小时、附带位置参数等）再使用正则。
+    """
+    if len(line) == 29 and line[2] == ':' and line[12:17] == ' --> ' and line[19] == ':':
+        # 去掉分隔符后整行是18位数字（HHMMSSmmm HHMMSSmmm），一次int()转换后用整除拆分
+        digits = line.replace(':', '').replace(',', '').replace('.', '').replace(' --> ', '')
+        if len(digits) == 18 and digits.isascii() and digits.isdigit():
+            start, end = divmod(int(digits), 1000000000)
+            return _hhmmssmmm_seconds(start), _hhmmssmmm_seconds(end)
+    match = _TIMING.match(line)
+    if not match:
+        return None
+    g = match.groups()
+    return _seconds(g[0], g[1], g[2], g[3]), _seconds(g[4], g[5], g[6], g[7])
+
+
+def iter_srt_vtt_cues(lines: Iterable[str]) -> Iterator[Cue]:
+    """
+    单次遍历解析SRT或VTT字幕
+    
+    以时间轴行作为字幕条目的开始，空行作为结束；序号行、VTT头部、
+    条目标识符以及NOTE/STYLE/REGION块都会被忽略。
+    
+    Args:
+        lines: 字幕文件的行（可以是打开的文件对象）
+    
+    Yields:
+        字幕条目
+    """
+    start = end = 0.0
+    text: Optional[List[str]] = None
+    skipping = False
+    
+    for raw in lines:
+        line = raw.strip()
+        if not line:
+            if text:
+                yield Cue(start, end, '\n'.join(text))
+            text = None
+            skipping = False
+            continue
+        if skipping:
+            continue
+        if text is None or '-->' in line:
+            timing = _parse_timing(line) if '-->' in line else None
+            if timing:
+                if text:
+                    yield Cue(start, end, '\n'.join(text))
+                start, end = timing
+                text = []
+                continue
+        if text is not None:
+            if '<' in line or '&' in line:
+                line = _clean_line(line)
+                if not line:
+                    continue
+            text.append(line)
+        elif line.startswith(_VTT_SKIP_BLOCKS):
+            skipping = True
+    
+    if text:
+        yield Cue(start, end, '\n'.join(text))
+
+
+def iter_ass_cues(lines: Iterable[str]) -> Iterator[Cue]:
+    """
+    单次遍历解析ASS/SSA字幕的 [Events] 部分
+    
+    Args:
+        lines: 字幕文件的行（可以是打开的文件对象）
+    
+    Yields:
+        字幕条目
+    """
+    in_events = False
+    fields = ['layer', 'start', 'end', 'style', 'name', 'marginl', 'marginr', 'marginv', 'effect', 'text']
+    
+    for raw in lines:
+        line = raw.strip()
+        if line.startswith('['):
+            in_events = line.lower() == '[events]'
+            continue
+        if not in_events:
+            continue
+        if line.startswith('Format:'):
+            fields = [f.strip().lower() for f in line[len('Format:'):].split(',')]
+            continue
+        if not line.startswith('Dialogue:'):
+            continue
+        
+        values = line[len('Dialogue:'):].split(',', len(fields) - 1)
+        if len(values) < len(fields):
+            continue
+        record = dict(zip(fields, values))
+        start_match = _ASS_TIME.match(record.get('start', '').strip())
+        end_match = _ASS_TIME.match(record.get('end', '').strip())
+        if not start_match or not end_match:
+            continue
+        
+        text = record.get('text', '')
+        if '{' in text:
+            text = _ASS_OVERRIDE.sub('', text)
+        text = text.replace('\\N', '\n').replace('\\n', '\n').replace('\\h', ' ')
+        text_lines = [t for t in (_clean_line(part) for part in text.split('\n')) if t]
+        if text_lines:
+            yield Cue(_seconds(*start_match.groups()), _seconds(*end_match.groups()), '\n'.join(text_lines))
+
+
+def iter_bilibili_json_cues(data: dict) -> Iterator[Cue]:
+    """
+    解析Bilibili字幕接口返回的JSON（{"body": [{"from", "to", "content"}, ...]}）
+    
+    Args:
+        data: 已解码的JSON对象
+    
+    Yields:
+        字幕条目
+    """
+    if not isinstance(data, dict):
+        return
+    for item in data.get('body') or []:
+        text = '\n'.join(t for t in (line.strip() for line in str(item.get('content', '')).split('\n')) if t)
+        if text:
+            yield Cue(float(item.get('from', 0)), float(item.get('to', 0)), text)
+
+
+def iter_cues(lines: Iterable[str], fmt: str) -> Iterator[Cue]:
+    """
+    按格式解析字幕行
+    
+    Args:
+        lines: 字幕文件的行
+        fmt: 字幕格式（srt/vtt/ass/ssa），未知格式按SRT/VTT解析
+    
+    Yields:
+        字幕条目
+    """
+    if fmt.lower().lstrip('.') in ('ass', 'ssa'):
+        return iter_ass_cues(lines)
+    return iter_srt_vtt_cues(lines)
+
+
+def parse_subtitle_file(subtitle_file: Path) -> List[Cue]:
+    """
+    逐行读取并解析字幕文件，不把整个文件读入内存
+    
+    Args:
+        subtitle_file: 字幕文件路径，格式由扩展名决定
+    
+    Returns:
+        字幕条目列表
+    """
+    subtitle_file = Path(subtitle_file)
+    with open(subtitle_file, 'r', encoding='utf-8-sig') as f:
+        # Bilibili接口的JSON字幕不是按行的格式，整个文件解码后解析
+        if subtitle_file.suffix.lower() == '.json':
+            return list(iter_bilibili_json_cues(json.load(f)))
+        return list(iter_cues(f, subtitle_file.suffix))
+
+
+def parse_subtitle_text(content: str, fmt: str) -> List[Cue]:
+    """
+    解析内存中的字幕内容
+    
+    Args:
+        content: 字幕内容
+        fmt: 字幕格式（srt/vtt/ass/ssa，或Bilibili接口的json）
+    
+    Returns:
+        字幕条目列表
+    """
+    content = content.lstrip('\ufeff')
+    if fmt.lower().lstrip('.') == 'json':
+        return list(iter_bilibili_json_cues(json.loads(content)))
+    return list(iter_cues(content.splitlines(), fmt))
+
+
+def cues_to_text(cues: Iterable[Cue]) -> str:
+    """
+    将字幕条目渲染为纯文本，每行一句
+    
+    Args:
+        cues: 字幕条目
+    
+    Returns:
+        纯文本字幕内容
+    """
+    return '\n'.join(cue.text for cue in cues)
+
+
+def _srt_timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+
+
+def cues_to_srt(cues: Iterable[Cue]) -> str:
+    """
+    将字幕条目渲染为SRT格式
+    
+    Args:
+        cues: 字幕条目
+    
+    Returns:
+        SRT字幕内容
+    """
+    return ''.join(
+        f"{i}\n{_srt_timestamp(cue.start)} --> {_srt_timestamp(cue.end)}\n{cue.text}\n\n"
+        for i, cue in enumerate(cues, 1)
+    )
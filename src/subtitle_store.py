@@ -0,0 +1,259 @@
+"""
+字幕存储：按 BV号 + 分P + 字幕语言 + 格式 保存下载过的原始字幕，跨运行共享
+
+有效期内再次处理同一视频时，在发出任何网络请求之前从存储中读取字幕，不再访问Bilibili
+（重复请求是账号被限流的主要原因）。输出目录中的字幕文件是存储文件的硬链接（不支持时复制），
+只是供查看的视图。
+
+每个视频（BV号+分P）在存储目录下有一个固定的子目录:
+    info.json        视频信息、当时可用的字幕语言和格式、已保存的字幕轨道（含SHA-256）
+    <语言>.<格式>     原始字幕内容
+
+读取时校验SHA-256，文件被修改（例如编辑了链接到它的输出字幕文件）时视为未命中并重新下载。
+"""
+import hashlib
+import json
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from config.settings import Settings
+from utils.logger import setup_logger
+from utils.video import video_key
+from src.cache import CACHE_MODES
+from src.checkpoint import write_atomic
+
+logger = setup_logger()
+
+INFO_FILENAME = "info.json"
+
+# 选择字幕的函数：参数为 (手动字幕, 自动字幕)，返回 (语言, 格式)
+Selector = Callable[[Dict[str, list], Dict[str, list]], Tuple[Optional[str], Optional[str]]]
+
+
+@dataclass
+class StoredSubtitle:
+    """从存储中读取的字幕"""
+    content: str
+    fmt: str
+    lang: str
+    path: Path
+    video_title: str
+    video_id: Optional[str] = None
+    uploader: Optional[str] = None
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r'[^0-9A-Za-z._-]+', '_', name).strip('_')
+
+
+def _store_key(url: str) -> str:
+    """
+    存储键：与video_key相同，但保留显式指定的 ?p=1
+    
+    未指定分P的多P视频URL对应的是分P列表，P1的字幕不能在该URL下命中。
+    """
+    key = video_key(url)
+    if '?p=' not in key and parse_qs(urlparse(url.strip()).query).get('p'):
+        key += '?p=1'
+    return key
+
+
+def _track_key(lang: str, requested_format: Optional[str]) -> str:
+    """字幕轨道的键：语言和选择时请求的格式（没有指定格式时为auto，实际格式记录在轨道中）"""
+    return f"{lang}/{requested_format or 'auto'}"
+
+
+def _availability(tracks: Dict[str, list]) -> Dict[str, List[str]]:
+    """视频信息中的字幕列表只保留语言和格式"""
+    return {lang: [t.get('ext') for t in subs] for lang, subs in tracks.items()}
+
+
+def _as_tracks(availability: Dict[str, List[str]]) -> Dict[str, list]:
+    return {lang: [{'ext': ext} for ext in exts] for lang, exts in availability.items()}
+
+
+class SubtitleStore:
+    """
+    字幕存储
+    
+    模式与总结缓存相同:
+        on: 读写
+        off: 不使用
+        refresh: 忽略已有字幕，重新下载并写入
+        readonly: 只读取，不写入
+    """
+    
+    def __init__(self, root: Optional[Path] = None, mode: Optional[str] = None, max_age_days: Optional[float] = None):
+        """
+        Args:
+            root: 存储目录，默认使用Settings中的配置
+            mode: 存储模式，默认使用Settings中的配置
+            max_age_days: 有效期（天），超过后重新下载（字幕可能被UP主更新），0为不过期
+        """
+        self.root = Path(root or Settings.SUBTITLE_STORE_DIR)
+        self.mode = mode or Settings.SUBTITLE_STORE_MODE
+        if self.mode not in CACHE_MODES:
+            raise ValueError(f"未知字幕存储模式: {self.mode}，可选: {', '.join(CACHE_MODES)}")
+        self.max_age = (max_age_days if max_age_days is not None else Settings.SUBTITLE_STORE_MAX_AGE_DAYS) * 86400
+        self._lock = threading.Lock()
+        self._evicted = False
+    
+    @property
+    def readable(self) -> bool:
+        return self.mode in ("on", "readonly")
+    
+    @property
+    def writable(self) -> bool:
+        return self.mode in ("on", "refresh")
+    
+    def _entry_dir(self, url: str) -> Path:
+        return self.root / (_safe_name(_store_key(url)) or 'video')
+    
+    def _load_info(self, entry_dir: Path) -> Optional[dict]:
+        """读取未过期的info.json，不存在、已损坏或已过期时返回None"""
+        try:
+            info = json.loads((entry_dir / INFO_FILENAME).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("字幕存储信息已损坏: %s: %s", entry_dir, e)
+            return None
+        if self.max_age and time.time() - info.get('fetched_at', 0) > self.max_age:
+            return None
+        return info
+    
+    def get(self, url: str, select: Selector) -> Optional[StoredSubtitle]:
+        """
+        读取视频的字幕
+        
+        按记录的可用字幕列表重新选择语言和格式（与下载时使用相同的选择逻辑），
+        选中的轨道已保存且内容校验通过时命中。
+        
+        Args:
+            url: 视频URL
+            select: 选择字幕语言和格式的函数
+        
+        Returns:
+            存储的字幕，未命中返回None
+        """
+        if not self.readable:
+            return None
+        entry_dir = self._entry_dir(url)
+        info = self._load_info(entry_dir)
+        # 旧版本中P1与未指定分P的URL共用一个目录，记录的URL不一致时视为未命中
+        if not info or _store_key(info.get('url') or url) != _store_key(url):
+            return None
+        
+        lang, requested_format = select(_as_tracks(info.get('subtitles', {})), _as_tracks(info.get('automatic_captions', {})))
+        track = info.get('tracks', {}).get(_track_key(lang, requested_format)) if lang else None
+        if not track:
+            return None
+        path = entry_dir / track['file']
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != track['sha256']:
+            logger.warning("存储的字幕已被修改，重新下载: %s", path)
+            return None
+        
+        logger.debug("字幕存储命中: %s (%s)", entry_dir.name, track['file'])
+        return StoredSubtitle(
+            content=data.decode('utf-8'),
+            fmt=track['format'],
+            lang=lang,
+            path=path,
+            video_title=info.get('title') or 'unknown',
+            video_id=info.get('video_id'),
+            uploader=info.get('uploader'),
+        )
+    
+    def put(
+        self,
+        url: str,
+        info: dict,
+        lang: str,
+        requested_format: Optional[str],
+        content: str,
+        fmt: str,
+        replace: bool = False,
+    ) -> Optional[Path]:
+        """
+        保存下载的字幕（原子写入），同时更新视频信息和可用字幕列表
+        
+        Args:
+            url: 视频URL
+            info: yt-dlp提取的视频信息
+            lang: 字幕语言
+            requested_format: 选择字幕时请求的格式（None表示未指定）
+            content: 原始字幕内容
+            fmt: 字幕实际格式
+            replace: 是否丢弃该视频之前保存的其他字幕轨道（重新检查字幕时，其他轨道可能也已过时）
+        
+        Returns:
+            存储的字幕文件路径，不写入或写入失败时返回None
+        """
+        if not self.writable:
+            return None
+        entry_dir = self._entry_dir(url)
+        data = content.encode('utf-8')
+        filename = f"{_safe_name(lang) or 'unknown'}.{fmt}"
+        try:
+            with self._lock:
+                entry_dir.mkdir(parents=True, exist_ok=True)
+                write_atomic(entry_dir / filename, content)
+                previous = {} if replace else self._load_info(entry_dir) or {}
+                record = {
+                    'url': url,
+                    'title': info.get('title'),
+                    'video_id': info.get('id'),
+                    'uploader': info.get('uploader'),
+                    'subtitles': _availability(info.get('subtitles') or {}),
+                    'automatic_captions': _availability(info.get('automatic_captions') or {}),
+                    'fetched_at': time.time(),
+                    'tracks': {
+                        **previous.get('tracks', {}),
+                        _track_key(lang, requested_format): {
+                            'file': filename, 'format': fmt, 'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data),
+                        },
+                    },
+                }
+                write_atomic(entry_dir / INFO_FILENAME, json.dumps(record, ensure_ascii=False, indent=2))
+        except OSError as e:
+            # 存储写入失败不影响本次的字幕结果
+            logger.warning("写入字幕存储失败: %s", e)
+            return None
+        logger.debug("字幕已存储: %s (%s)", entry_dir.name, filename)
+        
+        if not self._evicted:
+            self._evicted = True
+            self.evict()
+        return entry_dir / filename
+    
+    def evict(self) -> int:
+        """
+        删除过期的视频目录（每个存储实例第一次写入时调用一次）
+        
+        Returns:
+            删除的视频数
+        """
+        if not self.max_age:
+            return 0
+        now = time.time()
+        removed = 0
+        for info_file in self.root.glob(f"*/{INFO_FILENAME}"):
+            try:
+                if now - info_file.stat().st_mtime <= self.max_age:
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(info_file.parent, ignore_errors=True)
+            removed += 1
+        if removed:
+            logger.info("字幕存储已清理过期视频 %d 个", removed)
+        return removed
@@ -1,38 +1,121 @@
 """使用AI API对字幕进行总结"""
+import itertools
 import json
+import random
+import re
+import sqlite3
+import time
+import threading
 import requests
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
 from config.settings import Settings
-from utils.logger import setup_logger
+from utils.logger import bind_log_context, setup_logger
+from utils.rate_limit import RateLimiter
+from utils.tokens import estimate_tokens
+from src.cache import SummaryCache
+from src.near_duplicate import Fingerprint, FingerprintIndex, NearDuplicate
+from src.hedging import BACKUP, FIRST_TOKEN, RESPONSE, HedgeCancelled, HedgeOutcome, HedgePolicy, HedgeTarget
+from src.metrics import RunMetrics
 
 logger = setup_logger()
 
+# 提示词模板版本，修改 _build_prompt 时需要同步更新，使旧的总结缓存失效
+PROMPT_VERSION = "1"
+
+# 需要重试的HTTP状态码：限流和服务端错误
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 句子结束标点，单行超出分块预算时在这些位置切分
+_SENTENCE_END = re.compile(r'(?<=[。！？!?；;.])')
+
+
+@dataclass
+class _OpenStream:
+    """已收到首个token的流式响应：已读取的数据块和其余数据块的迭代器"""
+    response: requests.Response
+    chunks: Iterator[dict]
+    received: List[dict] = field(default_factory=list)
+
 
 class AISummarizer:
     """AI总结器"""
     
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        cache_mode: Optional[str] = None,
+        near_dup_mode: Optional[str] = None,
+    ):
         """
         初始化总结器
         
         Args:
             api_key: API密钥，默认使用Settings中的配置
             model: 模型名称，默认使用Settings中的配置
+            cache_mode: 总结缓存模式（on/off/refresh/readonly），默认使用Settings中的配置
+            near_dup_mode: 近似重复检测模式（on/off/refresh/readonly），默认使用Settings中的配置
         """
         self.api_key = api_key or Settings.AI_API_KEY
         self.model = model or Settings.AI_MODEL
         self.api_url = Settings.AI_API_URL
+        cache_mode = cache_mode or Settings.SUMMARY_CACHE_MODE
+        self.cache = SummaryCache(mode=cache_mode) if cache_mode != "off" else None
+        near_dup_mode = near_dup_mode or Settings.NEAR_DUP_MODE
+        self.fingerprints = FingerprintIndex.from_settings(near_dup_mode) if near_dup_mode != "off" else None
+        
+        self.chunk_tokens = Settings.SUMMARY_CHUNK_TOKENS
+        self.chunk_overlap_tokens = Settings.SUMMARY_CHUNK_OVERLAP_TOKENS
+        self.chunk_workers = max(1, Settings.SUMMARY_CHUNK_WORKERS)
+        
+        # 复用连接的HTTP会话，批量和分块并发时共享同一个连接池
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=Settings.AI_HTTP_POOL_SIZE,
+            pool_maxsize=Settings.AI_HTTP_POOL_SIZE,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        })
+        self.max_retries = max(0, Settings.AI_MAX_RETRIES)
+        self.retry_backoff = Settings.AI_RETRY_BACKOFF
+        self.retry_max_backoff = Settings.AI_RETRY_MAX_BACKOFF
+        self.rate_limiter = RateLimiter(Settings.AI_REQUESTS_PER_MINUTE, Settings.AI_TOKENS_PER_MINUTE)
+        
+        # 对冲请求：主请求超过延迟阈值仍未返回时发出备用请求（可使用备用模型/接口）
+        self.primary = HedgeTarget(url=self.api_url, model=self.model)
+        self.hedge = HedgePolicy.from_settings(self.api_url, self.model) if Settings.AI_HEDGE_ENABLED else None
         
         if not self.api_key:
             raise ValueError("AI_API_KEY未设置，请设置环境变量或传入参数")
     
-    def summarize(self, subtitle_text: str, video_title: str = "") -> Optional[str]:
+    def summarize(
+        self,
+        subtitle_text: str,
+        video_title: str = "",
+        on_token: Optional[Callable[[str], None]] = None,
+        metrics: Optional[RunMetrics] = None,
+    ) -> Optional[str]:
         """
         对字幕进行总结
         
+        字幕较短时直接一次调用生成总结；超出分块预算时先并发总结各个分块，
+        再将分块总结合并为最终文档。
+        
         Args:
             subtitle_text: 字幕文本
             video_title: 视频标题（可选）
+            on_token: 流式输出回调（可选）。传入时以流式方式请求最终总结，
+                每收到一段内容就调用一次；分块总结时只有最后的合并步骤是流式的
+            metrics: 运行指标（可选），记录AI调用耗时和token用量
         
         Returns:
             总结内容，如果失败返回None
@@ -41,49 +124,531 @@ class AISummarizer:
             logger.warning("字幕内容为空")
             return None
         
-        # 构建提示词
-        prompt = self._build_prompt(subtitle_text, video_title)
+        cache_key = None
+        if self.cache:
+            cache_key = SummaryCache.make_key(subtitle_text, video_title, self.model, PROMPT_VERSION)
+            cached = self.cache.get(cache_key)
+            if cached:
+                if metrics:
+                    metrics.cache_hit = True
+                if on_token:
+                    on_token(cached)
+                return cached
         
-        try:
-            logger.info("开始调用AI API进行总结...")
+        fp, duplicate = None, None
+        if self.fingerprints:
+            with metrics.timer('fingerprint') if metrics else nullcontext():
+                fp, duplicate = self.find_near_duplicate(subtitle_text)
+        added_lines = duplicate.added_lines(subtitle_text) if duplicate else []
+        if duplicate and (duplicate.similarity >= Settings.NEAR_DUP_REUSE_THRESHOLD or not added_lines):
+            # 内容几乎相同，或者只是删减（剪辑版本），直接复用已有总结
+            logger.info(f"字幕与已总结视频《{duplicate.source}》相似度 {duplicate.similarity:.2f}，复用其总结")
+            duplicate.record(metrics, "reuse")
+            note = duplicate.note("reuse")
+            self._remember(cache_key, fp, duplicate.summary, video_title, metrics, note)
+            if on_token:
+                on_token(duplicate.summary + note)
+            return duplicate.summary + note
+        
+        note = ""
+        with metrics.timer('llm') if metrics else nullcontext():
+            try:
+                if duplicate and estimate_tokens('\n'.join(added_lines)) <= self.chunk_tokens:
+                    logger.info(
+                        f"字幕与已总结视频《{duplicate.source}》相似度 {duplicate.similarity:.2f}，"
+                        f"只总结新增的 {len(added_lines)} 行"
+                    )
+                    duplicate.record(metrics, "diff")
+                    note = duplicate.note("diff")
+                    prompt = self._build_diff_prompt(duplicate.summary, added_lines, video_title)
+                    summary = self._chat(prompt, on_token, metrics)
+                elif estimate_tokens(subtitle_text) <= self.chunk_tokens:
+                    logger.info("开始调用AI API进行总结...")
+                    summary = self._chat(self._build_prompt(subtitle_text, video_title), on_token, metrics)
+                else:
+                    summary = self._summarize_chunked(subtitle_text, video_title, on_token, metrics)
+                
+                if summary:
+                    logger.info("AI总结完成")
+                    self._remember(cache_key, fp, summary, video_title, metrics, note)
+                    if note and on_token:
+                        on_token(note)
+                    return summary + note
+                else:
+                    logger.warning("AI返回内容为空")
+                    return None
             
-            response = requests.post(
-                url=self.api_url,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                },
-                timeout=120  # 2分钟超时
+            except requests.exceptions.RequestException as e:
+                logger.error(f"API请求失败: {str(e)}")
+                return None
+            except Exception as e:
+                logger.error(f"总结过程出错: {str(e)}")
+                return None
+    
+    def find_near_duplicate(self, subtitle_text: str) -> Tuple[Optional[Fingerprint], Optional[NearDuplicate]]:
+        """
+        计算字幕指纹并在索引中查找相似度达到阈值的已总结视频
+        
+        Returns:
+            (指纹, 最相似的视频)；字幕过短时指纹为None，索引出错时不影响总结
+        """
+        fp = self.fingerprints.fingerprint(subtitle_text)
+        if fp.length < Settings.NEAR_DUP_MIN_CHARS:
+            return None, None
+        threshold = min(Settings.NEAR_DUP_REUSE_THRESHOLD, Settings.NEAR_DUP_DIFF_THRESHOLD)
+        try:
+            return fp, self.fingerprints.find(fp, self.model, PROMPT_VERSION, threshold)
+        except sqlite3.Error as e:
+            logger.warning(f"查询字幕指纹索引失败: {str(e)}")
+            return fp, None
+    
+    def _remember(
+        self,
+        cache_key: Optional[str],
+        fp: Optional[Fingerprint],
+        summary: str,
+        video_title: str,
+        metrics: Optional[RunMetrics],
+        note: str = "",
+    ):
+        """将总结写入缓存和字幕指纹索引；来源说明只写入缓存（与保存的总结一致），指纹索引中保存不带说明的总结"""
+        if self.cache:
+            self.cache.put(cache_key, summary + note, model=self.model, video_title=video_title)
+        if fp:
+            try:
+                self.fingerprints.add(
+                    fp, summary, self.model, PROMPT_VERSION, title=video_title or None, url=metrics.url if metrics else None,
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"写入字幕指纹索引失败: {str(e)}")
+    
+    def request_body(self, subtitle_text: str, video_title: str = "") -> Optional[dict]:
+        """
+        生成一次调用即可完成总结的对话接口请求体（用于批处理接口）
+        
+        Args:
+            subtitle_text: 字幕文本
+            video_title: 视频标题（可选）
+        
+        Returns:
+            请求体；字幕超出分块预算、需要分块总结时返回None
+        """
+        if estimate_tokens(subtitle_text) > self.chunk_tokens:
+            return None
+        return self._payload(self._build_prompt(subtitle_text, video_title), self.model)
+    
+    def _chat(
+        self,
+        prompt: str,
+        on_token: Optional[Callable[[str], None]] = None,
+        metrics: Optional[RunMetrics] = None,
+    ) -> str:
+        """
+        调用对话接口
+        
+        Args:
+            prompt: 提示词
+            on_token: 流式输出回调（可选），传入时使用流式请求
+            metrics: 运行指标（可选），累加本次调用的token用量
+        
+        Returns:
+            模型回复内容，可能为空字符串
+        
+        Raises:
+            requests.exceptions.RequestException: 请求失败
+        """
+        if on_token:
+            return self._chat_stream(prompt, on_token, metrics)
+        
+        def request(target: HedgeTarget, cancel: Optional[threading.Event] = None) -> dict:
+            response = self._post(
+                self._payload(prompt, target.model),
+                estimated_tokens=estimate_tokens(prompt),
+                timeout=120,  # 2分钟超时
+                target=target,
+                cancel=cancel,
             )
+            with response:
+                return response.json()
+        
+        if self.hedge:
+            result = self._record_hedge(metrics, self.hedge.run(RESPONSE, self.primary, request))
+        else:
+            result = request(self.primary)
+        
+        # 提取回复内容
+        content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
+        if metrics:
+            self._record_usage(metrics, result.get('usage'), prompt, content)
+        return content
+    
+    @staticmethod
+    def _payload(prompt: str, model: str, stream: bool = False) -> dict:
+        """对话接口的请求体"""
+        payload = {
+            "model": model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    @staticmethod
+    def _record_hedge(metrics: Optional[RunMetrics], outcome: HedgeOutcome):
+        """记录对冲情况，返回胜出请求的结果"""
+        if metrics and outcome.hedged:
+            metrics.add_hedge(backup_won=outcome.winner == BACKUP)
+        return outcome.value
+    
+    @staticmethod
+    def _record_usage(metrics: RunMetrics, usage: Optional[dict], prompt: str, content: str):
+        """记录接口返回的token用量；接口没有返回usage时使用本地估算值"""
+        if usage:
+            metrics.add_usage(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+        else:
+            metrics.add_usage(estimate_tokens(prompt), estimate_tokens(content or ''), estimated=True)
+    
+    def _post(
+        self,
+        payload: dict,
+        estimated_tokens: int = 0,
+        stream: bool = False,
+        timeout=120,
+        target: Optional[HedgeTarget] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> requests.Response:
+        """
+        发送请求，遇到限流（429）、服务端错误（5xx）和网络错误时指数退避重试
+        
+        每次尝试前先通过客户端限流器取得配额；服务端返回 Retry-After 时按其等待。
+        对冲请求落败（收到取消信号）后不再重试，等待中的退避立即结束，已返回的响应被关闭。
+        
+        Args:
+            payload: 请求体
+            estimated_tokens: 估算的提示词token数，用于每分钟token数限流
+            stream: 是否流式读取响应
+            timeout: 请求超时
+            target: 请求目标（可选），默认使用主接口
+            cancel: 取消信号（可选），对冲请求中另一个请求胜出时被设置
+        
+        Returns:
+            成功的响应
+        
+        Raises:
+            HedgeCancelled: 收到取消信号
+            requests.exceptions.RequestException: 重试耗尽后仍然失败
+        """
+        target = target or self.primary
+        headers = {"Accept": "text/event-stream"} if stream else {}
+        if target.api_key:
+            headers["Authorization"] = f"Bearer {target.api_key}"
+        for attempt in range(self.max_retries + 1):
+            waited = self.rate_limiter.acquire(estimated_tokens)
+            if waited > 0.01:
+                logger.info(f"客户端限流，等待 {waited:.2f}s")
+            if cancel is not None and cancel.is_set():
+                raise HedgeCancelled()
             
-            response.raise_for_status()
-            result = response.json()
-            
-            # 提取回复内容
-            summary = result.get('choices', [{}])[0].get('message', {}).get('content', '')
-            
-            if summary:
-                logger.info("AI总结完成")
-                return summary
+            try:
+                response = self.session.post(
+                    url=target.url,
+                    headers=headers or None,
+                    json=payload,
+                    stream=stream,
+                    timeout=timeout,
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"API请求出错: {str(e)}，{delay:.1f}s后重试 ({attempt + 1}/{self.max_retries})")
             else:
-                logger.warning("AI返回内容为空")
+                if cancel is not None and cancel.is_set():
+                    response.close()
+                    raise HedgeCancelled()
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    try:
+                        response.raise_for_status()
+                    except requests.exceptions.HTTPError:
+                        response.close()
+                        raise
+                    return response
+                retry_after = self._retry_after(response)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                response.close()
+                logger.warning(f"API返回 {response.status_code}，{delay:.1f}s后重试 ({attempt + 1}/{self.max_retries})")
+            if cancel is None:
+                time.sleep(delay)
+            elif cancel.wait(delay):
+                raise HedgeCancelled()
+    
+    def _backoff(self, attempt: int) -> float:
+        """第attempt次重试的指数退避时间（带随机抖动）"""
+        delay = self.retry_backoff * (2 ** attempt)
+        return min(self.retry_max_backoff, delay * random.uniform(0.5, 1.5))
+    
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """解析 Retry-After 响应头（秒数或HTTP日期），超过最大退避时间时截断"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
                 return None
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API请求失败: {str(e)}")
+        return min(self.retry_max_backoff, max(0.0, seconds))
+    
+    def _chat_stream(
+        self,
+        prompt: str,
+        on_token: Callable[[str], None],
+        metrics: Optional[RunMetrics] = None,
+    ) -> str:
+        """
+        以流式方式（SSE）调用对话接口，逐段回调并返回完整内容
+        
+        读取超时作用于相邻两段数据之间，因此较长的生成不会因总耗时超时而失败。
+        部分服务会在最后一个数据块中附带usage，有则记录。
+        启用对冲时以首个token的到达时间判断是否发出备用请求。
+        """
+        start = time.monotonic()
+        estimated_tokens = estimate_tokens(prompt)
+        
+        def open_stream(target: HedgeTarget, cancel: Optional[threading.Event] = None) -> _OpenStream:
+            return self._open_stream(self._payload(prompt, target.model, stream=True), estimated_tokens, target, cancel)
+        
+        if self.hedge:
+            opened = self._record_hedge(metrics, self.hedge.run(
+                FIRST_TOKEN, self.primary, open_stream, discard=lambda stream: stream.response.close(),
+            ))
+        else:
+            opened = open_stream(self.primary)
+        
+        first_token_at = None
+        parts = []
+        usage = None
+        with opened.response:
+            for chunk in itertools.chain(opened.received, opened.chunks):
+                usage = chunk.get('usage') or usage
+                choices = chunk.get('choices') or [{}]
+                content = (choices[0].get('delta') or {}).get('content')
+                if not content:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                    logger.info("首个token耗时: %.2fs", first_token_at - start)
+                    if metrics:
+                        metrics.first_token_seconds = first_token_at - start
+                parts.append(content)
+                on_token(content)
+        
+        logger.info("流式输出完成，总耗时: %.2fs", time.monotonic() - start)
+        content = ''.join(parts)
+        if metrics:
+            self._record_usage(metrics, usage, prompt, content)
+        return content
+    
+    def _open_stream(
+        self,
+        payload: dict,
+        estimated_tokens: int,
+        target: HedgeTarget,
+        cancel: Optional[threading.Event] = None,
+    ) -> _OpenStream:
+        """
+        发出流式请求并读取到首个token（或流结束）为止
+        
+        Raises:
+            HedgeCancelled: 收到首个token之前另一个请求已经胜出
+            requests.exceptions.RequestException: 请求失败
+        """
+        response = self._post(
+            payload,
+            estimated_tokens=estimated_tokens,
+            stream=True,
+            timeout=(10, 120),  # 连接超时10秒，相邻数据间隔超时2分钟
+            target=target,
+            cancel=cancel,
+        )
+        try:
+            chunks = self._iter_events(response)
+            opened = _OpenStream(response=response, chunks=chunks)
+            for chunk in chunks:
+                if cancel is not None and cancel.is_set():
+                    raise HedgeCancelled()
+                opened.received.append(chunk)
+                choices = chunk.get('choices') or [{}]
+                if (choices[0].get('delta') or {}).get('content'):
+                    break
+            return opened
+        except BaseException:
+            response.close()
+            raise
+    
+    @staticmethod
+    def _iter_events(response: requests.Response) -> Iterator[dict]:
+        """逐个解析SSE数据块，遇到 [DONE] 结束"""
+        # text/event-stream 通常不声明字符集，requests会按ISO-8859-1解码
+        response.encoding = 'utf-8'
+        # chunk_size=None：数据到达即处理，不等待缓冲区填满
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            # SSE：只处理 "data:" 行，忽略空行和注释
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            yield json.loads(data)
+    
+    def _summarize_chunked(
+        self,
+        subtitle_text: str,
+        video_title: str,
+        on_token: Optional[Callable[[str], None]] = None,
+        metrics: Optional[RunMetrics] = None,
+    ) -> Optional[str]:
+        """分块并发总结（map），再合并分块总结（reduce）"""
+        chunks = self._split_chunks(subtitle_text)
+        logger.info(f"字幕较长，分为 {len(chunks)} 块并发总结（并发数: {self.chunk_workers}）")
+        
+        def summarize_chunk(index: int) -> str:
+            prompt = self._build_chunk_prompt(chunks[index], video_title, index + 1, len(chunks))
+            partial = self._chat(prompt, metrics=metrics)
+            logger.info("分块 %d/%d 总结完成", index + 1, len(chunks))
+            return partial
+        
+        with ThreadPoolExecutor(max_workers=self.chunk_workers) as executor:
+            partials = list(executor.map(bind_log_context(summarize_chunk), range(len(chunks))))
+        
+        if not all(partials):
+            logger.warning("部分分块总结为空")
             return None
-        except Exception as e:
-            logger.error(f"总结过程出错: {str(e)}")
+        
+        partials = self._reduce_to_budget(partials, video_title, metrics)
+        if not partials:
             return None
+        
+        logger.info("合并分块总结...")
+        return self._chat(self._build_reduce_prompt(partials, video_title, final=True), on_token, metrics)
+    
+    def _reduce_to_budget(
+        self,
+        partials: List[str],
+        video_title: str,
+        metrics: Optional[RunMetrics] = None,
+    ) -> Optional[List[str]]:
+        """多段总结合在一起仍然超出预算时，逐层分组合并，直到可以一次生成最终文档"""
+        while len(partials) > 1 and estimate_tokens("\n\n".join(partials)) > self.chunk_tokens:
+            groups = self._group_by_budget(partials)
+            if len(groups) == len(partials):
+                break
+            logger.info(f"分段总结过长，合并为 {len(groups)} 组后继续")
+            with ThreadPoolExecutor(max_workers=self.chunk_workers) as executor:
+                partials = list(executor.map(
+                    bind_log_context(
+                        lambda group: self._chat(self._build_reduce_prompt(group, video_title, final=False), metrics=metrics)
+                    ),
+                    groups,
+                ))
+            if not all(partials):
+                logger.warning("部分分段总结为空")
+                return None
+        return partials
+    
+    def summarize_collection(
+        self,
+        part_summaries: List[Tuple[str, str]],
+        collection_title: str = "",
+        metrics: Optional[RunMetrics] = None,
+    ) -> Optional[str]:
+        """
+        根据多P视频或合集中各分P的总结生成总览
+        
+        Args:
+            part_summaries: (分P标题, 分P总结) 列表，按分P顺序排列
+            collection_title: 视频或合集标题
+            metrics: 运行指标（可选）
+        
+        Returns:
+            总览内容，如果失败返回None
+        """
+        if not part_summaries:
+            return None
+        
+        with metrics.timer('llm') if metrics else nullcontext():
+            try:
+                logger.info(f"根据 {len(part_summaries)} 个分P的总结生成总览...")
+                texts = [f"#### {title}\n\n{summary}" for title, summary in part_summaries]
+                texts = self._reduce_to_budget(texts, collection_title, metrics)
+                if not texts:
+                    return None
+                overview = self._chat(self._build_overview_prompt(texts, collection_title), metrics=metrics)
+                return overview or None
+            except requests.exceptions.RequestException as e:
+                logger.error(f"API请求失败: {str(e)}")
+                return None
+            except Exception as e:
+                logger.error(f"生成总览出错: {str(e)}")
+                return None
+    
+    def _split_chunks(self, subtitle_text: str) -> List[str]:
+        """
+        按token预算切分字幕
+        
+        在字幕行边界切分，单行过长时在句子边界切分；相邻分块之间保留
+        约 chunk_overlap_tokens 的重叠，避免在分块边界丢失上下文。
+        """
+        units = []
+        for line in subtitle_text.split('\n'):
+            if estimate_tokens(line) <= self.chunk_tokens:
+                units.append(line)
+            else:
+                units.extend(s for s in _SENTENCE_END.split(line) if s)
+        
+        chunks = []
+        current: List[str] = []
+        current_tokens = 0
+        for unit in units:
+            tokens = estimate_tokens(unit)
+            if current and current_tokens + tokens > self.chunk_tokens:
+                chunks.append('\n'.join(current))
+                # 将当前分块末尾的若干行作为下一块的开头
+                overlap: List[str] = []
+                overlap_tokens = 0
+                for prev in reversed(current):
+                    prev_tokens = estimate_tokens(prev)
+                    if overlap_tokens + prev_tokens > self.chunk_overlap_tokens:
+                        break
+                    overlap.insert(0, prev)
+                    overlap_tokens += prev_tokens
+                current, current_tokens = overlap, overlap_tokens
+            current.append(unit)
+            current_tokens += tokens
+        if current:
+            chunks.append('\n'.join(current))
+        return chunks
+    
+    def _group_by_budget(self, texts: List[str]) -> List[List[str]]:
+        """将多段文本按token预算分组"""
+        groups: List[List[str]] = []
+        group_tokens = 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if groups and group_tokens + tokens <= self.chunk_tokens:
+                groups[-1].append(text)
+                group_tokens += tokens
+            else:
+                groups.append([text])
+                group_tokens = tokens
+        return groups
     
     def _build_prompt(self, subtitle_text: str, video_title: str) -> str:
         """构建AI提示词"""
@@ -105,4 +670,101 @@ class AISummarizer:
 请开始总结："""
         
         return prompt
+    
+    def _build_diff_prompt(self, previous_summary: str, added_lines: List[str], video_title: str) -> str:
+        """构建近似重复视频的增量总结提示词：在已有总结的基础上补充新增内容"""
+        title_part = f"视频标题：{video_title}\n\n" if video_title else ""
+        added_text = "\n".join(added_lines)
+        
+        prompt = f"""以下视频与一个已总结过的Bilibili视频内容基本相同（例如重新上传或搬运的版本），请在已有总结的基础上生成这个视频的总结。
+
+{title_part}已有总结：
 
+{previous_summary}
+
+这个视频字幕中新增或改动的内容：
+
+{added_text}
+
+请按照以下要求生成总结：
+1. 保留已有总结的结构和要点
+2. 将新增内容中的有效信息补充到相应位置，忽略片头片尾、求关注等无关内容
+3. 如果视频标题不同，使用这个视频的标题
+4. 使用Markdown格式，直接输出完整的总结
+5. 保持中文输出
+
+请开始总结："""
+        
+        return prompt
+    
+    def _build_chunk_prompt(self, chunk_text: str, video_title: str, index: int, total: int) -> str:
+        """构建分块总结提示词"""
+        title_part = f"视频标题：{video_title}\n\n" if video_title else ""
+        
+        prompt = f"""以下是一个较长Bilibili视频字幕的第 {index}/{total} 部分，请提取这一部分的要点。
+
+{title_part}字幕内容（第 {index}/{total} 部分）：
+
+{chunk_text}
+
+请按照以下要求输出：
+1. 按内容顺序列出这一部分的主要观点和关键信息
+2. 保留重要的数据、人名、结论
+3. 使用Markdown列表，不需要开头和结尾的客套话
+4. 保持中文输出
+
+请开始："""
+        
+        return prompt
+    
+    def _build_overview_prompt(self, part_texts: List[str], collection_title: str) -> str:
+        """构建多P视频/合集总览提示词"""
+        title_part = f"标题：{collection_title}\n\n" if collection_title else ""
+        sections = "\n\n".join(part_texts)
+        
+        prompt = f"""以下是一个Bilibili多P视频（或合集）中各个分P的总结，按分P顺序排列。
+
+{title_part}{sections}
+
+请按照以下要求生成总览：
+1. 用一段话概括整个系列的主题和目标受众
+2. 梳理各分P之间的结构和递进关系（例如分为几个阶段，每个阶段包含哪些分P）
+3. 列出整个系列最重要的知识点或结论
+4. 使用Markdown格式，不需要重复每个分P的详细内容
+5. 保持中文输出
+
+请开始："""
+        
+        return prompt
+    
+    def _build_reduce_prompt(self, partials: List[str], video_title: str, final: bool) -> str:
+        """构建合并分块总结的提示词"""
+        title_part = f"视频标题：{video_title}\n\n" if video_title else ""
+        sections = "\n\n".join(f"### 第 {i} 部分\n\n{text}" for i, text in enumerate(partials, 1))
+        
+        if final:
+            requirements = """请按照以下要求生成总结：
+1. 将各部分要点整合为一份完整的总结，去除重复内容
+2. 使用Markdown格式，包含标题、段落、列表等
+3. 总结要简洁明了，突出重点
+4. 按视频内容的先后顺序分章节总结
+5. 保持中文输出
+
+请开始总结："""
+            task = "请将它们整合为一份结构化的Markdown文档。"
+        else:
+            requirements = """请按照以下要求输出：
+1. 合并为一份要点列表，去除重复内容，保持先后顺序
+2. 使用Markdown列表
+3. 保持中文输出
+
+请开始："""
+            task = "请将它们合并为一份更精简的要点列表。"
+        
+        prompt = f"""以下是一个较长Bilibili视频按先后顺序分段提取的要点，{task}
+
+{title_part}{sections}
+
+{requirements}"""
+        
+        return prompt
@@ -0,0 +1,143 @@
+"""已处理视频索引（SQLite）：记录每个视频的处理状态、字幕哈希和总结路径"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# 处理状态
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    channel TEXT,
+    status TEXT NOT NULL,
+    subtitle_hash TEXT,
+    summary_path TEXT,
+    model TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_videos_channel ON videos (channel);
+"""
+
+
+class VideoIndex:
+    """
+    已处理视频索引
+    
+    轮询时只需按ID批量查询一次即可筛出新视频，已知视频不会再被提取。
+    连接在线程间共享，所有操作在锁内执行。
+    """
+    
+    def __init__(self, db_path: Path):
+        """
+        Args:
+            db_path: SQLite数据库文件路径，不存在时自动创建
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    def get(self, video_id: str) -> Optional[Dict]:
+        """查询单个视频的记录"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        return dict(row) if row else None
+    
+    def pending(self, video_ids: Iterable[str], retry_after: float) -> List[str]:
+        """
+        筛选需要处理的视频：索引中没有的视频，以及上次失败且已超过重试间隔的视频
+        
+        Args:
+            video_ids: 候选视频ID
+            retry_after: 失败视频的重试间隔（秒）
+        
+        Returns:
+            需要处理的视频ID，保持输入顺序
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        if not video_ids:
+            return []
+        known: Dict[str, sqlite3.Row] = {}
+        with self._lock:
+            # SQLite默认最多999个参数，分批查询
+            for i in range(0, len(video_ids), 500):
+                batch = video_ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT video_id, status, updated_at FROM videos WHERE video_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                known.update((row['video_id'], row) for row in rows)
+        
+        now = time.time()
+        return [
+            video_id for video_id in video_ids
+            if video_id not in known
+            or (known[video_id]['status'] != DONE and now - known[video_id]['updated_at'] >= retry_after)
+        ]
+    
+    def record(
+        self,
+        video_id: str,
+        url: str,
+        status: str,
+        title: Optional[str] = None,
+        channel: Optional[str] = None,
+        subtitle_hash: Optional[str] = None,
+        summary_path: Optional[Path] = None,
+        model: Optional[str] = None,
+    ):
+        """
+        写入或更新一个视频的处理结果；失败时保留上一次成功的字幕哈希和总结路径
+        
+        Args:
+            video_id: 视频ID（BV号）
+            url: 视频URL
+            status: 处理状态（done / failed）
+            title: 视频标题
+            channel: 所属频道（UP主空间URL）
+            subtitle_hash: 字幕内容哈希
+            summary_path: 总结文件路径
+            model: 生成总结使用的模型
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO videos (video_id, url, title, channel, status, subtitle_hash, summary_path, model,
+                                    attempts, first_seen, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET
+                    url = excluded.url,
+                    title = COALESCE(excluded.title, videos.title),
+                    channel = COALESCE(excluded.channel, videos.channel),
+                    status = excluded.status,
+                    subtitle_hash = COALESCE(excluded.subtitle_hash, videos.subtitle_hash),
+                    summary_path = COALESCE(excluded.summary_path, videos.summary_path),
+                    model = COALESCE(excluded.model, videos.model),
+                    attempts = videos.attempts + 1,
+                    updated_at = excluded.updated_at
+                """,
+                (video_id, url, title, channel, status, subtitle_hash,
+                 str(summary_path) if summary_path else None, model, now, now),
+            )
+    
+    def stats(self) -> Dict[str, int]:
+        """各状态的视频数量"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM videos GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
@@ -0,0 +1,260 @@
+"""
+监视模式：定期列出UP主的投稿，只处理新视频
+
+每次轮询只对UP主空间做一次扁平提取（列表请求），通过已处理视频索引筛出新视频，
+已处理过的视频不会再被提取。指定 recheck 时会重新获取已处理视频的字幕，
+字幕内容哈希未变化的视频跳过总结。
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+from config.settings import Settings
+from utils.logger import log_context, setup_logger
+from utils.video import video_key
+from src.collection import CollectionPipeline
+from src.downloader import PlaylistEntry, PlaylistResult, SubtitleResult
+from src.metrics import RunMetrics
+from src.preprocess import prepare_subtitle_text
+from src.video_index import DONE, FAILED, VideoIndex
+
+logger = setup_logger()
+
+# 单个视频的处理结果
+PROCESSED = "processed"
+UNCHANGED = "unchanged"
+
+
+@dataclass
+class PollResult:
+    """一次轮询的结果"""
+    channel: str
+    listed: int = 0
+    pending: int = 0
+    processed: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    error: Optional[str] = None
+
+
+def subtitle_hash(text: str) -> str:
+    """字幕内容哈希，用于判断字幕是否变化"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ChannelWatcher:
+    """
+    UP主投稿监视器
+    
+    新视频在线程池中并发处理（获取字幕、总结、保存），处理结果写入索引；
+    失败的视频（例如AI字幕尚未生成）在重试间隔之后的轮询中再次处理。
+    """
+    
+    def __init__(
+        self,
+        downloader,
+        summarizer,
+        save_func: Callable[..., Path],
+        index: VideoIndex,
+        workers: Optional[int] = None,
+        limit: Optional[int] = None,
+        retry_hours: Optional[float] = None,
+        recheck: bool = False,
+    ):
+        """
+        Args:
+            downloader: 字幕下载器（SubtitleDownloader）
+            summarizer: AI总结器（AISummarizer）
+            save_func: 保存总结的函数，签名为 (summary, video_title, sub_dir, subtitle=None) -> Path
+            index: 已处理视频索引
+            workers: 视频处理并发数，默认使用Settings中的配置
+            limit: 每次轮询列出的最新投稿数，默认使用Settings中的配置
+            retry_hours: 失败视频的重试间隔（小时），默认使用Settings中的配置
+            recheck: 是否重新获取已处理视频的字幕，字幕变化时重新总结
+        """
+        self.downloader = downloader
+        self.summarizer = summarizer
+        self.save_func = save_func
+        self.index = index
+        self.workers = max(1, workers or Settings.BATCH_SUMMARIZE_WORKERS)
+        self.limit = limit if limit is not None else Settings.WATCH_LIST_LIMIT
+        self.retry_after = (retry_hours if retry_hours is not None else Settings.WATCH_RETRY_HOURS) * 3600
+        self.recheck = recheck
+    
+    @staticmethod
+    def entry_id(entry: PlaylistEntry) -> str:
+        """索引中使用的视频ID：扁平提取得到的BV号，缺失时由URL推断"""
+        return entry.video_id or video_key(entry.url)
+    
+    def poll(self, channel_url: str) -> PollResult:
+        """
+        轮询一个UP主空间，处理其中的新视频
+        
+        Args:
+            channel_url: UP主空间URL，例如 https://space.bilibili.com/<mid>/video
+        
+        Returns:
+            轮询结果
+        """
+        result = PollResult(channel=channel_url)
+        entries = self.downloader.list_videos(channel_url, self.limit or None)
+        if entries is None:
+            result.error = "获取视频列表失败"
+            return result
+        result.listed = len(entries)
+        
+        by_id = {self.entry_id(entry): entry for entry in entries}
+        if self.recheck:
+            pending = list(by_id)
+        else:
+            pending = self.index.pending(by_id, self.retry_after)
+        result.pending = len(pending)
+        logger.info(f"{channel_url}: 列出 {result.listed} 个视频，待处理 {result.pending} 个")
+        if not pending:
+            return result
+        
+        lock = threading.Lock()
+        
+        def process(video_id: str):
+            try:
+                with log_context(video=video_id):
+                    status = self.process(video_id, by_id[video_id], channel_url)
+            except Exception as e:
+                logger.error(f"处理视频出错: {by_id[video_id].url}: {str(e)}")
+                self.index.record(video_id, by_id[video_id].url, FAILED, channel=channel_url)
+                status = FAILED
+            with lock:
+                if status == PROCESSED:
+                    result.processed += 1
+                elif status == UNCHANGED:
+                    result.unchanged += 1
+                else:
+                    result.failed += 1
+        
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="watch") as executor:
+            list(executor.map(process, pending))
+        logger.info(
+            f"{channel_url}: 新总结 {result.processed}，未变化 {result.unchanged}，失败 {result.failed}"
+        )
+        return result
+    
+    def process(self, video_id: str, entry: PlaylistEntry, channel_url: str) -> str:
+        """
+        处理单个视频并写入索引
+        
+        Returns:
+            PROCESSED（已总结）、UNCHANGED（字幕未变化，跳过总结）或 FAILED
+        """
+        metrics = RunMetrics(url=entry.url)
+        previous = self.index.get(video_id)
+        # 重新检查已处理的视频时必须重新下载字幕，否则读到的是字幕存储中的旧字幕
+        refresh = self.recheck and previous is not None
+        fetched = self.downloader.fetch(entry.url, metrics=metrics, refresh=refresh)
+        if fetched is None:
+            metrics.error = "字幕获取失败或没有字幕"
+            self.index.record(video_id, entry.url, FAILED, title=entry.title, channel=channel_url)
+            return FAILED
+        
+        if isinstance(fetched, PlaylistResult):
+            return self._process_collection(video_id, entry, channel_url, fetched, metrics, refresh)
+        
+        digest = subtitle_hash(fetched.text)
+        if (previous and previous['status'] == DONE and previous['subtitle_hash'] == digest
+                and previous['summary_path'] and Path(previous['summary_path']).exists()):
+            logger.info(f"字幕未变化，跳过总结: {fetched.video_title}")
+            self.index.record(video_id, entry.url, DONE, title=fetched.video_title, channel=channel_url)
+            self._discard_output(fetched)
+            return UNCHANGED
+        
+        with metrics.timer('preprocess'):
+            subtitle_text = prepare_subtitle_text(fetched.cues, fetched.text)
+        summary = self.summarizer.summarize(subtitle_text, fetched.video_title or "", metrics=metrics)
+        if not summary:
+            metrics.error = "AI总结失败"
+            # 不记录字幕哈希，避免下次把旧总结当作与新字幕对应
+            self.index.record(video_id, entry.url, FAILED, title=fetched.video_title, channel=channel_url)
+            self._write_sidecar(metrics, fetched.sub_dir)
+            return FAILED
+        
+        with metrics.timer('save'):
+            output_file = self.save_func(summary, fetched.video_title or "summary", fetched.sub_dir, subtitle=fetched)
+        metrics.success = True
+        self._write_sidecar(metrics, fetched.sub_dir)
+        self.index.record(
+            video_id, entry.url, DONE,
+            title=fetched.video_title, channel=channel_url,
+            subtitle_hash=digest, summary_path=output_file, model=self.summarizer.model,
+        )
+        logger.info(f"总结已保存到: {output_file}")
+        return PROCESSED
+    
+    def _process_collection(
+        self, video_id: str, entry: PlaylistEntry, channel_url: str, playlist: PlaylistResult, metrics: RunMetrics,
+        refresh: bool = False,
+    ) -> str:
+        """多P视频按分P处理，索引中只记录合集文档"""
+        result = CollectionPipeline(
+            self.downloader, self.summarizer, self.save_func, summarize_workers=self.workers, refresh=refresh,
+        ).run(playlist, metrics)
+        if not result.output_file:
+            metrics.error = "所有分P均处理失败"
+            self.index.record(video_id, entry.url, FAILED, title=playlist.title, channel=channel_url)
+            self._write_sidecar(metrics, playlist.sub_dir)
+            return FAILED
+        metrics.success = True
+        self._write_sidecar(metrics, playlist.sub_dir)
+        self.index.record(
+            video_id, entry.url, DONE,
+            title=playlist.title, channel=channel_url,
+            summary_path=result.output_file, model=self.summarizer.model,
+        )
+        return PROCESSED
+    
+    @staticmethod
+    def _write_sidecar(metrics: RunMetrics, sub_dir: Path):
+        if Settings.WRITE_METRICS_FILE:
+            metrics.write_sidecar(sub_dir)
+    
+    @staticmethod
+    def _discard_output(fetched: SubtitleResult):
+        """
+        跳过总结时删除 fetch 创建的子目录及其中保存的字幕文件
+        
+        字幕文件通常是指向字幕存储的硬链接，删除不影响存储中的字幕；
+        子目录中还有其他文件时保留子目录。
+        """
+        if fetched.subtitle_file and fetched.subtitle_file.parent == fetched.sub_dir:
+            try:
+                fetched.subtitle_file.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"删除字幕文件失败: {fetched.subtitle_file}: {str(e)}")
+        try:
+            fetched.sub_dir.rmdir()
+        except OSError:
+            pass
+    
+    def watch(self, channels: List[str], interval: Optional[float] = None, once: bool = False,
+              stop_event: Optional[threading.Event] = None) -> List[PollResult]:
+        """
+        依次轮询各UP主空间，直到 stop_event 被设置（once为True时只轮询一轮）
+        
+        Args:
+            channels: UP主空间URL列表
+            interval: 两轮轮询之间的间隔（秒），默认使用Settings中的配置
+            once: 是否只轮询一轮
+            stop_event: 停止信号
+        
+        Returns:
+            最后一轮的轮询结果
+        """
+        interval = interval if interval is not None else Settings.WATCH_INTERVAL
+        stop_event = stop_event or threading.Event()
+        while True:
+            results = [self.poll(channel) for channel in channels]
+            if once:
+                return results
+            logger.info(f"本轮轮询完成，索引状态: {self.index.stats()}，{interval:.0f} 秒后再次轮询")
+            if stop_event.wait(interval):
+                return results
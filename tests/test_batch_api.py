@@ -0,0 +1,41 @@
+"""批处理接口测试"""
+import pytest
+from config.settings import Settings
+from fakes import FAKE_URL_TEMPLATE, MockLLMServer, install_fake_extractor, uninstall_fake_extractor, write_fake_cookies
+from src.batch_api import BatchApiRunner
+from src.downloader import SubtitleDownloader
+from src.main import save_summary
+from src.summarizer import AISummarizer
+
+
+@pytest.fixture
+def batch_runner(tmp_path, monkeypatch):
+    with MockLLMServer(latency=0.0, batch_latency=0.1) as llm:
+        for name, value in {
+            "COOKIES_FILE": write_fake_cookies(tmp_path),
+            "OUTPUT_DIR": tmp_path / "output",
+            "SEARCH_INDEX_DB": tmp_path / "search.sqlite3",
+            "SUBTITLE_STORE_MODE": "off",
+            "AI_API_URL": llm.url,
+        }.items():
+            monkeypatch.setattr(Settings, name, value)
+        install_fake_extractor()
+        downloader = SubtitleDownloader()
+        summarizer = AISummarizer(api_key="test", cache_mode="off", near_dup_mode="off")
+        yield BatchApiRunner(downloader, summarizer, save_summary, state_dir=tmp_path / "state", poll_interval=0.05), llm
+        downloader.close()
+        uninstall_fake_extractor()
+
+
+def test_multi_part_url_is_expanded_into_the_batch(batch_runner):
+    """多P视频的各分P与其他视频放入同一个批次，批次完成后生成合集文档"""
+    runner, llm = batch_runner
+    playlist_url, video_url = FAKE_URL_TEMPLATE.format("BVM000001"), FAKE_URL_TEMPLATE.format("BVS000001")
+    
+    collection, video = runner.run([playlist_url, video_url])
+    
+    assert llm.batch_requests == 4
+    assert video.success and not video.parts
+    assert collection.success
+    assert [part.output_file.name for part in collection.parts] == ["P01 第1讲.md", "P02 第2讲.md", "P03 第3讲.md"]
+    assert "## 分P总结" in collection.output_file.read_text(encoding='utf-8')
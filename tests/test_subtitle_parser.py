@@ -0,0 +1,42 @@
+"""字幕解析测试"""
+import pytest
+import src.subtitle_parser as subtitle_parser
+from src.subtitle_parser import _parse_timing, parse_subtitle_text
+
+
+class _NoRegex:
+    """替换时间轴正则，确认定宽时间轴没有走正则"""
+    
+    def match(self, line):
+        raise AssertionError(f"定宽时间轴使用了正则: {line!r}")
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("00:00:01,000 --> 00:00:02,500", (1.0, 2.5)),
+    ("01:02:03,456 --> 01:02:04,007", (3723.456, 3724.007)),
+    ("00:00:01.000 --> 00:00:02.000", (1.0, 2.0)),
+])
+def test_fixed_width_timing_uses_fast_path(monkeypatch, line, expected):
+    monkeypatch.setattr(subtitle_parser, "_TIMING", _NoRegex())
+    start, end = _parse_timing(line)
+    assert start == pytest.approx(expected[0])
+    assert end == pytest.approx(expected[1])
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("00:01.000 --> 00:02.000", (1.0, 2.0)),
+    ("00:00:01.000 --> 00:00:02.000 align:start position:0%", (1.0, 2.0)),
+])
+def test_other_timing_falls_back_to_regex(line, expected):
+    start, end = _parse_timing(line)
+    assert start == pytest.approx(expected[0])
+    assert end == pytest.approx(expected[1])
+
+
+def test_fixed_width_timing_rejects_non_digits():
+    assert _parse_timing("00:00:01,0_0 --> 00:00:02,000") is None
+
+
+def test_parse_srt():
+    cues = parse_subtitle_text("1\n00:00:01,000 --> 00:00:02,000\n第一句\n\n2\n00:00:03,000 --> 00:00:04,000\n第二句\n", "srt")
+    assert [(c.start, c.end, c.text) for c in cues] == [(1.0, 2.0, "第一句"), (3.0, 4.0, "第二句")]
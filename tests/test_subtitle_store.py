@@ -0,0 +1,43 @@
+"""字幕存储测试"""
+import pytest
+from config.settings import Settings
+from fakes import FAKE_URL_TEMPLATE, FakeBilibiliIE, install_fake_extractor, uninstall_fake_extractor, write_fake_cookies
+from src.downloader import PlaylistResult, SubtitleDownloader, SubtitleResult
+from src.metrics import RunMetrics
+from src.subtitle_store import SubtitleStore
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    monkeypatch.setattr(Settings, "COOKIES_FILE", write_fake_cookies(tmp_path))
+    monkeypatch.setattr(Settings, "OUTPUT_DIR", tmp_path / "output")
+    install_fake_extractor()
+    downloader = SubtitleDownloader(subtitle_store=SubtitleStore(root=tmp_path / "store", mode="on"))
+    yield downloader
+    downloader.close()
+    uninstall_fake_extractor()
+
+
+def test_first_part_does_not_shadow_playlist(downloader):
+    """P1存入字幕存储后，未指定分P的URL仍返回分P列表"""
+    url = FAKE_URL_TEMPLATE.format("BVM000001")
+    
+    assert isinstance(downloader.fetch(url), PlaylistResult)
+    assert isinstance(downloader.fetch(f"{url}?p=1"), SubtitleResult)
+    
+    playlist = downloader.fetch(url)
+    assert isinstance(playlist, PlaylistResult)
+    assert len(playlist.entries) == 3
+
+
+def test_first_part_is_served_from_store(downloader):
+    """显式指定 ?p=1 的URL再次获取时命中存储，不再提取"""
+    url = FAKE_URL_TEMPLATE.format("BVM000001") + "?p=1"
+    downloader.fetch(url)
+    calls = FakeBilibiliIE.calls
+    
+    metrics = RunMetrics(url=url)
+    subtitle = downloader.fetch(url, metrics=metrics)
+    assert isinstance(subtitle, SubtitleResult)
+    assert metrics.subtitle_store_hit
+    assert FakeBilibiliIE.calls == calls
@@ -0,0 +1,47 @@
+"""AI总结请求测试"""
+import threading
+import time
+import pytest
+from config.settings import Settings
+from fakes import MockLLMServer
+from src.hedging import HedgeCancelled
+from src.summarizer import AISummarizer
+
+
+@pytest.fixture
+def llm():
+    with MockLLMServer(latency=0.0, error_rate=1.0) as server:
+        yield server
+
+
+@pytest.fixture
+def summarizer(llm, monkeypatch):
+    monkeypatch.setattr(Settings, "AI_API_URL", llm.url)
+    monkeypatch.setattr(Settings, "AI_MAX_RETRIES", 3)
+    monkeypatch.setattr(Settings, "AI_HEDGE_ENABLED", False)
+    summarizer = AISummarizer(api_key="test", cache_mode="off", near_dup_mode="off")
+    # 忽略 Retry-After，使每次重试前都长时间退避
+    summarizer.retry_backoff = summarizer.retry_max_backoff = 30.0
+    monkeypatch.setattr(summarizer, "_retry_after", lambda response: None)
+    return summarizer
+
+
+def test_cancel_interrupts_retry_backoff(summarizer, llm):
+    """非流式请求在退避等待中收到取消信号时立即结束，不再重试"""
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    
+    start = time.monotonic()
+    with pytest.raises(HedgeCancelled):
+        summarizer._post(summarizer._payload("prompt", "model"), target=summarizer.primary, cancel=cancel)
+    assert time.monotonic() - start < 5
+    assert llm.requests == 1
+
+
+def test_cancelled_request_is_not_sent(summarizer, llm):
+    cancel = threading.Event()
+    cancel.set()
+    
+    with pytest.raises(HedgeCancelled):
+        summarizer._post(summarizer._payload("prompt", "model"), cancel=cancel)
+    assert llm.requests == 0
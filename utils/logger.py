@@ -1,24 +1,167 @@
-"""简洁的日志工具"""
+"""
+简洁的日志工具
+
+日志记录先放入队列，由后台线程写出，下载和总结的工作线程不会因写标准输出而阻塞。
+支持文本和JSON两种输出格式；通过 log_context 设置的任务ID、BV号等上下文会附加到每条日志中。
+"""
+import atexit
+import functools
+import json
 import logging
+import logging.handlers
+import queue
 import sys
-from pathlib import Path
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, Optional, TypeVar, Union
+from config.settings import Settings
 
+ROOT_LOGGER = "BilibiliAISummary"
+# yt-dlp的输出转发到该子记录器：其进度信息按DEBUG级别记录，警告和错误按原级别记录
+YT_DLP_LOGGER = f"{ROOT_LOGGER}.yt_dlp"
 
-def setup_logger(name: str = "BilibiliAISummary", level: int = logging.INFO) -> logging.Logger:
-    """设置并返回日志记录器"""
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
+T = TypeVar("T")
+
+_context: ContextVar[dict] = ContextVar("log_context", default={})
+_configure_lock = threading.Lock()
+_queue: Optional[queue.Queue] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """在记录日志的线程中附加当前上下文（使用队列时格式化在后台线程进行，那里取不到上下文）"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _context.get()
+        record.context = context
+        record.context_prefix = f"[{' '.join(str(v) for v in context.values())}] " if context else ""
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，上下文字段与消息并列"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            **getattr(record, 'context', {}),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def configure_logging(
+    level: Union[int, str, None] = None,
+    fmt: Optional[str] = None,
+    use_queue: Optional[bool] = None,
+) -> logging.Logger:
+    """
+    配置日志输出（可重复调用，后一次覆盖前一次）
     
-    # 避免重复添加handler
-    if logger.handlers:
-        return logger
+    Args:
+        level: 日志级别，默认使用Settings中的配置；WARNING及以上时yt-dlp的警告也不再输出
+        fmt: 输出格式 text / json，默认使用Settings中的配置
+        use_queue: 是否经由队列在后台线程写出，默认使用Settings中的配置
     
-    # 控制台输出格式：简洁
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(level)
-    console_format = logging.Formatter('%(levelname)s: %(message)s')
-    console_handler.setFormatter(console_format)
+    Returns:
+        应用的根日志记录器
+    """
+    global _queue, _listener
+    level = level if level is not None else Settings.LOG_LEVEL
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    fmt = fmt or Settings.LOG_FORMAT
+    use_queue = Settings.LOG_ASYNC if use_queue is None else use_queue
     
-    logger.addHandler(console_handler)
+    with _configure_lock:
+        logger = logging.getLogger(ROOT_LOGGER)
+        _stop_listener()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        
+        console_handler = logging.StreamHandler(sys.stdout)
+        if fmt == "json":
+            console_handler.setFormatter(JsonFormatter())
+        else:
+            # 控制台输出格式：简洁
+            console_handler.setFormatter(logging.Formatter('%(levelname)s: %(context_prefix)s%(message)s'))
+        
+        if use_queue:
+            _queue = queue.Queue()
+            handler = logging.handlers.QueueHandler(_queue)
+            _listener = logging.handlers.QueueListener(_queue, console_handler)
+            _listener.start()
+        else:
+            handler = console_handler
+        handler.addFilter(ContextFilter())
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logging.getLogger(YT_DLP_LOGGER).setLevel(logging.ERROR if level >= logging.WARNING else logging.NOTSET)
     return logger
 
+
+def _stop_listener():
+    """停止后台写出线程（先写完队列中剩余的日志）"""
+    global _queue, _listener
+    if _listener is not None:
+        _listener.stop()
+    _queue = _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def flush_logs():
+    """等待队列中的日志全部写出，在直接向标准输出打印内容之前调用，避免顺序错乱"""
+    pending = _queue
+    if pending is not None and _listener is not None:
+        pending.join()
+
+
+def setup_logger(name: str = ROOT_LOGGER, level: Optional[int] = None) -> logging.Logger:
+    """返回日志记录器，第一次调用时按Settings中的配置设置输出"""
+    if not logging.getLogger(ROOT_LOGGER).handlers:
+        configure_logging()
+    logger = logging.getLogger(name)
+    if level is not None:
+        logger.setLevel(level)
+    return logger
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    在上下文中记录的日志附加这些字段（例如 job="3", video="BV1xx411c7mD"），值为None的字段被忽略
+    
+    上下文按线程（contextvars）隔离；提交到线程池的函数需要用 bind_log_context 包装才能继承。
+    """
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def bind_log_context(func: Callable[..., T]) -> Callable[..., T]:
+    """返回在当前日志上下文中执行 func 的函数，用于提交到线程池"""
+    context = _context.get()
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _context.set(context)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _context.reset(token)
+    
+    return wrapper
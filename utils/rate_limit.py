@@ -0,0 +1,80 @@
+"""客户端限流：令牌桶"""
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶
+    
+    按固定速率补充令牌，桶满时不再增加；取令牌时不足则阻塞等待。
+    """
+    
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate_per_minute: 每分钟补充的令牌数
+            capacity: 桶容量（允许的突发量），默认等于每分钟速率
+        """
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute必须大于0")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        取出令牌，不足时阻塞直到补充足够
+        
+        Args:
+            amount: 令牌数量，超过桶容量时按桶容量计算
+        
+        Returns:
+            等待的秒数
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    """同时限制每分钟请求数和每分钟token数，值为0表示不限制"""
+    
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        """
+        Args:
+            requests_per_minute: 每分钟请求数上限
+            tokens_per_minute: 每分钟token数上限
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+    
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        为一次请求取得配额
+        
+        Args:
+            tokens: 本次请求估算的token数
+        
+        Returns:
+            等待的秒数
+        """
+        waited = 0.0
+        if self.requests:
+            waited += self.requests.acquire(1)
+        if self.tokens and tokens:
+            waited += self.tokens.acquire(tokens)
+        return waited
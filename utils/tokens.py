@@ -0,0 +1,24 @@
+"""token数量估算工具"""
+import re
+
+# 中日韩字符（含全角标点），大多数模型的分词器中约1个字符对应1个token
+_CJK_PATTERN = re.compile(r'[　-〿぀-ヿ㐀-䶿一-鿿가-힯＀-￯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数量，不依赖具体模型的分词器
+    
+    中日韩字符按每字1个token计算，其余字符按每4个字符1个token计算。
+    
+    Args:
+        text: 文本内容
+    
+    Returns:
+        估算的token数量
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
@@ -0,0 +1,24 @@
+"""视频URL工具"""
+import re
+from urllib.parse import parse_qs, urlparse
+
+_BV_ID = re.compile(r'BV[0-9A-Za-z]{10}')
+
+
+def video_key(url: str) -> str:
+    """
+    视频标识：BV号加分P序号，无法识别BV号时使用去掉查询参数的URL
+    
+    用于合并同一视频的并发请求、检查点目录名和日志上下文。
+    
+    Args:
+        url: 视频URL
+    
+    Returns:
+        视频标识，例如 "BV1xx411c7mD" 或 "BV1xx411c7mD?p=2"
+    """
+    parsed = urlparse(url.strip())
+    match = _BV_ID.search(parsed.path) or _BV_ID.search(url)
+    base = match.group(0) if match else f"{parsed.netloc}{parsed.path}".rstrip('/') or url.strip()
+    page = parse_qs(parsed.query).get('p', ['1'])[0]
+    return f"{base}?p={page}" if page not in ('', '1') else base